@@ -0,0 +1,32 @@
+import os
+
+import psycopg2
+import pytest
+
+import threadingpg
+
+def get_connect_kwargs() -> dict:
+    '''
+    Test server by libpq environment variables. default postgres@localhost:5432/postgres
+    '''
+    return {'dbname': os.environ.get('PGDATABASE', 'postgres'),
+            'user': os.environ.get('PGUSER', 'postgres'),
+            'password': os.environ.get('PGPASSWORD', ''),
+            'port': int(os.environ.get('PGPORT', 5432)),
+            'host': os.environ.get('PGHOST', 'localhost')}
+
+@pytest.fixture(scope='session')
+def connect_kwargs() -> dict:
+    connect_kwargs = get_connect_kwargs()
+    try:
+        psycopg2.connect(psycopg2.extensions.make_dsn(**connect_kwargs)).close()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL is not available: {e}")
+    return connect_kwargs
+
+@pytest.fixture
+def controller(connect_kwargs):
+    controller = threadingpg.Controller()
+    controller.connect(**connect_kwargs)
+    yield controller
+    controller.close()
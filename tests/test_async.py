@@ -0,0 +1,215 @@
+import asyncio
+
+import pytest
+from psycopg2.pool import PoolError
+
+import threadingpg
+from threadingpg import condition
+from threadingpg import data
+from threadingpg import types
+
+class AsyncTable(data.Table):
+    table_name = 'threadingpg_test_async'
+    index = data.Column(data_type=types.serial, is_primary_key=True)
+    name = data.Column(data_type=types.varchar())
+
+class AsyncRow(data.Row):
+    def __init__(self, index:int=None, name:str=None) -> None:
+        self.index = index
+        self.name = name
+
+@pytest.fixture
+def table(controller):
+    table = AsyncTable()
+    controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+    controller.execute(f"CREATE TABLE {table.table_name} (index serial PRIMARY KEY, name varchar);")
+    yield table
+    controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+
+async def select_names(async_controller, table) -> list:
+    _, rows = await async_controller.select(table, order_by=condition.OrderBy(table.index))
+    return [row[1] for row in rows]
+
+async def get_prepared_statement_count(async_controller) -> int:
+    async with async_controller.get() as (cursor, conn):
+        await async_controller._execute_cursor(cursor, conn, "SELECT count(*) FROM pg_prepared_statements;")
+        return cursor.fetchone()[0]
+
+def test_controller_rows(connect_kwargs, table):
+    async def run():
+        async_controller = threadingpg.AsyncController()
+        await async_controller.connect(**connect_kwargs)
+        try:
+            rows = [{'name': 'a'}, {'name': None}, {'name': 'c'}]
+            returned_rows = await async_controller.insert_rows(table, rows, batch_size=2, is_returning=True)
+            assert returned_rows == [(1, ), (2, ), (3, )]
+            assert [row['index'] for row in rows] == [1, 2, 3]
+
+            row = AsyncRow(name='b')
+            await async_controller.update_row(table, row, condition.Equal(table.index, 2))
+            await async_controller.delete_row(table, condition.Equal(table.index, 3))
+            assert await select_names(async_controller, table) == ['a', 'b']
+
+            selected_rows = await async_controller.select_rows(table, AsyncRow, where=condition.Equal(table.name, 'b'))
+            assert [(selected_row.index, selected_row.name) for selected_row in selected_rows] == [(2, 'b')]
+            assert await async_controller.is_exist_table(table)
+            assert await async_controller.get_column_names(table) == ['index', 'name']
+        finally:
+            async_controller.close()
+    asyncio.run(run())
+
+def test_controller_prepared_at_threshold(connect_kwargs, table):
+    async def run():
+        async_controller = threadingpg.AsyncController()
+        await async_controller.connect(**connect_kwargs)
+        try:
+            await async_controller.insert_dict(table, {'name': 'a'})
+            assert await get_prepared_statement_count(async_controller) == 0
+            await async_controller.insert_dict(table, {'name': 'b'})
+            assert await get_prepared_statement_count(async_controller) == 1
+            # result type of prepared statement is changed. prepared again and executed.
+            await async_controller.select(table, where=condition.Equal(table.index, 1))
+            await async_controller.select(table, where=condition.Equal(table.index, 1))
+            await async_controller.execute(f"ALTER TABLE {table.table_name} ADD COLUMN count integer DEFAULT 0;")
+            _, rows = await async_controller.select(table, where=condition.Equal(table.index, 1))
+            assert rows == [(1, 'a', 0)]
+        finally:
+            async_controller.close()
+    asyncio.run(run())
+
+def test_controller_runs_one_query_at_a_time(connect_kwargs):
+    async def run():
+        async_controller = threadingpg.AsyncController()
+        await async_controller.connect(**connect_kwargs)
+        try:
+            async def select_value(value:int) -> int:
+                async with async_controller.get() as (cursor, conn):
+                    await async_controller._execute_cursor(cursor, conn, "SELECT %s, pg_sleep(0.01);", [value])
+                    return cursor.fetchone()[0]
+            assert await asyncio.gather(*[select_value(value) for value in range(5)]) == list(range(5))
+        finally:
+            async_controller.close()
+    asyncio.run(run())
+
+def test_pool_waiters_in_fifo_order(connect_kwargs):
+    async def run():
+        async_pool = threadingpg.AsyncPool(**connect_kwargs, minconn=0, maxconn=1)
+        acquired_order = []
+        async def acquire(name:str):
+            async with async_pool.get() as (cursor, conn):
+                acquired_order.append(name)
+
+        try:
+            async with async_pool.get() as (_, held_connection):
+                tasks = []
+                for index in range(3):
+                    tasks.append(asyncio.create_task(acquire(f"waiter_{index}")))
+                    # waiter is queued before next one.
+                    await asyncio.sleep(0)
+                await asyncio.sleep(0.01)
+                assert acquired_order == []
+            await asyncio.gather(*tasks)
+            assert acquired_order == ['waiter_0', 'waiter_1', 'waiter_2']
+            # connection is reused. not made again.
+            async with async_pool.get() as (_, conn):
+                assert conn is held_connection
+        finally:
+            async_pool.close()
+    asyncio.run(run())
+
+def test_pool_concurrent_queries(connect_kwargs, table):
+    async def run():
+        async_pool = threadingpg.AsyncPool(**connect_kwargs, minconn=1, maxconn=3)
+        await async_pool.connect()
+        try:
+            await asyncio.gather(*[async_pool.insert_dict(table, {'name': f'row_{index}'}) for index in range(10)])
+            assert sorted(await select_names(async_pool, table)) == sorted(f'row_{index}' for index in range(10))
+        finally:
+            async_pool.close()
+    asyncio.run(run())
+
+def test_pool_cancelled_query_closes_connection(connect_kwargs):
+    async def run():
+        async_pool = threadingpg.AsyncPool(**connect_kwargs, minconn=0, maxconn=1)
+        try:
+            async def sleep_query():
+                async with async_pool.get() as (cursor, conn):
+                    await async_pool._execute_cursor(cursor, conn, "SELECT pg_sleep(1);")
+            task = asyncio.create_task(sleep_query())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            # cancelled connection is not returned to pool. permission is released.
+            async with async_pool.get() as (cursor, conn):
+                await async_pool._execute_cursor(cursor, conn, "SELECT 1;")
+                assert cursor.fetchone() == (1, )
+        finally:
+            async_pool.close()
+    asyncio.run(run())
+
+def test_closed_pool(connect_kwargs):
+    async def run():
+        async_pool = threadingpg.AsyncPool(**connect_kwargs, minconn=1, maxconn=1)
+        await async_pool.connect()
+        async_pool.close()
+        with pytest.raises(PoolError):
+            async with async_pool.get():
+                pass
+    asyncio.run(run())
+    with pytest.raises(ValueError):
+        threadingpg.AsyncPool(**connect_kwargs, minconn=2, maxconn=1)
+
+def test_listener_notifications(connect_kwargs, controller):
+    async def run():
+        listener = threadingpg.AsyncTriggerListner()
+        await listener.connect(**connect_kwargs)
+        listener.start_listening()
+        received = []
+        async def receive():
+            async for notify in listener.notifications('threadingpg_test_async_channel'):
+                received.append(notify.payload)
+                if len(received) == 2:
+                    listener.stop_listening()
+
+        try:
+            task = asyncio.create_task(receive())
+            # LISTEN by first iterator.
+            while not await is_listening(listener):
+                await asyncio.sleep(0.01)
+            controller.execute("NOTIFY threadingpg_test_async_channel, 'first';")
+            controller.execute("NOTIFY threadingpg_test_async_channel, 'second';")
+            await asyncio.wait_for(task, 5)
+            assert received == ['first', 'second']
+        finally:
+            listener.close()
+    asyncio.run(run())
+
+async def is_listening(listener) -> bool:
+    async with listener.get() as (cursor, conn):
+        await listener._execute_cursor(cursor, conn, "SELECT count(*) FROM pg_listening_channels();")
+        return cursor.fetchone()[0] > 0
+
+def test_listener_fan_out_and_unlisten(connect_kwargs, controller):
+    async def run():
+        listener = threadingpg.AsyncTriggerListner()
+        await listener.connect(**connect_kwargs)
+        listener.start_listening()
+        first_received, second_received = [], []
+        async def receive(received:list):
+            async for notify in listener.notifications('threadingpg_test_async_channel'):
+                received.append(notify.data)
+                break
+
+        try:
+            tasks = [asyncio.create_task(receive(first_received)), asyncio.create_task(receive(second_received))]
+            while not await is_listening(listener):
+                await asyncio.sleep(0.01)
+            controller.execute("NOTIFY threadingpg_test_async_channel, '{\"index\":1}';")
+            await asyncio.wait_for(asyncio.gather(*tasks), 5)
+            assert first_received == second_received == [{'index': 1}]
+            # UNLISTEN after last iterator.
+            assert not await is_listening(listener)
+        finally:
+            listener.close()
+    asyncio.run(run())
@@ -0,0 +1,57 @@
+import pytest
+
+from threadingpg import condition
+from threadingpg import data
+from threadingpg import types
+
+class ConditionTable(data.Table):
+    table_name = 'threadingpg_test_condition'
+    index = data.Column(data_type=types.serial)
+    name = data.Column(data_type=types.varchar())
+    # condition of class body. column name is resolved when parsed.
+    default_where = condition.Equal(name, 'default')
+
+@pytest.fixture
+def table():
+    return ConditionTable()
+
+@pytest.mark.parametrize('make_condition, parsed, params', [
+    (lambda table: condition.Equal(table.index, 1), "index = %s", [1]),
+    (lambda table: condition.Greater(table.index, 1), "index > %s", [1]),
+    (lambda table: condition.GreaterEqual(table.index, 1), "index >= %s", [1]),
+    (lambda table: condition.Less(table.index, 1), "index < %s", [1]),
+    (lambda table: condition.LessEqual(table.index, 1), "index <= %s", [1]),
+    (lambda table: condition.In(table.index, range(3)), "index = ANY(%s)", [[0, 1, 2]]),
+    (lambda table: condition.Between(table.index, 1, 5), "index BETWEEN %s AND %s", [1, 5]),
+    (lambda table: condition.IsNull(table.name), "name IS NULL", []),
+    (lambda table: condition.Like(table.name, 'a%'), "name LIKE %s", ['a%']),
+    (lambda table: condition.ILike(table.name, 'a%'), "name ILIKE %s", ['a%']),
+    (lambda table: condition.Not(condition.IsNull(table.name)), "NOT (name IS NULL)", []),
+    (lambda table: condition.KeyGreater([table.index, table.name], [1, 'a']), "(index,name) > (%s,%s)", [1, 'a']),
+    (lambda table: condition.KeyGreater([table.index], [1], is_desc=True), "(index) < (%s)", [1]),
+    (lambda table: condition.And(condition.Equal(table.index, 1), condition.Or(condition.IsNull(table.name), condition.Equal(table.name, 'a'))),
+     "(index = %s AND (name IS NULL OR name = %s))", [1, 'a']),
+    (lambda table: condition.And(condition.OrderBy(table.index), condition.OrderBy(table.name, True)), "index , name DESC", []),
+    (lambda table: table.default_where, "name = %s", ['default']),
+])
+def test_parse(table, make_condition, parsed, params):
+    parse_params = []
+    assert make_condition(table).parse(parse_params) == parsed
+    assert parse_params == params
+
+def test_parse_without_params(table):
+    assert condition.In(table.index, [1, 2]).parse() == "index = ANY('{1,2}')"
+    assert condition.Between(table.index, 1, 5).parse() == "index BETWEEN 1 AND 5"
+    assert condition.ILike(table.name, 'a%').parse() == "name ILIKE 'a%'"
+
+def test_in_with_live_server(controller, table):
+    controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+    try:
+        controller.create_table(table)
+        controller.insert_rows(table, [{'name': f'row_{index}'} for index in range(10)])
+        _, rows = controller.select(table, where=condition.In(table.index, [2, 4, 100]), order_by=condition.OrderBy(table.index))
+        assert rows == [(2, 'row_1'), (4, 'row_3')]
+        _, rows = controller.select(table, where=condition.And(condition.Between(table.index, 1, 5), condition.Not(condition.ILike(table.name, 'ROW_1%'))))
+        assert len(rows) == 4
+    finally:
+        controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
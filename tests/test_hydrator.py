@@ -0,0 +1,138 @@
+import threading
+
+import pytest
+
+from threadingpg import data
+from threadingpg import types
+from threadingpg.notification import KeyHydrator
+from threadingpg.notification import Notification
+
+class HydratorTable(data.Table):
+    table_name = 'threadingpg_test_hydrator'
+    index = data.Column(data_type=types.serial, is_primary_key=True)
+    name = data.Column(data_type=types.varchar())
+
+class HydratorRow(data.Row):
+    def __init__(self, index:int=None, name:str=None) -> None:
+        self.index = index
+        self.name = name
+
+@pytest.fixture
+def table(controller):
+    table = HydratorTable()
+    controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+    controller.execute(f"CREATE TABLE {table.table_name} (index serial PRIMARY KEY, name varchar);")
+    controller.insert_rows(table, [{'name': 'a'}, {'name': 'b'}, {'name': 'c'}])
+    yield table
+    controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+
+def make_notification(operation:str, key) -> Notification:
+    return Notification('channel', None, data={'operation': operation, 'table_name': HydratorTable.table_name, 'key': key})
+
+class FailingHydrator(KeyHydrator):
+    '''
+    fetch() fails failure_count times.
+    '''
+    def __init__(self, failure_count:int, handler, **kwargs) -> None:
+        super().__init__(None, HydratorTable(), 'index', handler, window=5, **kwargs)
+        self.failure_count = failure_count
+        self.fetched_keys = []
+
+    def fetch(self, keys:list) -> dict:
+        self.fetched_keys.append(keys)
+        if len(self.fetched_keys) <= self.failure_count:
+            raise ConnectionError("fetch failed")
+        return {key: {'index': key} for key in keys}
+
+class Handled(list):
+    def __init__(self, count:int) -> None:
+        super().__init__()
+        self.count = count
+        self.event = threading.Event()
+
+    def __call__(self, notification:Notification, row):
+        self.append((notification.data, row))
+        if len(self) == self.count:
+            self.event.set()
+
+def run(hydrator:KeyHydrator, notifications:list):
+    '''
+    Put notifications before start(). handled in one batch by stop().
+    '''
+    for notification in notifications:
+        hydrator.put(notification)
+    hydrator.start()
+    hydrator.stop()
+
+def test_fetch_in_batch(controller, table):
+    handled = Handled(4)
+    hydrator = KeyHydrator(controller, table, 'index', handled, row_class=HydratorRow, window=0.05)
+    hydrator.start()
+    try:
+        for operation, key in [('insert', 1), ('update', 3), ('delete', 2), ('update', 1)]:
+            hydrator.put(make_notification(operation, key))
+        assert handled.event.wait(5)
+    finally:
+        hydrator.stop()
+    # put order. deleted row is None.
+    assert [(notification_data['key'], row.name if row else None) for notification_data, row in handled] == \
+        [(1, 'a'), (3, 'c'), (2, None), (1, 'a')]
+    assert (hydrator.fetch_count, hydrator.fetched_key_count, hydrator.failed_fetch_count) == (1, 2, 0)
+
+def test_not_found_row_is_none(controller, table):
+    handled = Handled(2)
+    hydrator = KeyHydrator(controller, table, 'index', handled, window=5)
+    run(hydrator, [make_notification('insert', 1), make_notification('update', 100)])
+    assert [row for _, row in handled] == [{'index': 1, 'name': 'a'}, None]
+
+def test_max_batch_size(controller, table):
+    handled = Handled(3)
+    hydrator = KeyHydrator(controller, table, 'index', handled, window=5, max_batch_size=2)
+    run(hydrator, [make_notification('insert', key) for key in (1, 2, 3)])
+    assert len(handled) == 3
+    assert (hydrator.fetch_count, hydrator.fetched_key_count) == (2, 3)
+
+def test_failed_fetch_is_retried():
+    handled = Handled(2)
+    hydrator = FailingHydrator(1, handled)
+    run(hydrator, [make_notification('insert', 1), make_notification('update', 2)])
+    assert hydrator.fetched_keys == [[1, 2], [1, 2]]
+    assert [row for _, row in handled] == [{'index': 1}, {'index': 2}]
+    assert (hydrator.fetch_count, hydrator.failed_fetch_count) == (1, 0)
+
+def test_failed_fetch_does_not_drop_batch():
+    handled = Handled(3)
+    hydrator = FailingHydrator(2, handled, fetch_retry_count=1)
+    notifications = [make_notification('insert', 1), make_notification('delete', 2), make_notification('update', 3)]
+    run(hydrator, notifications)
+    # all notifications are handled without rows.
+    assert [(notification_data['key'], row) for notification_data, row in handled] == [(1, None), (2, None), (3, None)]
+    assert len(hydrator.fetched_keys) == 2
+    assert (hydrator.fetch_count, hydrator.failed_fetch_count) == (0, 1)
+
+    # next batch is fetched.
+    handled = Handled(1)
+    hydrator.handler = handled
+    run(hydrator, [make_notification('insert', 4)])
+    assert handled == [({'operation': 'insert', 'table_name': HydratorTable.table_name, 'key': 4}, {'index': 4})]
+
+def test_notification_without_key_is_handled():
+    handled = []
+    hydrator = FailingHydrator(0, lambda notification, row: handled.append((notification, row)))
+    notifications = [make_notification('insert', 1),
+                     Notification('channel', 'not json'),
+                     Notification('channel', None, data={'operation': 'insert'})]
+    run(hydrator, notifications)
+    # handled without row. other keys are fetched.
+    assert handled == [(notifications[0], {'index': 1}), (notifications[1], None), (notifications[2], None)]
+    assert hydrator.fetched_keys == [[1]]
+
+def test_handler_error_does_not_stop_batch():
+    handled = []
+    def handler(notification:Notification, row):
+        if notification.data['key'] == 1:
+            raise ValueError()
+        handled.append(row)
+    hydrator = FailingHydrator(0, handler)
+    run(hydrator, [make_notification('insert', 1), make_notification('insert', 2)])
+    assert handled == [{'index': 2}]
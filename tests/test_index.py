@@ -0,0 +1,47 @@
+import threadingpg
+from threadingpg import condition
+from threadingpg import data
+from threadingpg import types
+
+class IndexedTable(data.Table):
+    table_name = 'threadingpg_test_indexed'
+    index = data.Column(data_type=types.serial)
+    name = data.Column(data_type=types.varchar(), index_method='btree')
+    kind = data.Column(data_type=types.varchar())
+    payload = data.Column(data_type=types.jsonb)
+    indexes = (data.Index([name, index]),
+               data.Index(['lower(name)'], where=condition.Equal(kind, 'event')),
+               data.Index([payload], method='gin', where="kind IS NOT NULL"))
+
+def test_index_query():
+    table = IndexedTable()
+    index_queries = [threadingpg.Controller._make_create_index_query(table, index, True) for index in table.get_indexes()]
+    assert index_queries == [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS threadingpg_test_indexed_name_idx ON threadingpg_test_indexed USING btree (name);",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS threadingpg_test_indexed_name_index_idx ON threadingpg_test_indexed USING btree (name,index);",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS threadingpg_test_indexed_lower_name_idx ON threadingpg_test_indexed USING btree (lower(name)) WHERE kind = 'event';",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS threadingpg_test_indexed_payload_idx ON threadingpg_test_indexed USING gin (payload) WHERE kind IS NOT NULL;",
+    ]
+
+def test_index_name_is_truncated():
+    index = data.Index(['x' * 100])
+    assert len(index.get_name('table')) == 63
+    assert data.Index(['a'], name='my_index').get_name('table') == 'my_index'
+
+def test_create_partial_index_from_condition(controller):
+    table = IndexedTable()
+    controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+    try:
+        controller.create_table(table)
+        assert controller.get_missing_indexes(table) == []
+        with controller.get() as (cursor, conn):
+            cursor.execute("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s;", (table.table_name, ))
+            index_definitions = dict(cursor.fetchall())
+        assert "WHERE ((kind)::text = 'event'::text)" in index_definitions['threadingpg_test_indexed_lower_name_idx']
+
+        controller.drop_index(table, 'threadingpg_test_indexed_lower_name_idx')
+        assert [index.get_name(table.table_name) for index in controller.get_missing_indexes(table)] == ['threadingpg_test_indexed_lower_name_idx']
+        assert controller.create_indexes(table, is_concurrently=True) == ['threadingpg_test_indexed_lower_name_idx']
+        assert controller.get_missing_indexes(table) == []
+    finally:
+        controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
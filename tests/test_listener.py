@@ -0,0 +1,134 @@
+import queue
+
+import pytest
+
+import threadingpg
+
+def get_notification(notifications:queue.Queue):
+    return notifications.get(timeout=5)
+
+@pytest.fixture
+def listner(connect_kwargs):
+    listner = threadingpg.TriggerListner()
+    listner.connect(**connect_kwargs)
+    listner.start_listening()
+    yield listner
+    listner.stop_listening()
+
+def test_subscribe_after_start_listening(controller, listner):
+    notifications = queue.Queue()
+    listner.subscribe('threadingpg_test_a', notifications.put)
+    listner.subscribe('threadingpg_test_b', notifications.put)
+
+    controller.execute("NOTIFY threadingpg_test_a, 'a1'")
+    controller.execute("NOTIFY threadingpg_test_b, 'b1'")
+    received = {get_notification(notifications).payload, get_notification(notifications).payload}
+    assert received == {'a1', 'b1'}
+
+    listner.unsubscribe('threadingpg_test_a')
+    controller.execute("NOTIFY threadingpg_test_a, 'a2'")
+    controller.execute("NOTIFY threadingpg_test_b, 'b2'")
+    notification = get_notification(notifications)
+    assert (notification.channel, notification.payload) == ('threadingpg_test_b', 'b2')
+    with pytest.raises(queue.Empty):
+        notifications.get(timeout=0.2)
+
+def test_listen_channel_before_start_listening(controller, connect_kwargs):
+    listner = threadingpg.TriggerListner()
+    listner.connect(**connect_kwargs)
+    listner.listen_channel('threadingpg_test_c')
+    listner.start_listening()
+    try:
+        controller.execute("NOTIFY threadingpg_test_c, 'c1'")
+        assert listner.notify_queue.get(timeout=5) == 'c1'
+        listner.unlisten_channel('threadingpg_test_c')
+    finally:
+        listner.stop_listening()
+    assert listner.notify_queue.get(timeout=5) is None
+
+class StatementTable(threadingpg.data.Table):
+    table_name = 'threadingpg_test_statement'
+    index = threadingpg.data.Column(data_type=threadingpg.types.serial)
+    name = threadingpg.data.Column(data_type=threadingpg.types.varchar())
+
+def test_subscribe_statement_payload_after_start_listening(controller, connect_kwargs):
+    table = StatementTable()
+    listner = threadingpg.TriggerListner()
+    listner.connect(**connect_kwargs)
+    controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+    controller.create_table(table)
+    listner.create_function('threadingpg_test_statement_fn', 'threadingpg_test_statement_ch', is_statement=True, chunk_size=2)
+    listner.create_trigger(table, 'threadingpg_test_statement_tr', 'threadingpg_test_statement_fn', is_statement=True)
+    listner.start_listening()
+    try:
+        notifications = queue.Queue()
+        listner.subscribe('threadingpg_test_other_ch', notifications.put)
+        listner.subscribe('threadingpg_test_statement_ch', notifications.put, is_statement_payload=True)
+        controller.insert_rows(table, [{'name': f'row_{index}'} for index in range(3)])
+
+        names = [get_notification(notifications).data['new_record']['name'] for _ in range(3)]
+        assert sorted(names) == ['row_0', 'row_1', 'row_2']
+        with pytest.raises(queue.Empty):
+            notifications.get(timeout=0.2)
+    finally:
+        listner.stop_listening()
+        controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+        controller.execute("DROP FUNCTION IF EXISTS threadingpg_test_statement_fn;")
+
+def test_statement_update_has_old_key(controller, connect_kwargs):
+    table = StatementTable()
+    assert threadingpg.query.create_statement_trigger(table.table_name, 'tr', 'fn', False, 'update') == \
+        (f"CREATE TRIGGER tr AFTER UPDATE ON {table.table_name} "
+         "REFERENCING OLD TABLE AS old_table NEW TABLE AS new_table FOR EACH STATEMENT EXECUTE PROCEDURE fn();")
+    listner = threadingpg.TriggerListner()
+    listner.connect(**connect_kwargs)
+    controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+    controller.create_table(table)
+    controller.insert_rows(table, [{'name': f'row_{index}'} for index in range(3)])
+    listner.create_function('threadingpg_test_statement_fn', 'threadingpg_test_statement_ch', 
+                            is_statement=True, chunk_size=2, key_column_name='index')
+    listner.create_trigger(table, 'threadingpg_test_statement_tr', 'threadingpg_test_statement_fn', is_statement=True)
+    listner.start_listening()
+    try:
+        notifications = queue.Queue()
+        listner.subscribe('threadingpg_test_statement_ch', notifications.put, is_statement_payload=True)
+        # key column is updated.
+        controller.execute(f"UPDATE {table.table_name} SET index = index + 100;")
+
+        keys = sorted((notification.data['old_key'], notification.data['key']) 
+                      for notification in [get_notification(notifications) for _ in range(3)])
+        assert keys == [(1, 101), (2, 102), (3, 103)]
+        with pytest.raises(queue.Empty):
+            notifications.get(timeout=0.2)
+    finally:
+        listner.stop_listening()
+        controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+        controller.execute("DROP FUNCTION IF EXISTS threadingpg_test_statement_fn;")
+
+def test_fan_out_writer_of_channels(controller, listner):
+    writer = threadingpg.ringbuffer.RingBufferWriter(capacity=4096, max_consumers=1)
+    consumer = threadingpg.ringbuffer.RingBufferConsumer(writer.name, 0)
+    try:
+        listner.fan_out('threadingpg_test_fan_a', writer)
+        listner.fan_out('threadingpg_test_fan_b', writer)
+        # bigger than capacity. dropped without stopping listening thread.
+        controller.execute(f"NOTIFY threadingpg_test_fan_a, '{'x' * 5000}'")
+        controller.execute("NOTIFY threadingpg_test_fan_a, 'a1'")
+        channel, payload = consumer.get(timeout=5)
+        assert (channel, bytes(payload)) == ('threadingpg_test_fan_a', b'a1')
+        payload.release()
+        assert writer.dropped_count == 1
+
+        # writer is used by other channel.
+        listner.unsubscribe('threadingpg_test_fan_a')
+        controller.execute("NOTIFY threadingpg_test_fan_b, 'b1'")
+        channel, payload = consumer.get(timeout=5)
+        assert (channel, bytes(payload)) == ('threadingpg_test_fan_b', b'b1')
+        payload.release()
+
+        listner.unsubscribe('threadingpg_test_fan_b')
+        assert consumer.get(timeout=5) is None
+    finally:
+        consumer.close()
+        writer.close()
+        writer.unlink()
@@ -0,0 +1,82 @@
+import json
+import queue
+
+from threadingpg import notification
+
+def make_notification(operation:str, key:int, name:str = None) -> notification.Notification:
+    data = {'operation': operation, 'table_name': 'mytable', 'key': key}
+    if name is not None:
+        data['name'] = name
+    return notification.Notification('mych', json.dumps(data))
+
+def coalesce(notifications:list) -> list:
+    emitted = queue.Queue()
+    coalescer = notification.Coalescer(emitted.put, window=10)
+    coalescer.start()
+    for row_notification in notifications:
+        coalescer.put(row_notification)
+    coalescer.stop()
+    assert coalescer.snapshot()['pending'] == 0
+    result = []
+    while not emitted.empty():
+        result.append(emitted.get())
+    return result
+
+def test_insert_and_update_is_insert_of_latest():
+    result = coalesce([make_notification('insert', 1, 'a'), make_notification('update', 1, 'b'), make_notification('update', 1, 'c')])
+    assert [(row.data['operation'], row.data['name'], row.coalesced_count) for row in result] == [('insert', 'c', 3)]
+
+def test_insert_and_delete_is_dropped():
+    coalescer_notifications = [make_notification('insert', 1), make_notification('update', 2), make_notification('update', 1), make_notification('delete', 1)]
+    result = coalesce(coalescer_notifications)
+    assert [(row.data['operation'], row.data['key']) for row in result] == [('update', 2)]
+
+def test_update_and_delete_is_delete():
+    result = coalesce([make_notification('update', 1), make_notification('delete', 1)])
+    assert [row.data['operation'] for row in result] == ['delete']
+
+def test_unkeyed_notification_is_emitted_in_order():
+    full_row = notification.Notification('mych', None, data={'operation': 'insert', 'table_name': 'mytable', 'new_record': {'v': 1}})
+    emitted = queue.Queue()
+    coalescer = notification.Coalescer(emitted.put, window=10)
+    coalescer.start()
+    for row_notification in [make_notification('insert', 1), full_row, make_notification('update', 1), full_row]:
+        coalescer.put(row_notification)
+    coalescer.stop()
+    result = [emitted.get_nowait() for _ in range(emitted.qsize())]
+    # default get_table_key fails for full-row payload. not dropped and not merged.
+    assert result == [result[0], full_row, full_row]
+    assert result[0].data['operation'] == 'insert'
+    assert coalescer.snapshot() == {'received': 4, 'emitted': 3, 'collapsed': 1, 'unkeyed': 2, 'pending': 0}
+
+def test_delete_and_insert_is_update():
+    merged = notification.merge_notification(make_notification('delete', 1), make_notification('insert', 1, 'a'))
+    assert (merged.data['operation'], merged.data['name'], merged.coalesced_count) == ('update', 'a', 2)
+
+def test_update_keeps_first_old_record():
+    first = notification.Notification('mych', None, data={'operation': 'update', 'old_record': {'v': 1}, 'new_record': {'v': 2}})
+    second = notification.Notification('mych', None, data={'operation': 'update', 'old_record': {'v': 2}, 'new_record': {'v': 3}})
+    merged = notification.merge_notification(first, second)
+    assert (merged.data['old_record'], merged.data['new_record']) == ({'v': 1}, {'v': 3})
+
+def test_insert_and_update_of_row_payload_has_no_old_record():
+    first = notification.Notification('mych', None, data={'operation': 'insert', 'new_record': {'v': 1}})
+    second = notification.Notification('mych', None, data={'operation': 'update', 'old_record': {'v': 1}, 'new_record': {'v': 2}})
+    merged = notification.merge_notification(first, second)
+    assert merged.data == {'operation': 'insert', 'new_record': {'v': 2}}
+
+def test_split_statement_notification():
+    statement_notification = notification.Notification('mych', json.dumps({'operation': 'delete', 'records': [{'v': 1}, {'v': 2}]}))
+    rows = notification.split_statement_notification(statement_notification)
+    assert [row.data for row in rows] == [{'operation': 'delete', 'old_record': {'v': 1}}, {'operation': 'delete', 'old_record': {'v': 2}}]
+
+def test_split_statement_notification_of_update():
+    statement_notification = notification.Notification('mych', json.dumps({'operation': 'update', 
+                                                                           'records': [{'v': 2}, {'v': 4}], 
+                                                                           'old_records': [{'v': 1}, {'v': 3}]}))
+    rows = notification.split_statement_notification(statement_notification)
+    assert [row.data for row in rows] == [{'operation': 'update', 'new_record': {'v': 2}, 'old_record': {'v': 1}}, 
+                                          {'operation': 'update', 'new_record': {'v': 4}, 'old_record': {'v': 3}}]
+    statement_notification = notification.Notification('mych', json.dumps({'operation': 'update', 'keys': [101], 'old_keys': [1]}))
+    rows = notification.split_statement_notification(statement_notification)
+    assert [row.data for row in rows] == [{'operation': 'update', 'key': 101, 'old_key': 1}]
@@ -0,0 +1,74 @@
+import datetime
+
+import pytest
+
+import threadingpg
+from threadingpg import data
+from threadingpg import types
+
+class EventTable(data.Table):
+    table_name = 'threadingpg_test_event'
+    index = data.Column(data_type=types.bigserial)
+    created = data.Column(data_type=types.timestamp(6))
+    partition_by = data.PartitionBy(created, 'RANGE', interval='day')
+
+class HashTable(data.Table):
+    table_name = 'threadingpg_test_hash'
+    index = data.Column(data_type=types.bigserial)
+    partition_by = data.PartitionBy(index, 'HASH', modulus=2)
+
+def test_partition_query():
+    assert threadingpg.Controller._make_create_table_query(HashTable()) == (
+        "CREATE TABLE threadingpg_test_hash (index bigserial) PARTITION BY HASH (index);"
+        " CREATE TABLE IF NOT EXISTS threadingpg_test_hash_p0 PARTITION OF threadingpg_test_hash FOR VALUES WITH (MODULUS 2, REMAINDER 0);"
+        " CREATE TABLE IF NOT EXISTS threadingpg_test_hash_p1 PARTITION OF threadingpg_test_hash FOR VALUES WITH (MODULUS 2, REMAINDER 1);")
+    assert threadingpg.query.detach_partition('t', 't_p1', is_concurrently=True) == "ALTER TABLE t DETACH PARTITION t_p1 CONCURRENTLY;"
+    assert threadingpg.query.detach_partition('t', 't_p1', True, is_finalize=True) == "ALTER TABLE t DETACH PARTITION t_p1 FINALIZE;"
+    assert threadingpg.query.create_partition('t', 't_default') == "CREATE TABLE IF NOT EXISTS t_default PARTITION OF t DEFAULT;"
+
+@pytest.mark.parametrize('interval, value, start, next_start, name', [
+    ('day', datetime.datetime(2024, 1, 31, 5), datetime.datetime(2024, 1, 31), datetime.datetime(2024, 2, 1), 't_p20240131'),
+    ('week', datetime.datetime(2024, 1, 31, 5), datetime.datetime(2024, 1, 29), datetime.datetime(2024, 2, 5), 't_p20240129'),
+    ('month', datetime.datetime(2024, 12, 31), datetime.datetime(2024, 12, 1), datetime.datetime(2025, 1, 1), 't_p202412'),
+    ('year', datetime.datetime(2024, 6, 1), datetime.datetime(2024, 1, 1), datetime.datetime(2025, 1, 1), 't_p2024'),
+])
+def test_partition_range(interval, value, start, next_start, name):
+    partition_by = data.PartitionBy(EventTable.created, 'RANGE', interval=interval)
+    assert partition_by.get_range_start(value) == start
+    assert partition_by.shift_range_start(start, 1) == next_start
+    assert partition_by.shift_range_start(next_start, -1) == start
+    assert partition_by.get_partition_name('t', start) == name
+    assert partition_by.parse_partition_name('t', name) == start
+    assert partition_by.parse_partition_name('t', 't_default') is None
+
+def test_range_partitions(controller):
+    table = EventTable()
+    controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+    try:
+        controller.create_table(table)
+        now = datetime.datetime(2024, 1, 10, 12)
+        partition_names = controller.create_range_partitions(table, count=7, start=now - datetime.timedelta(days=4))
+        assert partition_names[0] == 'threadingpg_test_event_p20240106' and partition_names[-1] == 'threadingpg_test_event_p20240112'
+        # existing partitions are skipped.
+        assert controller.create_range_partitions(table, count=2, start=now) == ['threadingpg_test_event_p20240110', 'threadingpg_test_event_p20240111']
+        controller.insert_rows(table, [{'created': now - datetime.timedelta(days=days)} for days in range(5)])
+
+        expired_partition_names = controller.drop_expired_partitions(table, retention=2, now=now, is_concurrently=True)
+        assert expired_partition_names == ['threadingpg_test_event_p20240106', 'threadingpg_test_event_p20240107']
+        assert controller.get_partition_names(table)[0] == 'threadingpg_test_event_p20240108'
+        _, rows = controller.select(table)
+        assert len(rows) == 3
+    finally:
+        controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+
+def test_hash_partitions(controller):
+    table = HashTable()
+    controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+    try:
+        controller.create_table(table)
+        controller.insert_rows(table, [{'index': index} for index in range(1, 11)])
+        assert controller.get_partition_names(table) == ['threadingpg_test_hash_p0', 'threadingpg_test_hash_p1']
+        _, rows = controller.select(table)
+        assert len(rows) == 10
+    finally:
+        controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
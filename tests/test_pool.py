@@ -0,0 +1,235 @@
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+from psycopg2.pool import PoolError
+
+from threadingpg import pool
+
+class FakeCursor:
+    def __init__(self, connection) -> None:
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, excutable_query:str):
+        self.connection.executed_queries.append(excutable_query)
+        if self.connection.is_broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+class FakeInfo:
+    transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+class FakeConnection:
+    def __init__(self, number:int) -> None:
+        self.number = number
+        self.closed = 0
+        self.autocommit = True
+        self.info = FakeInfo()
+        self.is_broken = False
+        self.executed_queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def connections(monkeypatch) -> list:
+    '''
+    Connections made by pool. psycopg2.connect() of pool is stubbed.
+    '''
+    connections = []
+    lock = threading.Lock()
+    def connect(dsn:str) -> FakeConnection:
+        with lock:
+            connection = FakeConnection(len(connections))
+            connections.append(connection)
+        return connection
+    monkeypatch.setattr(pool.psycopg2, 'connect', connect)
+    return connections
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(pool, 'time', clock)
+    return clock
+
+def wait_until(function, timeout:float = 5):
+    deadline = time.monotonic() + timeout
+    while not function():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+def test_waiters_get_connection_in_fifo_order(connections):
+    connection_pool = pool.ConnectionPool(0, 1, 'dsn')
+    connection = connection_pool.getconn()
+    acquired_order = []
+    def acquire(name:str):
+        acquired_connection = connection_pool.getconn(timeout=5)
+        acquired_order.append(name)
+        connection_pool.putconn(acquired_connection)
+
+    threads = []
+    for index in range(3):
+        thread = threading.Thread(target=acquire, args=(f"waiter_{index}", ))
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: connection_pool.waiting_count == index + 1)
+    connection_pool.putconn(connection)
+    for thread in threads:
+        thread.join()
+    assert acquired_order == ['waiter_0', 'waiter_1', 'waiter_2']
+    # connection is handed over. not made again.
+    assert len(connections) == 1
+    assert (connection_pool.idle_count, connection_pool.used_count, connection_pool.waiting_count) == (1, 0, 0)
+
+def test_closed_connection_hands_over_permission(connections):
+    connection_pool = pool.ConnectionPool(0, 1, 'dsn')
+    connection = connection_pool.getconn()
+    acquired_connections = []
+    thread = threading.Thread(target=lambda: acquired_connections.append(connection_pool.getconn(timeout=5)))
+    thread.start()
+    wait_until(lambda: connection_pool.waiting_count == 1)
+    connection_pool.putconn(connection, close=True)
+    thread.join()
+    # first waiter makes new connection.
+    assert acquired_connections == [connections[1]]
+    assert connection.closed
+    assert connection_pool.connection_count == 1
+
+def test_timeout(connections):
+    connection_pool = pool.ConnectionPool(0, 1, 'dsn')
+    connection = connection_pool.getconn()
+    with pytest.raises(PoolError):
+        connection_pool.getconn(timeout=0.01)
+    assert connection_pool.waiting_count == 0
+    assert connection_pool.metrics.snapshot()['counters']['acquire_timeout'] == 1
+    # timed out waiter does not take returned connection.
+    connection_pool.putconn(connection)
+    assert (connection_pool.idle_count, connection_pool.used_count) == (1, 0)
+
+class HandedOverAtTimeoutWaiter(pool.Waiter):
+    connection_pool = None
+    held_connection = None
+
+    def __init__(self) -> None:
+        super().__init__()
+        waiter = self
+        class Event(threading.Event):
+            def wait(self, timeout=None):
+                # connection is handed over after timeout, before getconn() takes lock.
+                waiter.connection_pool.putconn(waiter.held_connection)
+                return False
+        self.event = Event()
+
+def test_connection_handed_over_at_timeout_is_not_lost(connections, monkeypatch):
+    connection_pool = pool.ConnectionPool(0, 1, 'dsn')
+    connection = connection_pool.getconn()
+    HandedOverAtTimeoutWaiter.connection_pool = connection_pool
+    HandedOverAtTimeoutWaiter.held_connection = connection
+    monkeypatch.setattr(pool, 'Waiter', HandedOverAtTimeoutWaiter)
+    assert connection_pool.getconn(timeout=0) is connection
+    assert (connection_pool.idle_count, connection_pool.used_count, connection_pool.waiting_count) == (0, 1, 0)
+    assert connection_pool.metrics.snapshot()['counters']['acquire_timeout'] == 0
+
+def test_liveness_check_on_checkout(connections, clock):
+    connection_pool = pool.ConnectionPool(1, 1, 'dsn', check_interval=5)
+    connection = connection_pool.getconn()
+    connection_pool.putconn(connection)
+    # idle shorter than check_interval is not checked.
+    clock.now = 1
+    assert connection_pool.getconn() is connection
+    assert connection.executed_queries == []
+    connection_pool.putconn(connection)
+
+    clock.now = 10
+    assert connection_pool.getconn() is connection
+    assert connection.executed_queries == ["SELECT 1;"]
+    connection_pool.putconn(connection)
+
+    connection.is_broken = True
+    clock.now = 20
+    new_connection = connection_pool.getconn()
+    assert new_connection is connections[1]
+    assert connection.closed
+    assert connection_pool.connection_count == 1
+
+def test_expired_connection_is_closed(connections, clock):
+    connection_pool = pool.ConnectionPool(0, 2, 'dsn', max_lifetime=60)
+    connection = connection_pool.getconn()
+    clock.now = 61
+    connection_pool.putconn(connection)
+    assert connection.closed
+    assert (connection_pool.connection_count, connection_pool.idle_count) == (0, 0)
+
+def test_idle_connections_over_minconn_are_evicted(connections, clock):
+    connection_pool = pool.ConnectionPool(1, 3, 'dsn', idle_timeout=10)
+    used_connections = [connection_pool.getconn() for _ in range(3)]
+    for connection in used_connections:
+        connection_pool.putconn(connection)
+    assert connection_pool.idle_count == 3
+
+    clock.now = 11
+    connection = connection_pool.getconn()
+    connection_pool.putconn(connection)
+    # minconn is kept.
+    assert (connection_pool.connection_count, connection_pool.idle_count) == (1, 1)
+    assert [connection.closed for connection in connections].count(1) == 2
+
+def test_reaper(connections, clock):
+    connection_pool = pool.ConnectionPool(1, 2, 'dsn', check_interval=5, idle_timeout=10, reap_interval=0.001)
+    try:
+        first_connection, second_connection = connection_pool.getconn(), connection_pool.getconn()
+        connection_pool.putconn(first_connection)
+        connection_pool.putconn(second_connection)
+        # idle connection over minconn is closed by reaper.
+        clock.now = 11
+        wait_until(lambda: connection_pool.connection_count == 1)
+
+        # dead idle connection is closed and minconn is made again.
+        idle_connection = connection_pool.getconn()
+        connection_pool.putconn(idle_connection)
+        idle_connection.is_broken = True
+        clock.now = 30
+        wait_until(lambda: idle_connection.closed and connection_pool.idle_count == 1)
+        assert len(connections) == 3
+        assert connection_pool.connection_count == 1
+        assert connection_pool.used_count == 0
+    finally:
+        connection_pool.closeall()
+
+def test_closeall_wakes_waiters(connections):
+    connection_pool = pool.ConnectionPool(0, 1, 'dsn')
+    connection = connection_pool.getconn()
+    errors = []
+    def acquire():
+        try:
+            connection_pool.getconn(timeout=5)
+        except PoolError as e:
+            errors.append(e)
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    wait_until(lambda: connection_pool.waiting_count == 1)
+    connection_pool.closeall()
+    thread.join()
+    assert len(errors) == 1
+    connection_pool.putconn(connection)
+    assert connection.closed
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import psycopg2.extensions
+import pytest
+
+import threadingpg
+
+def make_replica_dsn(connect_kwargs:dict, application_name:str) -> str:
+    '''
+    Replica of same server. connection is known by application_name.
+    '''
+    return psycopg2.extensions.make_dsn(**connect_kwargs, application_name=application_name)
+
+def get_application_name(pool:threadingpg.Pool, is_read:bool) -> str:
+    with pool.get(is_read=is_read) as (_, conn):
+        return conn.info.dsn_parameters.get('application_name', 'primary')
+
+@pytest.fixture
+def make_pool(connect_kwargs):
+    pools = []
+    def make_pool(replica_names:list = ('replica_1', 'replica_2'), **kwargs) -> threadingpg.Pool:
+        pool = threadingpg.Pool(**connect_kwargs,
+                                replica_dsns=[make_replica_dsn(connect_kwargs, replica_name) for replica_name in replica_names],
+                                **kwargs)
+        pools.append(pool)
+        return pool
+    yield make_pool
+    for pool in pools:
+        pool.close()
+
+def test_reads_are_routed_to_replicas(make_pool):
+    pool = make_pool(balance='round_robin')
+    assert get_application_name(pool, is_read=False) == 'primary'
+    assert [get_application_name(pool, is_read=True) for _ in range(4)] == ['replica_1', 'replica_2', 'replica_1', 'replica_2']
+    _, rows = pool.select(threadingpg.data.Table(table_name='pg_database'), limit_count=1)
+    assert len(rows) == 1
+    assert pool.get_replica_pools()[0].metrics.snapshot()['counters']['acquire'] == 3
+
+def test_least_busy(make_pool):
+    pool = make_pool()
+    with pool.get(is_read=True) as (_, conn):
+        busy_name = conn.info.dsn_parameters['application_name']
+        # replica with fewer used connections.
+        assert get_application_name(pool, is_read=True) != busy_name
+
+def test_use_primary(make_pool):
+    pool = make_pool()
+    with pool.use_primary():
+        with pool.use_primary():
+            assert get_application_name(pool, is_read=True) == 'primary'
+        assert get_application_name(pool, is_read=True) == 'primary'
+    assert get_application_name(pool, is_read=True) != 'primary'
+
+def test_read_your_writes(make_pool, monkeypatch):
+    pool = make_pool(read_your_writes=60)
+    assert get_application_name(pool, is_read=True) != 'primary'
+    with pool.get() as (cursor, _):
+        cursor.execute("SELECT 1;")
+    # same thread reads from primary after write.
+    assert get_application_name(pool, is_read=True) == 'primary'
+    other_thread_names = []
+    thread = threading.Thread(target=lambda: other_thread_names.append(get_application_name(pool, is_read=True)))
+    thread.start()
+    thread.join()
+    assert other_thread_names[0] != 'primary'
+
+    class LaterTime:
+        perf_counter = staticmethod(time.perf_counter)
+        @staticmethod
+        def monotonic() -> float:
+            return time.monotonic() + 61
+    monkeypatch.setattr(threadingpg.controllers, 'time', LaterTime)
+    assert get_application_name(pool, is_read=True) != 'primary'
+
+def test_failed_replica_falls_back_to_primary(connect_kwargs):
+    broken_dsn = psycopg2.extensions.make_dsn(**{**connect_kwargs, 'port': 1}, connect_timeout=1)
+    pool = threadingpg.Pool(**connect_kwargs, replica_dsns=[broken_dsn], minconn=0)
+    try:
+        assert get_application_name(pool, is_read=True) == 'primary'
+    finally:
+        pool.close()
@@ -0,0 +1,119 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import threadingpg
+from threadingpg import ringbuffer
+
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def writer():
+    writer = ringbuffer.RingBufferWriter(capacity=256, max_consumers=2)
+    yield writer
+    writer.close()
+    writer.unlink()
+
+def read(consumer:ringbuffer.RingBufferConsumer) -> tuple:
+    channel, payload_view = consumer.get(timeout=1)
+    payload = bytes(payload_view)
+    payload_view.release()
+    return channel, payload
+
+def test_wraparound(writer):
+    consumer = ringbuffer.RingBufferConsumer(writer.name, 0)
+    try:
+        # record sizes are not divisor of capacity. records wrap many times.
+        for index in range(200):
+            payload = str(index).encode() * (index % 7 + 1)
+            writer.write(payload, b'ch')
+            assert read(consumer) == ('ch', payload)
+        assert consumer.overrun_count == 0
+        assert writer.get_lags()[0] == 0
+    finally:
+        consumer.close()
+
+def test_overrun_skips_to_oldest_record(writer):
+    consumer = ringbuffer.RingBufferConsumer(writer.name, 0)
+    try:
+        payloads = [f"payload_{index:04d}".encode() for index in range(100)]
+        for payload in payloads:
+            writer.write(payload)
+        assert 256 < writer.get_lags()[0]
+
+        received = [read(consumer)[1]]
+        assert consumer.overrun_count == 1
+        while writer.get_lags()[0]:
+            received.append(read(consumer)[1])
+        # latest records in buffer are read in order.
+        assert len(received) < len(payloads)
+        assert received == payloads[-len(received):]
+    finally:
+        consumer.close()
+
+def test_stop_and_timeout(writer):
+    consumer = ringbuffer.RingBufferConsumer(writer.name, 1)
+    try:
+        with pytest.raises(TimeoutError):
+            consumer.get(timeout=0.01)
+        writer.write(b'last')
+        writer.stop()
+        assert read(consumer) == ('', b'last')
+        assert consumer.get(timeout=1) is None
+    finally:
+        consumer.close()
+
+def test_put_drops_record_bigger_than_capacity(writer):
+    consumer = ringbuffer.RingBufferConsumer(writer.name, 0)
+    try:
+        with pytest.raises(ValueError):
+            writer.write(b'x' * 256)
+        writer.put(threadingpg.notification.Notification('ch', 'x' * 256))
+        assert writer.dropped_count == 1
+        writer.put(threadingpg.notification.Notification('ch', 'small'))
+        assert read(consumer) == ('ch', b'small')
+    finally:
+        consumer.close()
+
+consumer_script = '''
+import sys
+from threadingpg import ringbuffer
+consumer = ringbuffer.RingBufferConsumer(sys.argv[1], 0)
+print('attached', flush=True)
+channel, payload_view = consumer.get(timeout=10)
+print(channel, bytes(payload_view).decode(), flush=True)
+payload_view.release()
+consumer.close()
+'''
+
+def run_consumer_process(writer:ringbuffer.RingBufferWriter, payload:bytes) -> str:
+    # independent process has own resource tracker.
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root_path, os.environ.get('PYTHONPATH', '')]))
+    process = subprocess.Popen([sys.executable, '-c', consumer_script, writer.name], 
+                               stdout=subprocess.PIPE, 
+                               stderr=subprocess.PIPE, 
+                               env=env, 
+                               text=True)
+    try:
+        assert process.stdout.readline() == 'attached\n'
+        writer.write(payload, b'ch')
+        stdout, stderr = process.communicate(timeout=30)
+    finally:
+        process.kill()
+    assert process.returncode == 0, stderr
+    assert 'leaked' not in stderr
+    return stdout
+
+def test_consumer_process_exit_keeps_shared_memory():
+    writer = ringbuffer.RingBufferWriter(capacity=256, max_consumers=1)
+    try:
+        assert run_consumer_process(writer, b'first') == 'ch first\n'
+        # shared memory is not unlinked by exit of consumer process.
+        assert run_consumer_process(writer, b'second') == 'ch second\n'
+        consumer = ringbuffer.RingBufferConsumer(writer.name, 0)
+        consumer.close()
+    finally:
+        writer.close()
+        writer.unlink()
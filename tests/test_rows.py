@@ -0,0 +1,125 @@
+import pytest
+
+import threadingpg
+from threadingpg import data
+from threadingpg import types
+
+class RowTable(data.Table):
+    table_name = 'threadingpg_test_rows'
+    index = data.Column(data_type=types.serial, is_primary_key=True)
+    name = data.Column(data_type=types.varchar(), is_unique=True)
+    count = data.Column(data_type=types.integer)
+
+@pytest.fixture
+def table(controller):
+    table = RowTable()
+    controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+    controller.execute(f"CREATE TABLE {table.table_name} (index serial PRIMARY KEY, name varchar UNIQUE, count integer);")
+    yield table
+    controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+
+def select_rows(controller, table) -> list:
+    _, rows = controller.select(table, order_by=threadingpg.condition.OrderBy(table.index))
+    return rows
+
+def test_upsert_query():
+    table = RowTable()
+    upsert_query, params = threadingpg.Controller._make_insert_rows_query(table, 
+                                                                          [{'name': 'a', 'count': 1}, {'name': 'b'}], 
+                                                                          ('name', '(xmax = 0)'), 
+                                                                          ('name', ))
+    assert upsert_query == ("INSERT INTO threadingpg_test_rows (name,count) VALUES (%s,%s),(%s,DEFAULT) "
+                            "ON CONFLICT (name) DO UPDATE SET count=EXCLUDED.count RETURNING name,(xmax = 0);")
+    assert params == ['a', 1, 'b']
+    do_nothing_query, _ = threadingpg.Controller._make_insert_rows_query(table, [{'name': 'a'}], None, ('name', ), ())
+    assert do_nothing_query == "INSERT INTO threadingpg_test_rows (name) VALUES (%s) ON CONFLICT (name) DO NOTHING;"
+
+def test_upsert_rows(controller, table):
+    controller.insert_dict(table, {'index': 100, 'name': 'old', 'count': 1})
+    rows = [{'index': 100, 'name': 'old', 'count': 2}, 
+            {'name': 'new_1', 'count': 3}, 
+            {'name': 'new_2', 'count': 4}, 
+            {'index': 100, 'name': 'old', 'count': 5}]
+    inserted_rows, updated_rows = controller.upsert_rows(table, rows, conflict_columns=[table.index], is_returning=True)
+    # rows without serial key are not deduplicated and get returned key.
+    assert inserted_rows == [rows[1], rows[2]]
+    assert updated_rows == [rows[3]]
+    assert rows[1]['index'] is not None and rows[2]['index'] is not None
+    assert select_rows(controller, table) == [(rows[1]['index'], 'new_1', 3), (rows[2]['index'], 'new_2', 4), (100, 'old', 5)]
+
+def test_upsert_rows_do_nothing(controller, table):
+    controller.insert_dict(table, {'name': 'a', 'count': 1})
+    inserted_rows, updated_rows = controller.upsert_rows(table, 
+                                                         [{'name': 'a', 'count': 2}, {'name': 'b', 'count': 3}], 
+                                                         conflict_columns=[table.name], 
+                                                         update_columns=[], 
+                                                         is_returning=True)
+    assert inserted_rows == [{'name': 'b', 'count': 3}]
+    assert updated_rows == []
+    assert [row[1:] for row in select_rows(controller, table)] == [('a', 1), ('b', 3)]
+
+def test_upsert_returning_ordinal_query():
+    params = ['a', 'b']
+    ordinal_query = threadingpg.query.returning_ordinal("INSERT INTO t (name) VALUES (%s),(%s) RETURNING name,(xmax = 0);", 
+                                                        ('name', ), 
+                                                        ('varchar', ), 
+                                                        [(0, ('a', )), (1, ('b', ))], 
+                                                        params)
+    assert ordinal_query == ("WITH returned AS (INSERT INTO t (name) VALUES (%s),(%s) RETURNING name,(xmax = 0)), "
+                             "v(ordinal,name) AS (VALUES (0::integer,%s::varchar),(1,%s)) "
+                             "SELECT (SELECT min(v.ordinal) FROM v WHERE v.name=returned.name),returned.* FROM returned;")
+    assert params == ['a', 'b', 'a', 'b']
+    unkeyed_query = threadingpg.query.returning_ordinal("INSERT INTO t (name) VALUES (%s) RETURNING index,(xmax = 0);", ('index', ), ('integer', ), [])
+    assert unkeyed_query == "WITH returned AS (INSERT INTO t (name) VALUES (%s) RETURNING index,(xmax = 0)) SELECT NULL::integer,returned.* FROM returned;"
+
+def test_upsert_rows_mixed_key_types(controller, table):
+    controller.insert_dict(table, {'index': 200, 'name': 'old', 'count': 1})
+    rows = [{'index': '100', 'name': 'changed'}, 
+            {'name': 'brand_new'}, 
+            {'index': 200, 'name': 'updated'}, 
+            {'name': 'brand_new_2'}]
+    inserted_rows, updated_rows = controller.upsert_rows(table, rows, conflict_columns=[table.index], is_returning=True)
+    # key of python str is matched to integer key of database.
+    assert inserted_rows == [rows[0], rows[1], rows[3]]
+    assert updated_rows == [rows[2]]
+    assert rows[0]['index'] == '100'
+    assert select_rows(controller, table) == [(rows[1]['index'], 'brand_new', None), 
+                                              (rows[3]['index'], 'brand_new_2', None), 
+                                              (100, 'changed', None), 
+                                              (200, 'updated', 1)]
+
+def test_update_rows_query():
+    table = RowTable()
+    update_query, params = threadingpg.Controller._make_update_rows_query(table, 
+                                                                          [{'index': 1, 'name': 'a', 'count': None}, {'index': 2, 'name': 'b', 'count': 3}], 
+                                                                          ('index', ))
+    assert update_query == ("UPDATE threadingpg_test_rows SET name=v.name,count=COALESCE(v.count,threadingpg_test_rows.count) "
+                            "FROM (VALUES (%s::integer,%s::varchar,NULL::integer),(%s,%s,%s)) AS v(index,name,count) "
+                            "WHERE threadingpg_test_rows.index=v.index;")
+    assert params == [1, 'a', 2, 'b', 3]
+    with pytest.raises(ValueError):
+        threadingpg.Controller._make_update_rows_query(table, [{'name': 'a'}], ('index', ))
+
+def test_update_rows(controller, table):
+    controller.insert_rows(table, [{'name': f'row_{index}', 'count': index} for index in range(1, 6)])
+    rows = [{'index': 1, 'name': 'first', 'count': 10}, 
+            {'index': 2, 'count': 20}, 
+            {'index': 1, 'name': 'last'}, 
+            {'index': 100, 'name': 'missing'}]
+    # same key in one batch is deduplicated. last row is kept.
+    assert controller.update_rows(table, rows, key_columns=[table.index]) == 2
+    assert select_rows(controller, table) == [(1, 'last', 1), (2, 'row_2', 20), (3, 'row_3', 3), (4, 'row_4', 4), (5, 'row_5', 5)]
+    # one statement per batch.
+    assert controller.update_rows(table, rows, key_columns=[table.index], batch_size=2) == 3
+    assert select_rows(controller, table)[0] == (1, 'last', 10)
+
+def test_paginate(controller, table):
+    controller.insert_rows(table, [{'name': f'row_{index:02d}', 'count': index % 3} for index in range(25)])
+    pages = list(controller.paginate(table, [table.count, table.index], page_size=10))
+    assert [len(rows) for _, rows in pages] == [10, 10, 5]
+    keys = [(row[2], row[0]) for _, rows in pages for row in rows]
+    assert keys == sorted(keys)
+
+    where = threadingpg.condition.Equal(table.count, 0)
+    rows = [row for _, rows in controller.paginate(table, [table.index], where=where, page_size=3, is_desc=True) for row in rows]
+    assert [row[0] for row in rows] == [index + 1 for index in range(24, -1, -1) if index % 3 == 0]
@@ -0,0 +1,137 @@
+import psycopg2
+import pytest
+
+import threadingpg
+from threadingpg import condition
+from threadingpg import data
+from threadingpg import types
+
+class CacheTable(data.Table):
+    table_name = 'threadingpg_test_statement_cache'
+    index = data.Column(data_type=types.serial, is_primary_key=True)
+    name = data.Column(data_type=types.varchar())
+
+@pytest.fixture
+def table(controller):
+    table = CacheTable()
+    controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+    controller.execute(f"CREATE TABLE {table.table_name} (index serial PRIMARY KEY, name varchar);")
+    controller.execute(f"INSERT INTO {table.table_name} (name) VALUES ('a'), ('b');")
+    yield table
+    controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+
+def get_prepared_statements(controller) -> list:
+    with controller.get() as (cursor, _):
+        cursor.execute("SELECT statement FROM pg_prepared_statements ORDER BY prepare_time;")
+        return [row[0] for row in cursor.fetchall()]
+
+def select_name(controller, table, index:int) -> list:
+    _, rows = controller.select(table, where=condition.Equal(table.index, index))
+    return [row[1] for row in rows]
+
+def test_prepared_at_threshold(controller, table):
+    assert select_name(controller, table, 1) == ['a']
+    # one-off query is not prepared.
+    assert get_prepared_statements(controller) == []
+    assert select_name(controller, table, 2) == ['b']
+    assert len(get_prepared_statements(controller)) == 1
+    assert select_name(controller, table, 1) == ['a']
+    assert len(get_prepared_statements(controller)) == 1
+
+def test_bulk_statements_are_not_prepared(controller, table):
+    for _ in range(3):
+        controller.upsert_rows(table, [{'index': 1, 'name': 'a'}, {'index': 2, 'name': 'b'}], conflict_columns=[table.index])
+        controller.update_rows(table, [{'index': 1, 'name': 'a'}, {'index': 2, 'name': 'b'}], key_columns=[table.index])
+    assert get_prepared_statements(controller) == []
+
+def test_insert_rows_are_not_prepared(controller, table):
+    # None is DEFAULT in VALUES. shape of statement differs per batch.
+    rows = [{'name': None if index % 7 == 0 else f'row_{index}'} for index in range(1000)]
+    controller.insert_rows(table, rows, batch_size=10)
+    assert get_prepared_statements(controller) == []
+    _, rows = controller.select(table)
+    assert len(rows) == 1002
+
+def test_prepare_threshold_one(connect_kwargs, table):
+    controller = threadingpg.Controller(prepare_threshold=1)
+    controller.connect(**connect_kwargs)
+    try:
+        assert select_name(controller, table, 1) == ['a']
+        assert len(get_prepared_statements(controller)) == 1
+    finally:
+        controller.close()
+    with pytest.raises(ValueError):
+        threadingpg.Controller(prepare_threshold=0)
+
+def test_is_repeated():
+    statement_cache = threadingpg.controllers.StatementCache(size=2, prepare_threshold=3)
+    assert not statement_cache.is_repeated('a')
+    assert not statement_cache.is_repeated('a')
+    assert statement_cache.is_repeated('a')
+    # counts are kept for size queries.
+    statement_cache.is_repeated('b')
+    statement_cache.is_repeated('b')
+    statement_cache.is_repeated('c')
+    statement_cache.is_repeated('d')
+    assert not statement_cache.is_repeated('b')
+
+@pytest.fixture
+def prepared_controller(connect_kwargs):
+    prepared_controller = threadingpg.Controller(statement_cache_size=1, prepare_threshold=1)
+    prepared_controller.connect(**connect_kwargs)
+    yield prepared_controller
+    prepared_controller.close()
+
+def test_lru():
+    statement_cache = threadingpg.controllers.StatementCache(size=2)
+    assert statement_cache.put('a', 'statement_a', 1) is None
+    assert statement_cache.put('b', 'statement_b', 1) is None
+    assert statement_cache.get('a') == ('statement_a', 1)
+    # 'b' is least recently used.
+    assert statement_cache.put('c', 'statement_c', 1) == 'statement_b'
+    assert statement_cache.get('b') == (None, 0)
+
+def test_evicted_statement_is_deallocated(prepared_controller, table):
+    assert select_name(prepared_controller, table, 1) == ['a']
+    _, rows = prepared_controller.select(table, where=condition.Equal(table.name, 'b'))
+    assert [row[1] for row in rows] == ['b']
+    prepared_statements = get_prepared_statements(prepared_controller)
+    assert len(prepared_statements) == 1
+    assert 'name' in prepared_statements[0]
+
+def test_clear_statement_cache(prepared_controller, table):
+    select_name(prepared_controller, table, 1)
+    with prepared_controller.get() as (cursor, _):
+        cursor.execute("SELECT name FROM pg_prepared_statements;")
+        first_names = cursor.fetchall()
+    prepared_controller.clear_statement_cache()
+    # DEALLOCATE ALL at next execution. prepared again.
+    assert select_name(prepared_controller, table, 1) == ['a']
+    with prepared_controller.get() as (cursor, _):
+        cursor.execute("SELECT name FROM pg_prepared_statements;")
+        second_names = cursor.fetchall()
+    assert len(second_names) == 1 and first_names != second_names
+
+def test_retry_after_schema_change(prepared_controller, controller, table):
+    assert select_name(prepared_controller, table, 1) == ['a']
+    controller.execute(f"ALTER TABLE {table.table_name} ADD COLUMN count integer DEFAULT 0;")
+    # result type of prepared statement is changed. prepared again and executed.
+    _, rows = prepared_controller.select(table, where=condition.Equal(table.index, 1))
+    assert rows == [(1, 'a', 0)]
+
+def test_retry_after_deallocated_by_server(prepared_controller, table):
+    assert select_name(prepared_controller, table, 1) == ['a']
+    with prepared_controller.get() as (cursor, _):
+        cursor.execute("DEALLOCATE ALL;")
+    assert select_name(prepared_controller, table, 2) == ['b']
+    assert len(get_prepared_statements(prepared_controller)) == 1
+
+def test_no_retry_in_transaction(prepared_controller, controller, table):
+    assert select_name(prepared_controller, table, 1) == ['a']
+    controller.execute(f"ALTER TABLE {table.table_name} ADD COLUMN count integer DEFAULT 0;")
+    # statement can not be executed again in aborted transaction.
+    with pytest.raises(psycopg2.errors.FeatureNotSupported):
+        with prepared_controller.transaction() as tx:
+            tx.select(table, where=condition.Equal(table.index, 1))
+    _, rows = prepared_controller.select(table, where=condition.Equal(table.index, 1))
+    assert rows == [(1, 'a', 0)]
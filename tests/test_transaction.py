@@ -0,0 +1,110 @@
+import psycopg2
+import pytest
+
+import threadingpg
+from threadingpg import data
+from threadingpg import types
+
+class TransactionTable(data.Table):
+    table_name = 'threadingpg_test_transaction'
+    index = data.Column(data_type=types.serial, is_primary_key=True)
+    name = data.Column(data_type=types.varchar(), is_unique=True)
+
+@pytest.fixture
+def table(controller):
+    table = TransactionTable()
+    controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+    controller.execute(f"CREATE TABLE {table.table_name} (index serial PRIMARY KEY, name varchar UNIQUE);")
+    yield table
+    controller.execute(f"DROP TABLE IF EXISTS {table.table_name};")
+
+@pytest.fixture
+def other_controller(connect_kwargs):
+    '''
+    Other connection to see committed rows.
+    '''
+    other_controller = threadingpg.Controller()
+    other_controller.connect(**connect_kwargs)
+    yield other_controller
+    other_controller.close()
+
+def select_names(controller, table) -> list:
+    _, rows = controller.select(table, order_by=threadingpg.condition.OrderBy(table.index))
+    return [row[1] for row in rows]
+
+def test_buffered_flush(controller, other_controller, table):
+    with controller.transaction(batch_size=3) as tx:
+        tx.insert_dict(table, {'name': 'a'})
+        tx.insert_dict(table, {'name': 'b'})
+        assert tx.flush_count == 0
+        tx.insert_dict(table, {'name': 'c'})
+        # sent in one round trip. not committed.
+        assert tx.flush_count == 1
+        assert select_names(other_controller, table) == []
+        tx.insert_dict(table, {'name': 'd'})
+        _, rows = tx.select(table)
+        assert [row[1] for row in rows] == ['a', 'b', 'c', 'd']
+        assert tx.flush_count == 2
+    assert select_names(other_controller, table) == ['a', 'b', 'c', 'd']
+    assert controller.get_connection().autocommit
+
+def test_savepoint_rollback_before_flush(controller, table):
+    with controller.transaction() as tx:
+        tx.insert_dict(table, {'name': 'a'})
+        with pytest.raises(ValueError):
+            with tx.savepoint():
+                tx.insert_dict(table, {'name': 'b'})
+                raise ValueError()
+        # buffered statements of savepoint are removed.
+        assert tx.flush_count == 0
+        tx.insert_dict(table, {'name': 'c'})
+    assert select_names(controller, table) == ['a', 'c']
+
+def test_savepoint_rollback_after_partial_flush(controller, table):
+    with controller.transaction(batch_size=2) as tx:
+        tx.insert_dict(table, {'name': 'a'})
+        with pytest.raises(ValueError):
+            with tx.savepoint():
+                tx.insert_dict(table, {'name': 'b'})
+                tx.insert_dict(table, {'name': 'c'})
+                assert tx.flush_count == 2
+                raise ValueError()
+        tx.insert_dict(table, {'name': 'd'})
+    assert select_names(controller, table) == ['a', 'd']
+
+def test_failed_statement_in_savepoint(controller, table):
+    with controller.transaction() as tx:
+        tx.insert_dict(table, {'name': 'a'})
+        with pytest.raises(psycopg2.errors.UniqueViolation):
+            with tx.savepoint():
+                tx.insert_dict(table, {'name': 'a'})
+                tx.flush()
+        # transaction is usable after ROLLBACK TO SAVEPOINT.
+        tx.insert_dict(table, {'name': 'b'})
+    assert select_names(controller, table) == ['a', 'b']
+
+def test_error_after_partial_flush_rolls_back(controller, table):
+    with pytest.raises(psycopg2.errors.UniqueViolation):
+        with controller.transaction(batch_size=2) as tx:
+            tx.insert_dict(table, {'name': 'a'})
+            tx.insert_dict(table, {'name': 'b'})
+            assert tx.flush_count == 1
+            tx.insert_dict(table, {'name': 'c'})
+            # failed in second flush.
+            tx.insert_dict(table, {'name': 'a'})
+    # first flush is rolled back too. connection is reusable.
+    assert select_names(controller, table) == []
+    assert controller.get_connection().autocommit
+    controller.insert_dict(table, {'name': 'e'})
+    assert select_names(controller, table) == ['e']
+
+def test_failed_statement_before_savepoint_in_same_flush(controller, table):
+    controller.insert_dict(table, {'name': 'a'})
+    with pytest.raises(psycopg2.errors.UniqueViolation):
+        with controller.transaction() as tx:
+            tx.insert_dict(table, {'name': 'b'})
+            tx.insert_dict(table, {'name': 'a'})
+            with tx.savepoint():
+                # savepoint is not made. error is raised again.
+                tx.flush()
+    assert select_names(controller, table) == ['a']
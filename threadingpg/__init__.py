@@ -5,4 +5,9 @@ from .data import Column
 from .data import Table
 from .data import Row
 from . import types
-from . import condition
\ No newline at end of file
+from . import condition
+from . import hooks
+from . import notification
+from .async_controllers import AsyncController
+from .async_controllers import AsyncPool
+from .async_controllers import AsyncTriggerListner
\ No newline at end of file
@@ -0,0 +1,610 @@
+import asyncio
+import collections
+import weakref
+import itertools
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.errors
+from psycopg2.pool import PoolError
+from contextlib import asynccontextmanager
+
+from . import query
+from . import condition
+from . import data
+from . import notification
+from .controllers import Controller
+from .controllers import StatementCache
+
+async def wait_connection(conn:psycopg2.extensions.connection):
+    '''
+    Wait asynchronous connection(async_=1) until poll() is POLL_OK.\n
+    Wait by loop.add_reader()/loop.add_writer() of connection fileno.\n
+    Connection is closed if cancelled while waiting. (running query can not be reused)
+    '''
+    loop = asyncio.get_running_loop()
+    while True:
+        state = conn.poll()
+        if state == psycopg2.extensions.POLL_OK:
+            return
+
+        fileno = conn.fileno()
+        future = loop.create_future()
+        def set_ready():
+            if not future.done():
+                future.set_result(None)
+
+        if state == psycopg2.extensions.POLL_READ:
+            loop.add_reader(fileno, set_ready)
+            remove = loop.remove_reader
+        elif state == psycopg2.extensions.POLL_WRITE:
+            loop.add_writer(fileno, set_ready)
+            remove = loop.remove_writer
+        else:
+            raise psycopg2.OperationalError(f"poll() returned {state}")
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            remove(fileno)
+            conn.close()
+            raise
+        remove(fileno)
+
+class AsyncController:
+    def __init__(self, statement_cache_size:int = 128, prepare_threshold:int = 2) -> None:
+        '''
+        asyncio Controller by asynchronous connection of psycopg2(async_=1).\n
+        Asynchronous connection is always auto commit and runs one query at a time.\n
+        Not available: server-side cursor(select_iter, select_columns), COPY(copy_rows).\n
+        Parameter
+        -
+        statement_cache_size (int): prepared statement count per connection. 0 is not prepared. default 128\n
+        prepare_threshold (int): query is prepared at this count of execution per connection. 1 is prepared at first. default 2\n
+        '''
+        if prepare_threshold < 1:
+            raise ValueError("Should be '0 < prepare_threshold'")
+        self.statement_cache_size = statement_cache_size
+        self.prepare_threshold = prepare_threshold
+        self.__statement_caches = weakref.WeakKeyDictionary()
+        self.__connection = None
+        self.__lock = asyncio.Lock()
+
+    async def connect(self, dbname:str, user:str, password:str, port:int, host:str="localhost"):
+        '''
+        Start asynchronous connection.\n
+        Parameters
+        -
+        dbname(str): postgresql database name.\n
+        user(str): user id.\n
+        password(str): password\n
+        port(int): port number\n
+        host(str): host address. default "localhost"\n
+        '''
+        self.dsn = psycopg2.extensions.make_dsn(host=host, dbname=dbname, user=user, password=password, port=port)
+        connection = psycopg2.connect(self.dsn, async_=1)
+        await wait_connection(connection)
+        self.__connection:psycopg2.extensions.connection = connection
+
+    def close(self):
+        self.__connection.close()
+
+    def get_connection(self) -> psycopg2.extensions.connection:
+        return self.__connection
+
+    @asynccontextmanager
+    async def get(self):
+        '''
+        base cursor.close(). one cursor at a time.\n
+        Usage
+        -
+        async with get() as (cursor, conn):
+            cursor.execute(query)
+            await wait_connection(conn)
+            result = cursor.fetchone()
+
+        '''
+        async with self.__lock:
+            cursor = self.__connection.cursor()
+            try:
+                yield cursor, self.__connection
+            finally:
+                cursor.close()
+
+    def clear_statement_cache(self):
+        '''
+        DEALLOCATE prepared statements of all connections at next execution.
+        '''
+        for statement_cache in self.__statement_caches.values():
+            statement_cache.is_invalid = True
+
+    async def _prepare(self, cursor, conn, parameterized_query:str, parameter_count:int) -> str:
+        '''
+        PREPARE query once per connection when it is executed prepare_threshold times.\n
+        Return
+        -
+        str : 'EXECUTE' query with placeholder(%s). None if query is not prepared yet.
+        '''
+        statement_cache = self.__statement_caches.get(conn)
+        if statement_cache is None:
+            statement_cache = StatementCache(self.statement_cache_size, self.prepare_threshold)
+            self.__statement_caches[conn] = statement_cache
+
+        if statement_cache.is_invalid:
+            await self._execute_cursor(cursor, conn, query.deallocate())
+            statement_cache.clear()
+
+        statement_name, _ = statement_cache.get(parameterized_query)
+        if statement_name is None:
+            if not statement_cache.is_repeated(parameterized_query):
+                return None
+            statement_name = statement_cache.make_name()
+            await self._execute_cursor(cursor, conn, query.prepare(statement_name, parameterized_query))
+            evicted_name = statement_cache.put(parameterized_query, statement_name, parameter_count)
+            if evicted_name is not None:
+                await self._execute_cursor(cursor, conn, query.deallocate(evicted_name))
+        return query.execute_prepared(statement_name, parameter_count)
+
+    async def _execute_cursor(self, cursor, conn, excutable_query:str, params:list = None):
+        if params is None:
+            cursor.execute(excutable_query)
+        else:
+            cursor.execute(excutable_query, params)
+        await wait_connection(conn)
+
+    async def _execute(self, cursor, conn, excutable_query:str, params:list = None, is_prepare:bool = True):
+        '''
+        cursor.execute() with params and wait.\n
+        Parameterized query is prepared if statement_cache_size is bigger than 0 and is_prepare, when it is executed prepare_threshold times.\n
+        Parameter
+        -
+        is_prepare (bool): False for multi-row bulk statement. default True\n
+        '''
+        if params is None or self.statement_cache_size < 1 or not is_prepare:
+            await self._execute_cursor(cursor, conn, excutable_query, params)
+            return
+        try:
+            execute_query = await self._prepare(cursor, conn, excutable_query, len(params))
+            await self._execute_cursor(cursor, conn, execute_query or excutable_query, params)
+        except (psycopg2.errors.InvalidSqlStatementName, psycopg2.errors.FeatureNotSupported):
+            # prepared statement is discarded(DISCARD ALL) or its result type is changed(ALTER TABLE) by server.
+            self.clear_statement_cache()
+            execute_query = await self._prepare(cursor, conn, excutable_query, len(params))
+            await self._execute_cursor(cursor, conn, execute_query or excutable_query, params)
+
+    async def execute(self, excutable_query:str):
+        async with self.get() as (cursor, conn):
+            await self._execute_cursor(cursor, conn, excutable_query)
+
+    # Table
+    async def create_table(self, table:data.Table):
+        create_query = Controller._make_create_table_query(table)
+        async with self.get() as (cursor, conn):
+            await self._execute_cursor(cursor, conn, create_query)
+        self.clear_statement_cache()
+
+    async def drop_table(self, table:data.Table):
+        drop_quary = query.drop_table(table.table_name)
+        async with self.get() as (cursor, conn):
+            await self._execute_cursor(cursor, conn, drop_quary)
+        self.clear_statement_cache()
+
+    async def is_exist_table(self, table:data.Table, table_schema:str = 'public') -> bool:
+        is_exist_table_query = query.is_exist_table(table.table_name, table_schema)
+        async with self.get() as (cursor, conn):
+            await self._execute_cursor(cursor, conn, is_exist_table_query)
+            result_fetch = cursor.fetchone()
+        return result_fetch[0]
+
+    # Columns
+    async def get_columns(self, table:data.Table, table_schema:str = 'public') -> dict:
+        '''
+        Parameter
+        -
+        table (threadingpg.data.Table): Table with 'table_name'.\n
+        table_schema (str): based on query\n
+        Return
+        -
+        column data (dict)
+        {'column_name':{column data},\n
+        'column_name':{column data}}
+        '''
+        result = {}
+        get_columns_query = query.get_columns(table.table_name, table_schema)
+        async with self.get() as (cursor, conn):
+            await self._execute_cursor(cursor, conn, get_columns_query)
+            data_names = [desc.name for desc in cursor.description]
+            for column_data_result in cursor.fetchall():
+                column_data = dict(zip(data_names, column_data_result))
+                result[column_data['column_name']] = column_data
+        return result
+
+    async def is_exist_column(self, column:data.Column, table_schema:str='public') -> bool:
+        is_exist_column_query = query.is_exist_column(column.table_name, column.name, table_schema)
+        async with self.get() as (cursor, conn):
+            await self._execute_cursor(cursor, conn, is_exist_column_query)
+            result_fetch = cursor.fetchone()
+        return result_fetch[0]
+
+    async def get_column_names(self, table:data.Table, table_schema='public') -> list:
+        get_column_names_query = query.get_column_names(table.table_name, table_schema)
+        async with self.get() as (cursor, conn):
+            await self._execute_cursor(cursor, conn, get_column_names_query)
+            result = [row[0] for row in cursor.fetchall()]
+        return result
+
+    # Row
+    async def select(self,
+                     table: data.Table,
+                     where: condition.Condition=None,
+                     order_by: condition.Condition=None,
+                     limit_count: int = None) -> tuple:
+        '''
+        Parameter
+        -
+        table (data.Table) : \n
+        where (condition.Condition): default None\n
+        order_by (condition.Condition): default None\n
+        limit_count (int): default None\n
+        Return
+        -
+        ([str], [tuple])\n
+        [str] : list of column name\n
+        [tuple] : list of row(tuple)
+
+        '''
+        select_query, params = Controller._make_select_query(table, where, order_by, limit_count)
+        async with self.get() as (cursor, conn):
+            await self._execute(cursor, conn, select_query, params)
+            columns = [desc.name for desc in cursor.description]
+            rows = cursor.fetchall()
+        return (columns, rows)
+
+    async def select_rows(self,
+                          table: data.Table,
+                          row_class: type,
+                          where: condition.Condition=None,
+                          order_by: condition.Condition=None,
+                          limit_count: int = None) -> list:
+        '''
+        Select and make rows of row_class by data.Row.get_factory().\n
+        Parameter
+        -
+        table (data.Table) : \n
+        row_class (type): subclass of data.Row. __init__() should be available without arguments\n
+        where (condition.Condition): default None\n
+        order_by (condition.Condition): default None\n
+        limit_count (int): default None\n
+        Return
+        -
+        [data.Row] : list of row_class
+
+        '''
+        select_query, params = Controller._make_select_query(table, where, order_by, limit_count)
+        async with self.get() as (cursor, conn):
+            await self._execute(cursor, conn, select_query, params)
+            factory = row_class.get_factory([desc.name for desc in cursor.description])
+            rows = list(map(factory, cursor.fetchall()))
+        return rows
+
+    async def insert_row(self, table: data.Table, row: data.Row):
+        '''
+        Parameters
+        -
+        table (Table): with table_name and column data\n
+        row (Row): insert row data\n
+        '''
+        insert_query, params = Controller._make_insert_row_query(table, row)
+        async with self.get() as (cursor, conn):
+            await self._execute(cursor, conn, insert_query, params)
+
+    async def insert_dict(self, table: data.Table, insert_data: dict):
+        '''
+        Parameters
+        -
+        table (Table): with table_name and column data\n
+        insert_data (dict): insert data. ex) {'column_name':'value'}
+        '''
+        params = []
+        insert_query = query.insert(table.table_name, insert_data, params)
+        async with self.get() as (cursor, conn):
+            await self._execute(cursor, conn, insert_query, params)
+
+    async def insert_rows(self, table: data.Table, rows, batch_size:int = 1000, is_returning:bool = False) -> list:
+        '''
+        Insert rows by multi-row 'INSERT ... VALUES (...), (...)' statement per batch. statement is not prepared.\n
+        Parameters
+        -
+        table (Table): with table_name and column data\n
+        rows (iterable): data.Row or dict. ex) {'column_name':'value'}\n
+        batch_size (int): row count of one statement. default 1000\n
+        is_returning (bool): RETURNING serial, bigserial, smallserial columns and set the values to rows. default False\n
+        Return
+        -
+        [tuple] : list of returned row(tuple). same order with serial columns of table. empty if is_returning is False
+        '''
+        if batch_size < 1:
+            raise ValueError("Should be '0 < batch_size'")
+        returning_column_names = table.column_schema.serial_column_names if is_returning else None
+
+        result = []
+        rows_iterator = iter(rows)
+        async with self.get() as (cursor, conn):
+            while True:
+                batch_rows = list(itertools.islice(rows_iterator, batch_size))
+                if not batch_rows:
+                    break
+                insert_query, params = Controller._make_insert_rows_query(table, batch_rows, returning_column_names)
+                # multi-row statement is not prepared. shape differs by None values(DEFAULT) and row count of batch.
+                await self._execute(cursor, conn, insert_query, params, is_prepare=False)
+
+                if returning_column_names:
+                    returned_rows = cursor.fetchall()
+                    Controller._set_returned_rows(batch_rows, returning_column_names, returned_rows)
+                    result.extend(returned_rows)
+        return result
+
+    async def update_row(self, table: data.Table, row:data.Row, where:condition.Condition):
+        '''
+        table (data.Table)
+        row (data.Row)
+        where (condition.Condition)
+        '''
+        update_query, params = Controller._make_update_row_query(table, row, where)
+        async with self.get() as (cursor, conn):
+            await self._execute(cursor, conn, update_query, params)
+
+    async def delete_row(self, table: data.Table, where:condition.Condition):
+        '''
+        table (data.Table)
+        where (condition.Condition)
+        '''
+        params = []
+        delete_query = query.delete(table.table_name, where.parse(params))
+        async with self.get() as (cursor, conn):
+            await self._execute(cursor, conn, delete_query, params)
+
+class AsyncPool(AsyncController):
+    def __init__(self, dbname:str, user:str, password:str, port:int, host:str="localhost", minconn:int = 1, maxconn:int = 10, statement_cache_size:int = 128, prepare_threshold:int = 2) -> None:
+        '''
+        asyncio Pool of asynchronous connections(async_=1).\n
+        Connections are made when needed up to maxconn, minconn are kept idle.\n
+        get() waits in FIFO order when maxconn connections are in use.\n
+        Parameters
+        -
+        dbname(str): postgresql database name.\n
+        user(str): user id.\n
+        password(str): password\n
+        port(int): port number\n
+        host(str): host address. default "localhost"\n
+        minconn(int): kept idle connection count. default 1\n
+        maxconn(int): max connection count. default 10\n
+        statement_cache_size(int): prepared statement count per connection. 0 is not prepared. default 128\n
+        prepare_threshold(int): query is prepared at this count of execution per connection. default 2\n
+        '''
+        super().__init__(statement_cache_size, prepare_threshold)
+        if minconn < 0 or maxconn < 1 or maxconn < minconn:
+            raise ValueError("Should be '0 <= minconn <= maxconn' and '0 < maxconn'")
+        self.dsn = psycopg2.extensions.make_dsn(host=host, dbname=dbname, user=user, password=password, port=port)
+        self.__minconn = minconn
+        self.__maxconn = maxconn
+        self.__idle_connections = collections.deque()
+        self.__connection_count = 0
+        self.__condition = asyncio.Condition()
+        self.__is_closed = False
+
+    async def connect(self):
+        '''
+        Make minconn connections. optional, connections are made by get() if not.
+        '''
+        while self.__connection_count < self.__minconn:
+            self.__connection_count += 1
+            try:
+                connection = await self.__make_connection()
+            except BaseException:
+                self.__connection_count -= 1
+                raise
+            async with self.__condition:
+                self.__idle_connections.append(connection)
+                self.__condition.notify()
+
+    def close(self):
+        '''
+        Close idle connections. in-use connections are closed when returned.
+        '''
+        self.__is_closed = True
+        while self.__idle_connections:
+            self.__idle_connections.popleft().close()
+            self.__connection_count -= 1
+
+    async def __make_connection(self) -> psycopg2.extensions.connection:
+        connection = psycopg2.connect(self.dsn, async_=1)
+        await wait_connection(connection)
+        return connection
+
+    async def __acquire(self) -> psycopg2.extensions.connection:
+        async with self.__condition:
+            while True:
+                if self.__is_closed:
+                    raise PoolError("connection pool is closed")
+                while self.__idle_connections:
+                    connection = self.__idle_connections.popleft()
+                    if not connection.closed:
+                        return connection
+                    self.__connection_count -= 1
+                if self.__connection_count < self.__maxconn:
+                    self.__connection_count += 1
+                    break
+                await self.__condition.wait()
+
+        try:
+            return await self.__make_connection()
+        except BaseException:
+            async with self.__condition:
+                self.__connection_count -= 1
+                self.__condition.notify()
+            raise
+
+    async def __release(self, connection:psycopg2.extensions.connection):
+        async with self.__condition:
+            if connection.closed or self.__is_closed:
+                connection.close()
+                self.__connection_count -= 1
+            else:
+                self.__idle_connections.append(connection)
+            self.__condition.notify()
+
+    @asynccontextmanager
+    async def get(self):
+        '''
+        Auto acquire, release connection and cursor.close()\n
+        Usage
+        -
+        async with get() as (cursor, conn):
+            cursor.execute(query)
+            await wait_connection(conn)
+            result = cursor.fetchone()
+
+        '''
+        connection = await self.__acquire()
+        try:
+            cursor = connection.cursor()
+            try:
+                yield cursor, connection
+            finally:
+                cursor.close()
+        finally:
+            await self.__release(connection)
+
+class AsyncTriggerListner(AsyncController):
+    def __init__(self) -> None:
+        '''
+        asyncio listener of LISTEN channels. connection fileno is registered by loop.add_reader().\n
+        Notifications are put to asyncio.Queue of notifications() in event loop thread. no listening thread.\n
+        Usage
+        -
+        listner = AsyncTriggerListner()
+        await listner.connect(...)
+        listner.start_listening()
+        async for notify in listner.notifications(channel_name):
+            print(notify.channel, notify.data)
+        '''
+        super().__init__(statement_cache_size=0)
+        self.__is_listening = False
+        self.__loop = None
+        self.__queues_by_channel = {}
+        self.__statement_channel_names = set()
+
+    def start_listening(self):
+        '''
+        Should be called in running event loop after connect().
+        '''
+        self.__loop = asyncio.get_running_loop()
+        self.__is_listening = True
+        self.__add_reader()
+
+    def stop_listening(self):
+        '''
+        End all notifications() iterators. LISTEN channels are kept until close().
+        '''
+        if self.__is_listening:
+            self.__is_listening = False
+            self.__remove_reader()
+        for queues in self.__queues_by_channel.values():
+            for notification_queue in queues:
+                notification_queue.put_nowait(None)
+
+    def close(self):
+        self.stop_listening()
+        super().close()
+
+    def __add_reader(self):
+        if self.__is_listening and not self.get_connection().closed:
+            self.__loop.add_reader(self.get_connection().fileno(), self.__on_readable)
+
+    def __remove_reader(self):
+        if not self.get_connection().closed:
+            self.__loop.remove_reader(self.get_connection().fileno())
+
+    def __on_readable(self):
+        try:
+            self.get_connection().poll()
+        except psycopg2.Error:
+            # connection is lost.
+            self.stop_listening()
+            return
+        self.__put_notifies()
+
+    def __put_notifies(self):
+        notifies = self.get_connection().notifies
+        while notifies:
+            notify = notifies.pop(0)
+            queues = self.__queues_by_channel.get(notify.channel)
+            if not queues:
+                continue
+            row_notification = notification.Notification(notify.channel, notify.payload, notify.pid)
+            if notify.channel in self.__statement_channel_names:
+                row_notifications = notification.split_statement_notification(row_notification)
+            else:
+                row_notifications = [row_notification]
+            for notification_queue in queues:
+                for row_notification in row_notifications:
+                    notification_queue.put_nowait(row_notification)
+
+    @asynccontextmanager
+    async def get(self):
+        '''
+        Reader of listening is removed while query. wait_connection() uses same fileno.
+        '''
+        async with super().get() as (cursor, conn):
+            if self.__is_listening:
+                self.__remove_reader()
+            try:
+                yield cursor, conn
+            finally:
+                if self.__is_listening:
+                    # notifications received while query.
+                    self.__put_notifies()
+                    self.__add_reader()
+
+    async def listen_channel(self, channel_name:str, is_statement_payload:bool = False):
+        '''
+        Parameters
+        -
+        channel_name (str): \n
+        is_statement_payload (bool): split notification of create_function(is_statement=True) to payload per row. default False\n
+        '''
+        if is_statement_payload:
+            self.__statement_channel_names.add(channel_name)
+        await self.execute(query.listen_channel(channel_name))
+
+    async def unlisten_channel(self, channel_name:str):
+        await self.execute(query.unlisten_channel(channel_name))
+        self.__statement_channel_names.discard(channel_name)
+
+    async def notifications(self, channel_name:str, is_statement_payload:bool = False):
+        '''
+        Async generator of notification.Notification. LISTEN at first iterator of channel, UNLISTEN after last one.\n
+        Ends by stop_listening().\n
+        Parameters
+        -
+        channel_name (str): \n
+        is_statement_payload (bool): same with listen_channel(). default False\n
+        '''
+        notification_queue = asyncio.Queue()
+        queues = self.__queues_by_channel.setdefault(channel_name, [])
+        queues.append(notification_queue)
+        try:
+            if len(queues) == 1:
+                await self.listen_channel(channel_name, is_statement_payload)
+            while True:
+                row_notification = await notification_queue.get()
+                if row_notification is None:
+                    break
+                yield row_notification
+        finally:
+            queues.remove(notification_queue)
+            if not queues:
+                del self.__queues_by_channel[channel_name]
+                if self.__is_listening:
+                    await self.unlisten_channel(channel_name)
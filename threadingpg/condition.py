@@ -5,27 +5,151 @@ from . import query
 class Condition(metaclass=abc.ABCMeta):
     conditions = None
     condition_type:str = ""
-    column_name:str = ""
+    columns:tuple = ()
     value = None
-    def parse(self) -> str:
+
+    @property
+    def column_name(self) -> str:
+        '''
+        Resolved when parsed. Column in class body of Table is named by Table.__init__() after Condition is made.
+        '''
+        return ','.join(column.name for column in self.columns)
+
+    def parse(self, params:list = None) -> str:
+        '''
+        Parameter
+        -
+        params (list): default None is value in query. if list, value is appended to params and placeholder(%s) is in query.
+        '''
         return ""
 
 class Equal(Condition):
     def __init__(self, column:data.Column, value) -> None:
         self.condition_type = "="
-        self.column_name = column.name
+        self.columns = (column, )
         self.value = value
-    def parse(self) -> str:
-        return f"{self.column_name} {self.condition_type} {query.convert_value_to_query(self.value)}"
+    def parse(self, params:list = None) -> str:
+        return f"{self.column_name} {self.condition_type} {query.convert_value_to_query(self.value, params=params)}"
 
 class Greater(Condition):
     def __init__(self, column:data.Column, value) -> None:
         self.condition_type = ">"
-        self.column_name = column.name
+        self.columns = (column, )
         self.value = value
-    def parse(self) -> str:
-        return f"{self.column_name} {self.condition_type} {query.convert_value_to_query(self.value)}"
-        
+    def parse(self, params:list = None) -> str:
+        return f"{self.column_name} {self.condition_type} {query.convert_value_to_query(self.value, params=params)}"
+
+class GreaterEqual(Condition):
+    def __init__(self, column:data.Column, value) -> None:
+        self.condition_type = ">="
+        self.columns = (column, )
+        self.value = value
+    def parse(self, params:list = None) -> str:
+        return f"{self.column_name} {self.condition_type} {query.convert_value_to_query(self.value, params=params)}"
+
+class Less(Condition):
+    def __init__(self, column:data.Column, value) -> None:
+        self.condition_type = "<"
+        self.columns = (column, )
+        self.value = value
+    def parse(self, params:list = None) -> str:
+        return f"{self.column_name} {self.condition_type} {query.convert_value_to_query(self.value, params=params)}"
+
+class LessEqual(Condition):
+    def __init__(self, column:data.Column, value) -> None:
+        self.condition_type = "<="
+        self.columns = (column, )
+        self.value = value
+    def parse(self, params:list = None) -> str:
+        return f"{self.column_name} {self.condition_type} {query.convert_value_to_query(self.value, params=params)}"
+
+class In(Condition):
+    def __init__(self, column:data.Column, values) -> None:
+        '''
+        'column = ANY(%s)' with one array parameter. same query for any count of values.\n
+        Parameters
+        -
+        column (data.Column):\n
+        values (iterable): values of column type\n
+        '''
+        self.condition_type = "= ANY"
+        self.columns = (column, )
+        self.value = list(values)
+    def parse(self, params:list = None) -> str:
+        return f"{self.column_name} {self.condition_type}({query.convert_value_to_query(self.value, params=params)})"
+
+class Between(Condition):
+    def __init__(self, column:data.Column, low_value, high_value) -> None:
+        '''
+        'low_value <= column AND column <= high_value'
+        '''
+        self.condition_type = "BETWEEN"
+        self.columns = (column, )
+        self.value = (low_value, high_value)
+    def parse(self, params:list = None) -> str:
+        low_query = query.convert_value_to_query(self.value[0], params=params)
+        high_query = query.convert_value_to_query(self.value[1], params=params)
+        return f"{self.column_name} {self.condition_type} {low_query} AND {high_query}"
+
+class IsNull(Condition):
+    def __init__(self, column:data.Column) -> None:
+        self.condition_type = "IS NULL"
+        self.columns = (column, )
+    def parse(self, params:list = None) -> str:
+        return f"{self.column_name} {self.condition_type}"
+
+class Like(Condition):
+    def __init__(self, column:data.Column, pattern:str) -> None:
+        '''
+        Parameters
+        -
+        column (data.Column):\n
+        pattern (str): '%' is any string, '_' is any character. ex) 'my_row%'\n
+        '''
+        self.condition_type = "LIKE"
+        self.columns = (column, )
+        self.value = pattern
+    def parse(self, params:list = None) -> str:
+        return f"{self.column_name} {self.condition_type} {query.convert_value_to_query(self.value, params=params)}"
+
+class ILike(Like):
+    def __init__(self, column:data.Column, pattern:str) -> None:
+        '''
+        Case-insensitive Like.
+        '''
+        super().__init__(column, pattern)
+        self.condition_type = "ILIKE"
+
+class Not(Condition):
+    def __init__(self, condition:Condition) -> None:
+        if not isinstance(condition, Condition):
+            raise TypeError("Parameter Type should be 'Condition'")
+        if isinstance(condition, OrderBy):
+            raise ValueError("Should not be 'OrderBy'")
+        self.condition_type = "NOT"
+        self.conditions = (condition, )
+    def parse(self, params:list = None) -> str:
+        return f"{self.condition_type} ({self.conditions[0].parse(params)})"
+
+class KeyGreater(Condition):
+    def __init__(self, columns:list, values:list, is_desc:bool = False) -> None:
+        '''
+        Row-value comparison of keyset pagination. '(column1, column2) > (value1, value2)'\n
+        Parameters
+        -
+        columns (list): data.Column\n
+        values (list): same order with columns\n
+        is_desc (bool): '<' for descending order. default False\n
+        '''
+        if len(columns) != len(values):
+            raise ValueError("Should be 'len(columns) == len(values)'")
+        self.condition_type = "<" if is_desc else ">"
+        self.columns = tuple(columns)
+        self.value = list(values)
+    def parse(self, params:list = None) -> str:
+        values_query = ','.join(query.convert_value_to_query(value, params=params) for value in self.value)
+        return f"({self.column_name}) {self.condition_type} ({values_query})"
+
 class And(Condition):
     def __init__(self, *conditions:Condition) -> None:
         if not isinstance(conditions, tuple):
@@ -42,13 +166,13 @@ class And(Condition):
             self.condition_type = "AND"
         self.conditions = conditions
         
-    def parse(self) -> str:
+    def parse(self, params:list = None) -> str:
         result = ""
         for c in self.conditions:
             if self.is_orderby:
-                result += f"{c.parse()}{self.condition_type} "
+                result += f"{c.parse(params)}{self.condition_type} "
             else:
-                result += f"{c.parse()} {self.condition_type} "
+                result += f"{c.parse(params)} {self.condition_type} "
         
         if self.is_orderby:
             slice_length = -(len(self.condition_type)+1)
@@ -67,17 +191,17 @@ class Or(Condition):
         self.condition_type = "OR"
         self.conditions = conditions
         
-    def parse(self) -> str:
+    def parse(self, params:list = None) -> str:
         result = ""
         for c in self.conditions:
-            result += f"{c.parse()} {self.condition_type} "
+            result += f"{c.parse(params)} {self.condition_type} "
         slice_length = -(len(self.condition_type)+2)
         return f"({result[:slice_length] if result else ''})"
     
 class OrderBy(Condition):
     def __init__(self, column:data.Column, is_desc:bool = False) -> None:
         self.condition_type = " "
-        self.column_name = column.name
+        self.columns = (column, )
         self.value = 'DESC' if is_desc else ''
-    def parse(self) -> str:
+    def parse(self, params:list = None) -> str:
         return f"{self.column_name}{self.condition_type}{self.value}"
\ No newline at end of file
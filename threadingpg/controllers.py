@@ -5,19 +5,298 @@ import threading
 import multiprocessing
 import ctypes
 import sys
+import itertools
+import time
+import datetime
+import weakref
+import collections
 
 import psycopg2
 import psycopg2.extensions
-from psycopg2.pool import ThreadedConnectionPool
+import psycopg2.errors
 from contextlib import contextmanager
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from . import query
 from . import condition
 from . import data
+from . import types
+from . import pool
+from . import metrics
+from . import hooks
+from . import notification
+from . import ringbuffer
+
+server_cursor_counter = itertools.count()
+savepoint_counter = itertools.count()
+
+class CopyStream:
+    def __init__(self, lines) -> None:
+        '''
+        File-like object for cursor.copy_expert().\n
+        Read lines from iterable(generator) only as much as requested size.\n
+        Parameter
+        -
+        lines (iterable): str lines of COPY text format
+        '''
+        self.__lines = iter(lines)
+        self.__buffer = ''
+
+    def read(self, size:int = -1) -> str:
+        if size is None or size < 0:
+            result = self.__buffer + ''.join(self.__lines)
+            self.__buffer = ''
+            return result
+
+        chunks = [self.__buffer]
+        length = len(self.__buffer)
+        while length < size:
+            line = next(self.__lines, None)
+            if line is None:
+                break
+            chunks.append(line)
+            length += len(line)
+        result = ''.join(chunks)
+        self.__buffer = result[size:]
+        return result[:size]
+
+    def readline(self, size:int = -1) -> str:
+        if not self.__buffer:
+            self.__buffer = next(self.__lines, '')
+        result = self.__buffer
+        if size is not None and 0 <= size:
+            result = result[:size]
+        self.__buffer = self.__buffer[len(result):]
+        return result
+
+class StatementCache:
+    def __init__(self, size:int, prepare_threshold:int = 2) -> None:
+        '''
+        LRU cache of prepared statement name by query of one connection.\n
+        Parameter
+        -
+        size (int): max count of prepared statements. also max count of queries counted before prepared\n
+        prepare_threshold (int): query is prepared at this count of execution. default 2\n
+        '''
+        self.size = size
+        self.prepare_threshold = prepare_threshold
+        self.is_invalid = False
+        self.__statement_count = 0
+        self.__statement_by_query = collections.OrderedDict()
+        self.__seen_count_by_query = collections.OrderedDict()
+
+    def get(self, parameterized_query:str) -> tuple:
+        '''
+        Return
+        -
+        (str, int) : prepared statement name, parameter count. (None, 0) if not prepared.
+        '''
+        statement = self.__statement_by_query.get(parameterized_query)
+        if statement is None:
+            return (None, 0)
+        self.__statement_by_query.move_to_end(parameterized_query)
+        return statement
+
+    def is_repeated(self, parameterized_query:str) -> bool:
+        '''
+        Count execution of query not prepared.\n
+        Return
+        -
+        bool : True if executed prepare_threshold times. count is removed.
+        '''
+        seen_count = self.__seen_count_by_query.pop(parameterized_query, 0) + 1
+        if self.prepare_threshold <= seen_count:
+            return True
+        self.__seen_count_by_query[parameterized_query] = seen_count
+        if self.size < len(self.__seen_count_by_query):
+            self.__seen_count_by_query.popitem(last=False)
+        return False
+
+    def make_name(self) -> str:
+        self.__statement_count += 1
+        return f"threadingpg_statement_{self.__statement_count}"
+
+    def put(self, parameterized_query:str, statement_name:str, parameter_count:int) -> str:
+        '''
+        Return
+        -
+        str : evicted prepared statement name. None if not evicted.
+        '''
+        self.__statement_by_query[parameterized_query] = (statement_name, parameter_count)
+        if self.size < len(self.__statement_by_query):
+            _, (evicted_name, _) = self.__statement_by_query.popitem(last=False)
+            return evicted_name
+        return None
+
+    def clear(self):
+        self.__statement_by_query.clear()
+        self.is_invalid = False
+
+class Transaction:
+    def __init__(self, controller, cursor, conn, batch_size:int = 100) -> None:
+        '''
+        Writes are buffered and sent as one multi-statement query per flush. made by Controller.transaction().\n
+        Flushed before read, when batch_size statements are buffered and at commit.\n
+        Parameters
+        -
+        controller (Controller): \n
+        cursor (cursor): cursor of pinned connection\n
+        conn (connection): pinned connection. not auto commit\n
+        batch_size (int): statement count of one flush. default 100\n
+        '''
+        self.controller = controller
+        self.cursor = cursor
+        self.conn = conn
+        self.batch_size = batch_size
+        self.__statements = []
+        self.__flushed_count = 0
+        self.flush_count = 0
+
+    def __append(self, statement:str, params:list = None):
+        statement = self.cursor.mogrify(statement, params) if params else statement.encode()
+        statement = statement.rstrip()
+        if not statement.endswith(b';'):
+            statement += b';'
+        self.__statements.append(statement)
+        if self.batch_size <= len(self.__statements):
+            self.flush()
+
+    def flush(self):
+        '''
+        Send buffered statements in one round trip.
+        '''
+        if not self.__statements:
+            return
+        statement_count = len(self.__statements)
+        batch_query = b'\n'.join(self.__statements)
+        self.__flushed_count += statement_count
+        self.__statements = []
+        self.flush_count += 1
+        if not self.controller.hooks:
+            self.cursor.execute(batch_query)
+        else:
+            # query of hooks is same for same statement count. not values.
+            self.controller._trace(self.cursor, 'flush', None, f"/* {statement_count} statements */", None, 
+                                   lambda: self.cursor.execute(batch_query))
+
+    def execute(self, excutable_query:str, params:list = None):
+        '''
+        Buffered. placeholder(%s) with params.
+        '''
+        self.__append(excutable_query, params)
+
+    def insert_row(self, table: data.Table, row: data.Row):
+        self.__append(*Controller._make_insert_row_query(table, row))
+
+    def insert_dict(self, table: data.Table, insert_data: dict):
+        params = []
+        insert_query = query.insert(table.table_name, insert_data, params)
+        self.__append(insert_query, params)
+
+    def insert_rows(self, table: data.Table, rows, batch_size:int = 1000):
+        '''
+        One multi-row 'INSERT' per batch_size rows. RETURNING is not available.
+        '''
+        if batch_size < 1:
+            raise ValueError("Should be '0 < batch_size'")
+        rows_iterator = iter(rows)
+        while True:
+            batch_rows = list(itertools.islice(rows_iterator, batch_size))
+            if not batch_rows:
+                break
+            self.__append(*Controller._make_insert_rows_query(table, batch_rows))
+
+    def update_row(self, table: data.Table, row:data.Row, where:condition.Condition):
+        self.__append(*Controller._make_update_row_query(table, row, where))
+
+    def delete_row(self, table: data.Table, where:condition.Condition):
+        params = []
+        delete_query = query.delete(table.table_name, where.parse(params))
+        self.__append(delete_query, params)
+
+    def select(self, 
+               table: data.Table, 
+               where: condition.Condition=None, 
+               order_by: condition.Condition=None, 
+               limit_count: int = None) -> tuple:
+        '''
+        Flush and select in transaction. same with Controller.select()
+        '''
+        self.flush()
+        select_query, params = Controller._make_select_query(table, where, order_by, limit_count)
+        self.controller._execute(self.cursor, self.conn, select_query, params, 'select', table.table_name)
+        return ([desc.name for desc in self.cursor.description], self.cursor.fetchall())
+
+    def select_rows(self, 
+                    table: data.Table, 
+                    row_class: type,
+                    where: condition.Condition=None, 
+                    order_by: condition.Condition=None, 
+                    limit_count: int = None) -> list:
+        '''
+        Flush and select in transaction. same with Controller.select_rows()
+        '''
+        self.flush()
+        select_query, params = Controller._make_select_query(table, where, order_by, limit_count)
+        self.controller._execute(self.cursor, self.conn, select_query, params, 'select_rows', table.table_name)
+        factory = row_class.get_factory([desc.name for desc in self.cursor.description])
+        return list(map(factory, self.cursor.fetchall()))
+
+    @contextmanager
+    def savepoint(self):
+        '''
+        'SAVEPOINT' is buffered. statements in context are rolled back if exception is raised, and exception is raised again.\n
+        Usage
+        -
+        with tx.savepoint():
+            tx.insert_row(table, row)
+        '''
+        savepoint_name = f"threadingpg_savepoint_{next(savepoint_counter)}"
+        position = self.__flushed_count + len(self.__statements)
+        self.__append(f"SAVEPOINT {savepoint_name};")
+        try:
+            yield
+        except BaseException:
+            if self.__flushed_count <= position:
+                # not sent yet.
+                del self.__statements[position - self.__flushed_count:]
+            else:
+                self.__statements = []
+                try:
+                    self.controller._execute(self.cursor, self.conn, f"ROLLBACK TO SAVEPOINT {savepoint_name};", operation='rollback_savepoint')
+                except psycopg2.Error:
+                    # savepoint is not made if failed statement is before it in same flush.
+                    pass
+            raise
+        self.__append(f"RELEASE SAVEPOINT {savepoint_name};")
+
+    def _commit(self):
+        self.flush()
+        self.conn.commit()
+
+    def _rollback(self):
+        self.__statements = []
+        self.conn.rollback()
 
 class Controller:
-    def __init__(self) -> None:
-        pass
+    def __init__(self, statement_cache_size:int = 128, prepare_threshold:int = 2) -> None:
+        '''
+        Parameter
+        -
+        statement_cache_size (int): prepared statement count per connection. 0 is not prepared. default 128\n
+        prepare_threshold (int): query is prepared at this count of execution per connection. 1 is prepared at first. default 2\n
+        '''
+        if prepare_threshold < 1:
+            raise ValueError("Should be '0 < prepare_threshold'")
+        self.statement_cache_size = statement_cache_size
+        self.prepare_threshold = prepare_threshold
+        self.__statement_caches = weakref.WeakKeyDictionary()
+        self.__statement_caches_lock = threading.Lock()
+        self.metrics = metrics.PoolMetrics()
+        self.hooks = []
     
     def connect(self, dbname:str, user:str, password:str, port:int, host:str="localhost" ):
         '''
@@ -42,14 +321,18 @@ class Controller:
     
     def reset(self):
         self.__connection.reset()
+        self.clear_statement_cache()
         
     def get_connection(self) -> psycopg2.extensions.connection:
         return self.__connection
     
     @contextmanager
-    def get(self):
+    def get(self, is_read:bool = False):
         '''
         base cursor.close()\n
+        Parameter
+        -
+        is_read (bool): read only statement. routed to replica by Pool. default False\n
         Usage
         -
         with get() as (cursor, conn):
@@ -57,20 +340,209 @@ class Controller:
             result = cursor.fetchone()
         
         '''
+        checkout_time = time.monotonic()
         cursor = self.__connection.cursor()
         try:
             yield cursor, self.__connection
         finally:
             cursor.close()
+            self.metrics.increase('acquire')
+            self.metrics.observe('hold_seconds', time.monotonic() - checkout_time)
+
+    @contextmanager
+    def get_server_cursor(self, itersize:int = 2000, is_read:bool = False):
+        '''
+        Named(server-side) cursor of get() connection.\n
+        Transaction is opened while cursor is alive if connection is auto commit.\n
+        Parameter
+        -
+        itersize (int): default 2000\n
+        is_read (bool): same with get(). default False\n
+        Usage
+        -
+        with get_server_cursor() as (cursor, conn):
+            cursor.execute(query)
+            rows = cursor.fetchmany(100)
+        
+        '''
+        with self.get(is_read=is_read) as (_, conn):
+            is_autocommit = conn.autocommit
+            if is_autocommit:
+                conn.autocommit = False
+            cursor = conn.cursor(name=f"threadingpg_cursor_{next(server_cursor_counter)}")
+            cursor.itersize = itersize
+            try:
+                yield cursor, conn
+            finally:
+                try:
+                    cursor.close()
+                finally:
+                    if is_autocommit:
+                        conn.rollback()
+                        conn.autocommit = True
             
-    def execute(self, excutable_query:str):
-        with self.get() as (cursor, _):
+    def clear_statement_cache(self):
+        '''
+        DEALLOCATE prepared statements of all connections at next execution.
+        '''
+        with self.__statement_caches_lock:
+            for statement_cache in self.__statement_caches.values():
+                statement_cache.is_invalid = True
+
+    def _prepare(self, cursor, conn, parameterized_query:str, parameter_count:int) -> str:
+        '''
+        PREPARE query once per connection when it is executed prepare_threshold times.\n
+        Return
+        -
+        str : 'EXECUTE' query with placeholder(%s). None if query is not prepared yet.
+        '''
+        with self.__statement_caches_lock:
+            statement_cache = self.__statement_caches.get(conn)
+            if statement_cache is None:
+                statement_cache = StatementCache(self.statement_cache_size, self.prepare_threshold)
+                self.__statement_caches[conn] = statement_cache
+        
+        if statement_cache.is_invalid:
+            cursor.execute(query.deallocate())
+            statement_cache.clear()
+        
+        statement_name, _ = statement_cache.get(parameterized_query)
+        if statement_name is None:
+            if not statement_cache.is_repeated(parameterized_query):
+                return None
+            statement_name = statement_cache.make_name()
+            cursor.execute(query.prepare(statement_name, parameterized_query))
+            evicted_name = statement_cache.put(parameterized_query, statement_name, parameter_count)
+            if evicted_name is not None:
+                cursor.execute(query.deallocate(evicted_name))
+        return query.execute_prepared(statement_name, parameter_count)
+
+    def add_hook(self, hook:hooks.QueryHook):
+        '''
+        Call hook around each statement of Controller methods.\n
+        Parameter
+        -
+        hook (hooks.QueryHook): ex) hooks.SlowQueryLog(threshold=0.5), hooks.QueryStats(sample_rate=0.01)
+        '''
+        self.hooks = self.hooks + [hook]
+
+    def remove_hook(self, hook:hooks.QueryHook):
+        self.hooks = [added_hook for added_hook in self.hooks if added_hook is not hook]
+
+    def _trace(self, cursor, operation:str, table_name:str, shape_query:str, params:list, execute_function) -> None:
+        '''
+        Call execute_function() between hooks.\n
+        execute_function() returns seconds of database or None if same with wall time.
+        '''
+        event = hooks.QueryEvent(operation, table_name, shape_query, params)
+        for hook in self.hooks:
+            hook.before_execute(event)
+        start_time = time.perf_counter()
+        try:
+            db_time = execute_function()
+        except Exception as e:
+            event.wall_time = time.perf_counter() - start_time
+            event.db_time = event.wall_time
+            for hook in self.hooks:
+                hook.on_error(event, e)
+            raise
+        event.wall_time = time.perf_counter() - start_time
+        event.db_time = event.wall_time if db_time is None else db_time
+        event.row_count = cursor.rowcount
+        for hook in self.hooks:
+            hook.after_execute(event)
+
+    def _execute(self, 
+                 cursor, 
+                 conn, 
+                 excutable_query:str, 
+                 params:list = None, 
+                 operation:str = 'execute', 
+                 table_name:str = None,
+                 is_prepare:bool = True):
+        '''
+        cursor.execute() with params and hooks.\n
+        Parameterized query is prepared if statement_cache_size is bigger than 0 and is_prepare, when it is executed prepare_threshold times.\n
+        Parameters
+        -
+        operation (str): name of statement for hooks. default 'execute'\n
+        table_name (str): table name for hooks. default None\n
+        is_prepare (bool): False for named(server-side) cursor and multi-row bulk statement. default True\n
+        '''
+        if not self.hooks:
+            self.__execute_statement(cursor, conn, excutable_query, params, is_prepare)
+        else:
+            self._trace(cursor, operation, table_name, excutable_query, params, 
+                        lambda: self.__execute_statement(cursor, conn, excutable_query, params, is_prepare))
+
+    def __execute_statement(self, cursor, conn, excutable_query:str, params:list, is_prepare:bool) -> float:
+        '''
+        Return
+        -
+        float : seconds of cursor.execute() of statement. PREPARE is not included.
+        '''
+        if params is None:
+            start_time = time.perf_counter()
             cursor.execute(excutable_query)
+        elif self.statement_cache_size < 1 or not is_prepare:
+            start_time = time.perf_counter()
+            cursor.execute(excutable_query, params)
+        else:
+            try:
+                execute_query = self._prepare(cursor, conn, excutable_query, len(params))
+                start_time = time.perf_counter()
+                cursor.execute(execute_query or excutable_query, params)
+            except (psycopg2.errors.InvalidSqlStatementName, psycopg2.errors.FeatureNotSupported):
+                # prepared statement is discarded(DISCARD ALL) or its result type is changed(ALTER TABLE) by server.
+                if not conn.autocommit:
+                    raise
+                self.clear_statement_cache()
+                execute_query = self._prepare(cursor, conn, excutable_query, len(params))
+                start_time = time.perf_counter()
+                cursor.execute(execute_query or excutable_query, params)
+        return time.perf_counter() - start_time
+
+    def execute(self, excutable_query:str):
+        with self.get() as (cursor, conn):
+            self._execute(cursor, conn, excutable_query)
     
+    @contextmanager
+    def transaction(self, batch_size:int = 100):
+        '''
+        One connection is pinned and auto commit is off while context. COMMIT at end, ROLLBACK if exception is raised.\n
+        Writes of Transaction are buffered and sent as one multi-statement query per batch_size statements.\n
+        Parameter
+        -
+        batch_size (int): statement count of one round trip. default 100\n
+        Usage
+        -
+        with controller.transaction() as tx:
+            tx.insert_row(table, row)
+            with tx.savepoint():
+                tx.update_row(table, row, where)
+        '''
+        with self.get() as (cursor, conn):
+            conn.autocommit = False
+            try:
+                tx = Transaction(self, cursor, conn, batch_size)
+                try:
+                    yield tx
+                except BaseException:
+                    tx._rollback()
+                    raise
+                try:
+                    tx._commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+            finally:
+                if not conn.closed:
+                    conn.autocommit = True
+
     def get_code_by_datatype(self):
         typedict = {}
-        with self.get() as (_cursor, _):
-            _cursor.execute("select oid, typname from pg_type")
+        with self.get(is_read=True) as (_cursor, conn):
+            self._execute(_cursor, conn, "select oid, typname from pg_type", operation='get_datatype')
             rs = _cursor.fetchall()
             for r in rs:
                 typedict[str(r[1])] = r[0]
@@ -78,21 +550,22 @@ class Controller:
     
     def get_datatype_by_code(self):
         typedict = {}
-        with self.get() as (_cursor, _):
-            _cursor.execute("select oid, typname from pg_type")
+        with self.get(is_read=True) as (_cursor, conn):
+            self._execute(_cursor, conn, "select oid, typname from pg_type", operation='get_datatype')
             rs = _cursor.fetchall()
             for r in rs:
                 typedict[str(r[0])] = r[1]
         return typedict
     
     # Table
-    def create_table(self, table:data.Table):
+    @staticmethod
+    def _make_create_table_query(table:data.Table) -> str:
         column_dict = {}
         not_null_dict = {}
         unique_dict = {}
         references_dict = {}
         
-        for column_name in dir(table):
+        for column_name in table.column_schema.column_names:
             column = getattr(table, column_name)
             if isinstance(column, data.Column):
                 column_dict[column_name] = column.data_type
@@ -116,25 +589,234 @@ class Controller:
         # PRIMARY KEY	해당 제약 조건이 있는 컬럼의 값은 테이블내에서 유일해야 하고 반드시 NOT NULL 이어야 합니다.
         # CHECK	해당 제약 조건이 있는 컬럼은 지정하는 조건에 맞는 값이 들어가야 합니다.
         # REFERENCES	해당 제약 조건이 있는 컬럼의 값은 참조하는 테이블의 특정 컬럼에 값이 존재해야 합니다.
-                    
-        create_query = query.create_table(table.table_name, column_dict, not_null_dict, unique_dict, references_dict)
-        with self.get() as (cursor, _):
-            cursor.execute(create_query)
+        
+        partition_by = table.partition_by
+        if partition_by is None:
+            create_query = query.create_table(table.table_name, column_dict, not_null_dict, unique_dict, references_dict)
+        else:
+            create_query = query.create_table(table.table_name, column_dict, not_null_dict, unique_dict, references_dict,
+                                              query.partition_by(partition_by.method, partition_by.column.name))
+            if partition_by.method == 'HASH':
+                # rows can not be inserted without partitions.
+                for remainder in range(partition_by.modulus):
+                    create_query += f" {query.create_partition(table.table_name, f'{table.table_name}_p{remainder}', query.hash_bound(partition_by.modulus, remainder))}"
+        # empty table. index is built at once.
+        for index in table.get_indexes():
+            create_query += f" {Controller._make_create_index_query(table, index, False)}"
+        return create_query
+
+    @staticmethod
+    def _make_create_index_query(table:data.Table, index:data.Index, is_concurrently:bool) -> str:
+        where_query = index.where.parse() if isinstance(index.where, condition.Condition) else index.where
+        return query.create_index(table.table_name, 
+                                  index.get_name(table.table_name), 
+                                  index.get_column_queries(), 
+                                  index.method, 
+                                  index.is_unique, 
+                                  is_concurrently, 
+                                  where_query)
+
+    def create_table(self, table:data.Table):
+        create_query = self._make_create_table_query(table)
+        with self.get() as (cursor, conn):
+            self._execute(cursor, conn, create_query, operation='create_table', table_name=table.table_name)
+        self.clear_statement_cache()
         
     def drop_table(self, table:data.Table):
         drop_quary = query.drop_table(table.table_name)
-        with self.get() as (cursor, _):
-            cursor.execute(drop_quary)
+        with self.get() as (cursor, conn):
+            self._execute(cursor, conn, drop_quary, operation='drop_table', table_name=table.table_name)
+        self.clear_statement_cache()
             
     def is_exist_table(self, table:data.Table, table_schema:str = 'public') -> bool:
         result = False
         is_exist_table_query = query.is_exist_table(table.table_name, table_schema)
-        with self.get() as (cursor, _):
-            cursor.execute(is_exist_table_query)
+        with self.get(is_read=True) as (cursor, conn):
+            self._execute(cursor, conn, is_exist_table_query, operation='is_exist_table', table_name=table.table_name)
             result_fetch = cursor.fetchone()
             result = result_fetch[0]
         return result
     
+    # Index
+    def get_indexes(self, table:data.Table, table_schema:str = 'public') -> dict:
+        '''
+        Indexes of table in 'pg_indexes'.\n
+        Return
+        -
+        {str: bool} : is valid by index name. index of failed 'CREATE INDEX CONCURRENTLY' is not valid.
+        '''
+        get_indexes_query = query.get_indexes(table.table_name, table_schema)
+        with self.get() as (cursor, conn):
+            self._execute(cursor, conn, get_indexes_query, operation='get_indexes', table_name=table.table_name)
+            result = {row[0]: row[1] for row in cursor.fetchall()}
+        return result
+
+    def get_missing_indexes(self, table:data.Table, table_schema:str = 'public') -> list:
+        '''
+        Return
+        -
+        [data.Index] : declared indexes of table.get_indexes() not in 'pg_indexes' or not valid
+        '''
+        is_valid_by_index_name = self.get_indexes(table, table_schema)
+        return [index for index in table.get_indexes() if not is_valid_by_index_name.get(index.get_name(table.table_name))]
+
+    def create_indexes(self, table:data.Table, is_concurrently:bool = True, table_schema:str = 'public') -> list:
+        '''
+        Create missing indexes of get_missing_indexes(). invalid index is dropped and created again.\n
+        Parameter
+        -
+        table (data.Table): with declared indexes\n
+        is_concurrently (bool): 'CREATE INDEX CONCURRENTLY' without blocking writes. one statement at a time.\n
+        \tpartitioned table does not support it and is created without CONCURRENTLY. default True\n
+        table_schema (str): default 'public'\n
+        Return
+        -
+        [str] : created index names
+        '''
+        if table.partition_by is not None:
+            is_concurrently = False
+        is_valid_by_index_name = self.get_indexes(table, table_schema)
+        created_index_names = []
+        with self.get() as (cursor, conn):
+            for index in table.get_indexes():
+                index_name = index.get_name(table.table_name)
+                if index_name in created_index_names or is_valid_by_index_name.get(index_name):
+                    continue
+                if index_name in is_valid_by_index_name:
+                    # 'IF NOT EXISTS' skips invalid index.
+                    self._execute(cursor, conn, query.drop_index(index_name, is_concurrently), 
+                                  operation='drop_index', table_name=table.table_name)
+                self._execute(cursor, conn, self._make_create_index_query(table, index, is_concurrently), 
+                              operation='create_index', table_name=table.table_name)
+                created_index_names.append(index_name)
+        return created_index_names
+
+    def drop_index(self, table:data.Table, index, is_concurrently:bool = True):
+        '''
+        Parameter
+        -
+        table (data.Table):\n
+        index (data.Index or str): Index or index name\n
+        is_concurrently (bool): 'DROP INDEX CONCURRENTLY' without blocking. partitioned table is dropped without it. default True\n
+        '''
+        if table.partition_by is not None:
+            is_concurrently = False
+        index_name = index.get_name(table.table_name) if isinstance(index, data.Index) else index
+        with self.get() as (cursor, conn):
+            self._execute(cursor, conn, query.drop_index(index_name, is_concurrently), 
+                          operation='drop_index', table_name=table.table_name)
+
+    # Partition
+    def create_range_partitions(self, table:data.Table, count:int = 3, start:datetime.datetime = None) -> list:
+        '''
+        Create 'count' RANGE partitions from interval including start. existing partitions are skipped.\n
+        Call periodically to make upcoming partitions before rows arrive.\n
+        Parameter
+        -
+        table (data.Table): with partition_by of 'RANGE' and interval\n
+        count (int): partition count. default 3\n
+        start (datetime.datetime): default None is datetime.datetime.now()\n
+        Return
+        -
+        [str] : partition names. ex) ['event_p20240131', 'event_p20240201', 'event_p20240202']
+        '''
+        partition_by = table.partition_by
+        if partition_by is None or partition_by.method != 'RANGE' or partition_by.interval is None:
+            raise ValueError("Should be 'partition_by' of 'RANGE' with interval")
+        range_start = partition_by.get_range_start(start if start is not None else datetime.datetime.now())
+        partition_names = []
+        create_query = ''
+        for _ in range(count):
+            range_end = partition_by.shift_range_start(range_start, 1)
+            partition_name = partition_by.get_partition_name(table.table_name, range_start)
+            bound_query = query.range_bound(range_start.isoformat(' '), range_end.isoformat(' '))
+            create_query += query.create_partition(table.table_name, partition_name, bound_query)
+            partition_names.append(partition_name)
+            range_start = range_end
+        if create_query:
+            with self.get() as (cursor, conn):
+                self._execute(cursor, conn, create_query, operation='create_partition', table_name=table.table_name)
+        return partition_names
+
+    def create_list_partition(self, table:data.Table, partition_name:str, values:list = None):
+        '''
+        Parameter
+        -
+        table (data.Table): with partition_by of 'LIST'\n
+        partition_name (str):\n
+        values (list): values of partition key. default None is DEFAULT partition\n
+        '''
+        partition_by = table.partition_by
+        if partition_by is None or partition_by.method != 'LIST':
+            raise ValueError("Should be 'partition_by' of 'LIST'")
+        create_query = query.create_partition(table.table_name, partition_name, query.list_bound(values) if values else None)
+        with self.get() as (cursor, conn):
+            self._execute(cursor, conn, create_query, operation='create_partition', table_name=table.table_name)
+
+    def get_partition_names(self, table:data.Table, table_schema:str = 'public') -> list:
+        get_partition_names_query = query.get_partition_names(table.table_name, table_schema)
+        with self.get(is_read=True) as (cursor, conn):
+            self._execute(cursor, conn, get_partition_names_query, operation='get_partition_names', table_name=table.table_name)
+            result = [row[0] for row in cursor.fetchall()]
+        return result
+
+    def drop_expired_partitions(self, 
+                                table:data.Table, 
+                                retention:int, 
+                                now:datetime.datetime = None, 
+                                is_drop:bool = True, 
+                                is_concurrently:bool = True, 
+                                table_schema:str = 'public') -> list:
+        '''
+        Detach RANGE partitions of create_range_partitions() ended before 'retention' intervals, and drop them.\n
+        Parameter
+        -
+        table (data.Table): with partition_by of 'RANGE' and interval\n
+        retention (int): count of past intervals to keep except current interval\n
+        now (datetime.datetime): default None is datetime.datetime.now()\n
+        is_drop (bool): drop detached partitions. default True\n
+        is_concurrently (bool): 'DETACH PARTITION ... CONCURRENTLY' takes SHARE UPDATE EXCLUSIVE lock of table and does not block\n
+        \treads and writes. needs PostgreSQL >= 14 and no DEFAULT partition. partitions of interrupted one are finalized.\n
+        \tFalse takes ACCESS EXCLUSIVE lock of table while detaching. default True\n
+        table_schema (str): default 'public'\n
+        Return
+        -
+        [str] : detached partition names
+        '''
+        partition_by = table.partition_by
+        if partition_by is None or partition_by.method != 'RANGE' or partition_by.interval is None:
+            raise ValueError("Should be 'partition_by' of 'RANGE' with interval")
+        if retention < 0:
+            raise ValueError("Should be '0 <= retention'")
+        current_start = partition_by.get_range_start(now if now is not None else datetime.datetime.now())
+        expired_end = partition_by.shift_range_start(current_start, -retention)
+
+        expired_partition_names = []
+        for partition_name in self.get_partition_names(table, table_schema):
+            range_start = partition_by.parse_partition_name(table.table_name, partition_name)
+            if range_start is not None and partition_by.shift_range_start(range_start, 1) <= expired_end:
+                expired_partition_names.append(partition_name)
+
+        detach_pending_partition_names = []
+        if is_concurrently and expired_partition_names:
+            with self.get() as (cursor, conn):
+                self._execute(cursor, conn, query.get_partition_names(table.table_name, table_schema, is_detach_pending=True), 
+                              operation='get_partition_names', table_name=table.table_name)
+                detach_pending_partition_names = [row[0] for row in cursor.fetchall()]
+
+        with self.get() as (cursor, conn):
+            for partition_name in expired_partition_names:
+                # 'CONCURRENTLY' is not available in transaction block. connection is autocommit and one statement per execute.
+                detach_query = query.detach_partition(table.table_name, 
+                                                      partition_name, 
+                                                      is_concurrently, 
+                                                      partition_name in detach_pending_partition_names)
+                self._execute(cursor, conn, detach_query, operation='detach_partition', table_name=table.table_name)
+                # detached partition is not a part of table. dropping it does not lock table.
+                if is_drop:
+                    self._execute(cursor, conn, query.drop_table(partition_name), operation='drop_table', table_name=partition_name)
+        return expired_partition_names
+
     # Columns
     def get_columns(self, table:data.Table, table_schema:str = 'public') -> dict:
         '''
@@ -150,8 +832,8 @@ class Controller:
         '''
         result = {}
         get_columns_query = query.get_columns(table.table_name, table_schema)
-        with self.get() as (cursor, _):
-            cursor.execute(get_columns_query)
+        with self.get(is_read=True) as (cursor, conn):
+            self._execute(cursor, conn, get_columns_query, operation='get_columns', table_name=table.table_name)
             type_code_by_data_name = {}
             for desc in cursor.description:
                 type_code_by_data_name[desc.name] = desc.type_code
@@ -169,8 +851,8 @@ class Controller:
     def is_exist_column(self, column:data.Column, table_schema:str='public') -> bool:
         result = False
         is_exist_column_query = query.is_exist_column(column.table_name, column.name, table_schema)
-        with self.get() as (cursor, _):
-            cursor.execute(is_exist_column_query)
+        with self.get(is_read=True) as (cursor, conn):
+            self._execute(cursor, conn, is_exist_column_query, operation='is_exist_column', table_name=column.table_name)
             result_fetch = cursor.fetchone()
             result = result_fetch[0]
         return result
@@ -178,12 +860,34 @@ class Controller:
     def get_column_names(self, table:data.Table, table_schema='public') -> list:
         result = []
         get_column_names_query = query.get_column_names(table.table_name, table_schema)
-        with self.get() as (cursor, _):
-            cursor.execute(get_column_names_query)
+        with self.get(is_read=True) as (cursor, conn):
+            self._execute(cursor, conn, get_column_names_query, operation='get_column_names', table_name=table.table_name)
             result = [row[0] for row in cursor]
         return result
 
     # Row
+    @staticmethod
+    def _make_select_query(table: data.Table, 
+                           where: condition.Condition=None, 
+                           order_by: condition.Condition=None, 
+                           limit_count: int = None,
+                           column_names: list = None) -> tuple:
+        '''
+        Return
+        -
+        (str, list) : select query with placeholder(%s), params
+        '''
+        params = []
+        where_str = where.parse(params) if where else None
+        order_by_str = order_by.parse(params) if order_by else None
+        select_query = query.select(table_name= table.table_name, 
+                                    condition_query= where_str, 
+                                    order_by_query= order_by_str, 
+                                    limit_count= limit_count,
+                                    params= params,
+                                    column_names= column_names)
+        return select_query, params
+
     def select(self, 
                table: data.Table, 
                where: condition.Condition=None, 
@@ -203,20 +907,220 @@ class Controller:
         [tuple] : list of row(tuple)
         
         '''
-        where_str = where.parse() if where else None
-        order_by_str = order_by.parse() if order_by else None
-        select_query = query.select(table_name= table.table_name, 
-                                    condition_query= where_str, 
-                                    order_by_query= order_by_str, 
-                                    limit_count= limit_count)
+        select_query, params = self._make_select_query(table, where, order_by, limit_count)
         rows = None
         columns = None
-        with self.get() as (cursor, _):
-            cursor.execute(select_query)
+        with self.get(is_read=True) as (cursor, conn):
+            self._execute(cursor, conn, select_query, params, 'select', table.table_name)
             columns = [desc.name for desc in cursor.description]
             rows = cursor.fetchall()
         return (columns, rows)
+
+    def select_rows(self, 
+                    table: data.Table, 
+                    row_class: type,
+                    where: condition.Condition=None, 
+                    order_by: condition.Condition=None, 
+                    limit_count: int = None) -> list:
+        '''
+        Select and make rows of row_class by data.Row.get_factory().\n
+        Parameter
+        -
+        table (data.Table) : \n
+        row_class (type): subclass of data.Row. __init__() should be available without arguments\n
+        where (condition.Condition): default None\n
+        order_by (condition.Condition): default None\n
+        limit_count (int): default None\n
+        Return
+        -
+        [data.Row] : list of row_class
         
+        '''
+        select_query, params = self._make_select_query(table, where, order_by, limit_count)
+        with self.get(is_read=True) as (cursor, conn):
+            self._execute(cursor, conn, select_query, params, 'select_rows', table.table_name)
+            factory = row_class.get_factory([desc.name for desc in cursor.description])
+            rows = list(map(factory, cursor.fetchall()))
+        return rows
+
+    def select_columns(self, 
+                       table: data.Table, 
+                       columns: list = None,
+                       where: condition.Condition=None, 
+                       order_by: condition.Condition=None, 
+                       limit_count: int = None,
+                       itersize: int = 10000) -> dict:
+        '''
+        Select into numpy array per column. need 'numpy'.\n
+        Rows are fetched 'itersize' at a time by named(server-side) cursor and converted per fetch.\n
+        dtype is types.get_numpy_dtype() of Column.data_type. NULL of integer or boolean column is 'object' dtype.\n
+        Parameter
+        -
+        table (data.Table) : \n
+        columns (list): data.Column or column name(str). default None is all columns of table\n
+        where (condition.Condition): default None\n
+        order_by (condition.Condition): default None\n
+        limit_count (int): default None\n
+        itersize (int): fetch row count. default 10000\n
+        Return
+        -
+        {str: numpy.ndarray} : array by column name
+        
+        '''
+        if numpy is None:
+            raise ImportError("Need 'numpy'. pip install threadingpg[numpy]")
+        
+        if columns is None:
+            column_names = list(table.column_schema.column_names)
+        else:
+            column_names = [column.name if isinstance(column, data.Column) else column for column in columns]
+        dtypes = []
+        for column_name in column_names:
+            column = getattr(table, column_name, None)
+            dtypes.append(types.get_numpy_dtype(column.data_type) if isinstance(column, data.Column) else 'object')
+        
+        arrays_by_column_name = {column_name: [] for column_name in column_names}
+        select_query, params = self._make_select_query(table, where, order_by, limit_count, column_names)
+        with self.get_server_cursor(itersize, is_read=True) as (cursor, conn):
+            self._execute(cursor, conn, select_query, params, 'select_columns', table.table_name, is_prepare=False)
+            while True:
+                rows = cursor.fetchmany(itersize)
+                if not rows:
+                    break
+                for column_name, dtype, values in zip(column_names, dtypes, zip(*rows)):
+                    if dtype == 'object' or (dtype.startswith(('int', 'bool')) and None in values):
+                        array = numpy.empty(len(values), dtype=object)
+                        for index, value in enumerate(values):
+                            array[index] = value
+                    else:
+                        array = numpy.array(values, dtype=dtype)
+                    arrays_by_column_name[column_name].append(array)
+        
+        result = {}
+        for column_name, dtype in zip(column_names, dtypes):
+            arrays = arrays_by_column_name[column_name]
+            if not arrays:
+                result[column_name] = numpy.empty(0, dtype=dtype)
+            elif len(arrays) == 1:
+                result[column_name] = arrays[0]
+            else:
+                result[column_name] = numpy.concatenate(arrays)
+        return result
+
+    def select_iter(self, 
+                    table: data.Table, 
+                    where: condition.Condition=None, 
+                    order_by: condition.Condition=None, 
+                    limit_count: int = None,
+                    itersize: int = 2000,
+                    is_batch: bool = False):
+        '''
+        Generator of select by named(server-side) cursor. fetch 'itersize' rows at a time.\n
+        Connection is kept while generator is alive. close() generator to release it early.\n
+        Parameter
+        -
+        table (data.Table) : \n
+        where (condition.Condition): default None\n
+        order_by (condition.Condition): default None\n
+        limit_count (int): default None\n
+        itersize (int): fetch row count. default 2000\n
+        is_batch (bool): yield list of row(tuple) per fetch. default False\n
+        Yield
+        -
+        ([str], tuple) or ([str], [tuple]) if is_batch\n
+        [str] : list of column name\n
+        tuple : row
+        
+        '''
+        select_query, params = self._make_select_query(table, where, order_by, limit_count)
+        with self.get_server_cursor(itersize, is_read=True) as (cursor, conn):
+            # 'DECLARE ... CURSOR' is not available with 'EXECUTE' of prepared statement.
+            self._execute(cursor, conn, select_query, params, 'select_iter', table.table_name, is_prepare=False)
+            columns = None
+            while True:
+                rows = cursor.fetchmany(itersize)
+                if not rows:
+                    break
+                if columns is None:
+                    columns = [desc.name for desc in cursor.description]
+                if is_batch:
+                    yield columns, rows
+                else:
+                    for row in rows:
+                        yield columns, row
+        
+    def paginate(self, 
+                 table: data.Table, 
+                 key_columns: list, 
+                 where: condition.Condition=None, 
+                 page_size: int = 1000, 
+                 is_desc: bool = False, 
+                 row_class: type = None):
+        '''
+        Generator of keyset(seek) pagination. 'WHERE (key1, key2) > (last1, last2) ORDER BY key1, key2 LIMIT page_size'.\n
+        Each page is same index range scan regardless of depth. connection is released between pages.\n
+        key_columns should be unique and not null. rows of NULL key are not selected.\n
+        Parameter
+        -
+        table (data.Table) : \n
+        key_columns (list): data.Column of unique key. ex) primary key\n
+        where (condition.Condition): default None\n
+        page_size (int): row count of page. default 1000\n
+        is_desc (bool): descending order of all key columns. default False\n
+        row_class (type): subclass of data.Row. yield rows of row_class. default None\n
+        Yield
+        -
+        ([str], [tuple]) or [data.Row] if row_class\n
+        [str] : list of column name\n
+        [tuple] : rows of page
+        
+        '''
+        if page_size < 1:
+            raise ValueError("Should be '0 < page_size'")
+        if not key_columns:
+            raise ValueError("Should be '0 < len(key_columns)'")
+        key_column_names = [column.name for column in key_columns]
+        order_by_list = [condition.OrderBy(column, is_desc) for column in key_columns]
+        order_by = order_by_list[0] if len(order_by_list) == 1 else condition.And(*order_by_list)
+        key_values = None
+        key_indexes = None
+        while True:
+            page_where = where
+            if key_values is not None:
+                key_greater = condition.KeyGreater(key_columns, key_values, is_desc)
+                page_where = key_greater if where is None else condition.And(where, key_greater)
+            select_query, params = self._make_select_query(table, page_where, order_by, page_size)
+            with self.get(is_read=True) as (cursor, conn):
+                self._execute(cursor, conn, select_query, params, 'paginate', table.table_name)
+                columns = [desc.name for desc in cursor.description]
+                rows = cursor.fetchall()
+            if not rows:
+                break
+            if key_indexes is None:
+                key_indexes = [columns.index(column_name) for column_name in key_column_names]
+            key_values = [rows[-1][index] for index in key_indexes]
+
+            if row_class is None:
+                yield columns, rows
+            else:
+                factory = row_class.get_factory(columns)
+                yield list(map(factory, rows))
+            if len(rows) < page_size:
+                break
+
+    @staticmethod
+    def _make_insert_row_query(table: data.Table, row: data.Row) -> tuple:
+        '''
+        Return
+        -
+        (str, list) : insert query with placeholder(%s), params
+        '''
+        value_by_column_name = row.__dict__
+        column_names = tuple(column_name for column_name in table.column_schema.column_names 
+                             if value_by_column_name.get(column_name) is not None)
+        params = [value_by_column_name[column_name] for column_name in column_names]
+        return table.column_schema.get_insert_query(column_names), params
+
     def insert_row(self, table: data.Table, row: data.Row):
         '''
         Parameters
@@ -224,15 +1128,9 @@ class Controller:
         table (Table): with table_name and column data\n
         row (Row): insert row data\n
         '''
-        value_by_column_name = {}
-        for variable_name in dir(table):
-            variable = getattr(table, variable_name)
-            if isinstance(variable, data.Column):
-                if variable_name in row.__dict__:
-                    value_by_column_name[variable_name] = row.__dict__[variable_name]
-        insert_query = query.insert(table.table_name, value_by_column_name)
-        with self.get() as (cursor, _):
-            cursor.execute(insert_query)
+        insert_query, params = self._make_insert_row_query(table, row)
+        with self.get() as (cursor, conn):
+            self._execute(cursor, conn, insert_query, params, 'insert_row', table.table_name)
             
         
     def insert_dict(self, table: data.Table, insert_data: dict):
@@ -242,42 +1140,362 @@ class Controller:
         table (Table): with table_name and column data\n
         insert_data (dict): insert data. ex) {'column_name':'value'}
         '''
-        insert_query = query.insert(table.table_name, insert_data)
+        params = []
+        insert_query = query.insert(table.table_name, insert_data, params)
+        with self.get() as (cursor, conn):
+            self._execute(cursor, conn, insert_query, params, 'insert_dict', table.table_name)
+
+    @staticmethod
+    def _make_insert_rows_query(table: data.Table, 
+                                rows:list, 
+                                returning_column_names:tuple = None, 
+                                conflict_column_names:tuple = None, 
+                                update_column_names:tuple = None) -> tuple:
+        '''
+        Parameters
+        -
+        conflict_column_names (tuple): 'ON CONFLICT' if not None. default None\n
+        update_column_names (tuple): 'DO UPDATE SET' columns. default None is inserted columns except conflict_column_names. empty is 'DO NOTHING'\n
+        Return
+        -
+        (str, list) : multi-row insert query with placeholder(%s), params
+        '''
+        value_by_column_name_list = [row if isinstance(row, dict) else row.__dict__ for row in rows]
+        column_names = [column_name for column_name in table.column_schema.column_names
+                        if any(value_by_column_name.get(column_name) is not None for value_by_column_name in value_by_column_name_list)]
+        if not column_names:
+            raise ValueError("Should be 'insert value of column' in rows")
+
+        rows_values = [tuple(value_by_column_name.get(column_name) for column_name in column_names)
+                       for value_by_column_name in value_by_column_name_list]
+        on_conflict_query = None
+        if conflict_column_names is not None:
+            if update_column_names is None:
+                update_column_names = [column_name for column_name in column_names if column_name not in conflict_column_names]
+            on_conflict_query = query.on_conflict(conflict_column_names, update_column_names)
+        params = []
+        insert_query = query.insert_rows(table.table_name, column_names, rows_values, returning_column_names, params, on_conflict_query)
+        return insert_query, params
+
+    @staticmethod
+    def _set_returned_rows(rows:list, returning_column_names:tuple, returned_rows:list):
+        '''
+        Set values of RETURNING to data.Row or dict. same order with rows.
+        '''
+        for row, returned_row in zip(rows, returned_rows):
+            for index, column_name in enumerate(returning_column_names):
+                if isinstance(row, dict):
+                    row[column_name] = returned_row[index]
+                else:
+                    setattr(row, column_name, returned_row[index])
+
+    def insert_rows(self, table: data.Table, rows, batch_size:int = 1000, is_returning:bool = False) -> list:
+        '''
+        Insert rows by multi-row 'INSERT ... VALUES (...), (...)' statement per batch. statement is not prepared.\n
+        Parameters
+        -
+        table (Table): with table_name and column data\n
+        rows (iterable): data.Row or dict. ex) {'column_name':'value'}\n
+        batch_size (int): row count of one statement. default 1000\n
+        is_returning (bool): RETURNING serial, bigserial, smallserial columns and set the values to rows. default False\n
+        Return
+        -
+        [tuple] : list of returned row(tuple). same order with serial columns of table. empty if is_returning is False
+        '''
+        if batch_size < 1:
+            raise ValueError("Should be '0 < batch_size'")
+
+        returning_column_names = table.column_schema.serial_column_names if is_returning else None
+
+        result = []
+        rows_iterator = iter(rows)
+        with self.get() as (cursor, conn):
+            while True:
+                batch_rows = list(itertools.islice(rows_iterator, batch_size))
+                if not batch_rows:
+                    break
+                insert_query, params = self._make_insert_rows_query(table, batch_rows, returning_column_names)
+                # multi-row statement is not prepared. shape differs by None values(DEFAULT) and row count of batch.
+                self._execute(cursor, conn, insert_query, params, 'insert_rows', table.table_name, is_prepare=False)
+
+                if returning_column_names:
+                    returned_rows = cursor.fetchall()
+                    self._set_returned_rows(batch_rows, returning_column_names, returned_rows)
+                    result.extend(returned_rows)
+        return result
+
+    def upsert_rows(self, 
+                    table: data.Table, 
+                    rows, 
+                    conflict_columns:list, 
+                    update_columns:list = None, 
+                    batch_size:int = 1000, 
+                    is_returning:bool = False) -> tuple:
+        '''
+        Insert or update rows by 'INSERT ... ON CONFLICT (...) DO UPDATE SET column=EXCLUDED.column' per batch.\n
+        Rows of same conflict values in a batch are deduplicated. last row is kept.\n
+        Rows with None conflict value(NULL or DEFAULT) do not conflict and are not deduplicated.\n
+        Parameters
+        -
+        table (Table): with table_name and column data\n
+        rows (iterable): data.Row or dict. ex) {'column_name':'value'}\n
+        conflict_columns (list): data.Column or column name(str) of unique index or primary key\n
+        update_columns (list): data.Column or column name(str). default None is inserted columns except conflict_columns.\n
+        \tempty list is 'DO NOTHING'\n
+        batch_size (int): row count of one statement. default 1000\n
+        is_returning (bool): RETURNING conflict columns and '(xmax = 0)' to know inserted or updated. default False\n
+        \treturned conflict values are set to rows with None conflict value. ex) serial\n
+        \treturned rows are matched to rows by ordinal in VALUES. ValueError if a returned row can not be matched\n
+        Return
+        -
+        ([row], [row]) : inserted rows, updated rows of given rows. empty if is_returning is False.\n
+        \trows of 'DO NOTHING' and deduplicated rows are not included
+        '''
+        if batch_size < 1:
+            raise ValueError("Should be '0 < batch_size'")
+        conflict_column_names = tuple(column.name if isinstance(column, data.Column) else column for column in conflict_columns)
+        update_column_names = None
+        if update_columns is not None:
+            update_column_names = tuple(column.name if isinstance(column, data.Column) else column for column in update_columns)
+        returning_column_names = conflict_column_names + ("(xmax = 0)", ) if is_returning else None
+        cast_type_by_column_name = dict(zip(table.column_schema.column_names, table.column_schema.cast_types))
+        conflict_cast_types = [cast_type_by_column_name[column_name] for column_name in conflict_column_names]
+
+        def get_conflict_values(row) -> tuple:
+            value_by_column_name = row if isinstance(row, dict) else row.__dict__
+            return tuple(value_by_column_name.get(column_name) for column_name in conflict_column_names)
+
+        inserted_rows = []
+        updated_rows = []
+        rows_iterator = iter(rows)
+        with self.get() as (cursor, conn):
+            while True:
+                batch_rows = list(itertools.islice(rows_iterator, batch_size))
+                if not batch_rows:
+                    break
+                # 'ON CONFLICT DO UPDATE' can not affect same row twice in a statement.
+                upserted_rows = []
+                unkeyed_rows = []
+                position_by_conflict_values = {}
+                for row in batch_rows:
+                    conflict_values = get_conflict_values(row)
+                    if None in conflict_values:
+                        # NULL or DEFAULT does not conflict.
+                        unkeyed_rows.append(row)
+                        upserted_rows.append(row)
+                    elif conflict_values in position_by_conflict_values:
+                        upserted_rows[position_by_conflict_values[conflict_values]] = row
+                    else:
+                        position_by_conflict_values[conflict_values] = len(upserted_rows)
+                        upserted_rows.append(row)
+                insert_query, params = self._make_insert_rows_query(table, 
+                                                                    upserted_rows, 
+                                                                    returning_column_names, 
+                                                                    conflict_column_names, 
+                                                                    update_column_names)
+                if is_returning:
+                    # returned row is found by ordinal of keyed row. values of python may differ from values of database. ex) '100' and 100
+                    ordinal_keys_values = sorted((position, conflict_values) for conflict_values, position in position_by_conflict_values.items())
+                    insert_query = query.returning_ordinal(insert_query, conflict_column_names, conflict_cast_types, ordinal_keys_values, params)
+                # multi-row statement is not prepared. shape differs by row count of batch.
+                self._execute(cursor, conn, insert_query, params, 'upsert_rows', table.table_name, is_prepare=False)
+
+                if is_returning:
+                    unkeyed_rows_iterator = iter(unkeyed_rows)
+                    for returned_row in cursor.fetchall():
+                        ordinal = returned_row[0]
+                        if ordinal is None:
+                            # RETURNING is in order of VALUES. rows with None conflict value have no ordinal.
+                            row = next(unkeyed_rows_iterator, None)
+                            if row is None:
+                                raise ValueError(f"Can not match returned row {returned_row[1:-1]} to rows of {conflict_column_names}")
+                            self._set_returned_rows([row], conflict_column_names, [returned_row[1:]])
+                        else:
+                            row = upserted_rows[ordinal]
+                        if returned_row[-1]:
+                            inserted_rows.append(row)
+                        else:
+                            updated_rows.append(row)
+        return inserted_rows, updated_rows
+
+    def copy_rows(self, table: data.Table, rows, column_names:list = None, buffer_size:int = 8192) -> tuple:
+        '''
+        Insert rows by 'COPY ... FROM STDIN'. rows are streamed, not materialized.\n
+        Parameters
+        -
+        table (Table): with table_name and column data\n
+        rows (iterable): data.Row, dict or tuple. tuple is same order with column_names\n
+        column_names (list): default None is all columns of table except serial, bigserial, smallserial\n
+        buffer_size (int): read size of cursor.copy_expert(). default 8192\n
+        Return
+        -
+        (int, float)\n
+        int : copied row count\n
+        float : rows per second
+        '''
+        if column_names is None:
+            column_names = [column_name for column_name in table.column_schema.column_names 
+                            if column_name not in table.column_schema.serial_column_names]
+
+        row_count = 0
+        def generate_lines():
+            nonlocal row_count
+            for row in rows:
+                if isinstance(row, tuple):
+                    values = row
+                else:
+                    value_by_column_name = row if isinstance(row, dict) else row.__dict__
+                    values = [value_by_column_name.get(column_name) for column_name in column_names]
+                row_count += 1
+                yield '\t'.join(query.convert_value_to_copy(value) for value in values) + '\n'
+
+        copy_query = query.copy_from(table.table_name, column_names)
+        start_time = time.perf_counter()
         with self.get() as (cursor, _):
-            cursor.execute(insert_query)
-            
-    
+            if not self.hooks:
+                cursor.copy_expert(copy_query, CopyStream(generate_lines()), buffer_size)
+            else:
+                self._trace(cursor, 'copy_rows', table.table_name, copy_query, None,
+                            lambda: cursor.copy_expert(copy_query, CopyStream(generate_lines()), buffer_size))
+        elapsed_time = time.perf_counter() - start_time
+        return (row_count, row_count / elapsed_time if 0 < elapsed_time else 0.0)
+
+
+    @staticmethod
+    def _make_update_row_query(table: data.Table, row:data.Row, where:condition.Condition) -> tuple:
+        '''
+        Return
+        -
+        (str, list) : update query with placeholder(%s), params
+        '''
+        value_by_column_name = row.__dict__
+        column_names = tuple(column_name for column_name in table.column_schema.column_names 
+                             if value_by_column_name.get(column_name))
+        params = [value_by_column_name[column_name] for column_name in column_names]
+        update_query = f"{table.column_schema.get_update_query(column_names)} WHERE {where.parse(params)};"
+        return update_query, params
+
     def update_row(self, table: data.Table, row:data.Row, where:condition.Condition):
         '''
         table (data.Table)
         row (data.Row)
         where (condition.Condition)
         '''
-        value_by_column_name = {}
-        for variable_name in dir(table):
-            column = getattr(table, variable_name)
-            if isinstance(column, data.Column):
-                if column.name in row.__dict__ and row.__dict__[column.name]:
-                    value_by_column_name[column.name] = row.__dict__[column.name]
-        update_query = query.update(table.table_name, value_by_column_name, where.parse())
-        with self.get() as (cursor, _):
-            cursor.execute(update_query)
+        update_query, params = self._make_update_row_query(table, row, where)
+        with self.get() as (cursor, conn):
+            self._execute(cursor, conn, update_query, params, 'update_row', table.table_name)
     
+    @staticmethod
+    def _make_update_rows_query(table: data.Table, rows:list, key_column_names:tuple, update_column_names:tuple = None) -> tuple:
+        '''
+        Parameters
+        -
+        update_column_names (tuple): default None is columns with value in rows except key_column_names\n
+        Return
+        -
+        (str, list) : 'UPDATE ... FROM (VALUES ...)' query with placeholder(%s), params
+        '''
+        value_by_column_name_list = [row if isinstance(row, dict) else row.__dict__ for row in rows]
+        for value_by_column_name in value_by_column_name_list:
+            if any(value_by_column_name.get(column_name) is None for column_name in key_column_names):
+                raise ValueError(f"Should be 'value of key columns' {key_column_names} in rows")
+        column_schema = table.column_schema
+        if update_column_names is None:
+            update_column_names = tuple(column_name for column_name in column_schema.column_names
+                                        if column_name not in key_column_names and 
+                                        any(value_by_column_name.get(column_name) is not None for value_by_column_name in value_by_column_name_list))
+        if not update_column_names:
+            raise ValueError("Should be 'update value of column' in rows")
+
+        column_names = tuple(key_column_names) + tuple(update_column_names)
+        cast_type_by_column_name = dict(zip(column_schema.column_names, column_schema.cast_types))
+        cast_types = [cast_type_by_column_name[column_name] for column_name in column_names]
+        rows_values = [tuple(value_by_column_name.get(column_name) for column_name in column_names)
+                       for value_by_column_name in value_by_column_name_list]
+        coalesce_column_names = [column_name for index, column_name in enumerate(column_names)
+                                 if any(row_values[index] is None for row_values in rows_values)]
+        params = []
+        update_query = query.update_rows(table.table_name, key_column_names, column_names, cast_types, rows_values, coalesce_column_names, params)
+        return update_query, params
+
+    def update_rows(self, table: data.Table, rows, key_columns:list, update_columns:list = None, batch_size:int = 1000) -> int:
+        '''
+        Update rows by one 'UPDATE ... SET ... FROM (VALUES (...), (...)) AS v(...) WHERE table.key=v.key' per batch.\n
+        VALUES are cast by data_type of Column. None value keeps current value.\n
+        Rows of same key values in a batch are deduplicated. last row is kept.\n
+        Parameters
+        -
+        table (Table): with table_name and column data\n
+        rows (iterable): data.Row or dict. ex) {'column_name':'value'}\n
+        key_columns (list): data.Column or column name(str) to find updated row\n
+        update_columns (list): data.Column or column name(str). default None is columns with value except key_columns\n
+        batch_size (int): row count of one statement. default 1000\n
+        Return
+        -
+        int : updated row count
+        '''
+        if batch_size < 1:
+            raise ValueError("Should be '0 < batch_size'")
+        key_column_names = tuple(column.name if isinstance(column, data.Column) else column for column in key_columns)
+        update_column_names = None
+        if update_columns is not None:
+            update_column_names = tuple(column.name if isinstance(column, data.Column) else column for column in update_columns)
+
+        def get_key_values(row) -> tuple:
+            value_by_column_name = row if isinstance(row, dict) else row.__dict__
+            return tuple(value_by_column_name.get(column_name) for column_name in key_column_names)
+
+        row_count = 0
+        rows_iterator = iter(rows)
+        with self.get() as (cursor, conn):
+            while True:
+                batch_rows = list(itertools.islice(rows_iterator, batch_size))
+                if not batch_rows:
+                    break
+                # joined row of duplicated key is not decided.
+                row_by_key_values = {}
+                for row in batch_rows:
+                    row_by_key_values[get_key_values(row)] = row
+                update_query, params = self._make_update_rows_query(table, list(row_by_key_values.values()), key_column_names, update_column_names)
+                # multi-row statement is not prepared. shape differs by row count of batch.
+                self._execute(cursor, conn, update_query, params, 'update_rows', table.table_name, is_prepare=False)
+                row_count += max(0, cursor.rowcount)
+        return row_count
+
     def delete_row(self, table: data.Table, where:condition.Condition):
         '''
         table (data.Table)
         where (condition.Condition)
         '''
-        delete_query = query.delete(table.table_name, where.parse())
-        with self.get() as (cursor, _):
-            cursor.execute(delete_query)
+        params = []
+        delete_query = query.delete(table.table_name, where.parse(params))
+        with self.get() as (cursor, conn):
+            self._execute(cursor, conn, delete_query, params, 'delete_row', table.table_name)
 
     
 
 class Pool(Controller):
-    def __init__(self, dbname:str, user:str, password:str, port:int, host:str="localhost", minconn:int = 1, maxconn:int = 5) -> None:
+    def __init__(self, 
+                 dbname:str, 
+                 user:str, 
+                 password:str, 
+                 port:int, 
+                 host:str="localhost", 
+                 minconn:int = 1, 
+                 maxconn:int = 5, 
+                 statement_cache_size:int = 128,
+                 prepare_threshold:int = 2,
+                 timeout:float = 30.0,
+                 setup = None,
+                 check_interval:float = 5.0,
+                 max_lifetime:float = None,
+                 idle_timeout:float = None,
+                 reap_interval:float = None,
+                 replica_dsns:list = None,
+                 balance:str = 'least_busy',
+                 read_your_writes:float = None) -> None:
         '''
-        Start Connection Pool. auto commit (set ThreadedConnectionPool())\n
+        Start Connection Pool. auto commit (set once when connection is made)\n
         Parameters
         -
         dbname(str): postgresql database name.\n
@@ -285,23 +1503,99 @@ class Pool(Controller):
         password(str): password\n
         port(int): port number\n
         host(str): host address. default "localhost"\n
-        minconn(int): ThreadedConnectionPool's minconn. default 1\n
-        maxconn(int): ThreadedConnectionPool's maxconn. default 5\n
+        minconn(int): connections made at start and kept. default 1\n
+        maxconn(int): max connection count. default 5\n
+        statement_cache_size(int): prepared statement count per connection. 0 is not prepared. default 128\n
+        prepare_threshold(int): query is prepared at this count of execution per connection. default 2\n
+        timeout(float): seconds of waiting in get() when maxconn connections are in use. None is waiting forever. default 30.0\n
+        setup(function(connection)): called once when connection is made, after auto commit is set. default None\n
+        check_interval(float): 'SELECT 1' on checkout if connection is idle longer than this seconds. None is not checked. default 5.0\n
+        max_lifetime(float): close connection older than this seconds. default None\n
+        idle_timeout(float): close idle connection over minconn after this seconds. default None\n
+        reap_interval(float): seconds of background thread checking idle connections. default None is not started.\n
+        replica_dsns(list): dsn(str) of read replicas(hot standby). get(is_read=True) is routed to replicas. default None\n
+        \tex) [psycopg2.extensions.make_dsn(host='replica1', dbname=dbname, user=user, password=password, port=port)]\n
+        balance(str): 'least_busy'(fewest used and waiting connections) or 'round_robin'. default 'least_busy'\n
+        read_your_writes(float): seconds of reading from primary in same thread after write. default None\n
         '''
+        if balance not in ('least_busy', 'round_robin'):
+            raise ValueError("Should be 'least_busy' or 'round_robin'")
+        super().__init__(statement_cache_size, prepare_threshold)
         self.dsn = psycopg2.extensions.make_dsn(host=host, dbname=dbname, user=user, password=password, port=port)
-        self.__pool = ThreadedConnectionPool(minconn, maxconn, self.dsn)
+        self.balance = balance
+        self.read_your_writes = read_your_writes
+        self.__context = threading.local()
+        self.__round_robin = itertools.count()
+        def setup_connection(conn:psycopg2.extensions.connection):
+            conn.autocommit = True
+            if setup is not None:
+                setup(conn)
+        def make_pool(dsn:str) -> pool.ConnectionPool:
+            return pool.ConnectionPool(minconn, 
+                                       maxconn, 
+                                       dsn,
+                                       timeout=timeout,
+                                       setup=setup_connection,
+                                       check_interval=check_interval,
+                                       max_lifetime=max_lifetime,
+                                       idle_timeout=idle_timeout,
+                                       reap_interval=reap_interval)
+        self.__pool = make_pool(self.dsn)
+        self.__replica_pools = [make_pool(replica_dsn) for replica_dsn in (replica_dsns or [])]
+        self.metrics = self.__pool.metrics
         
     def close(self):
         '''
         connection_pool.closeall()
         '''
-        if self.__pool is not None and self.__pool.closed is False:
-            self.__pool.closeall()
+        for connection_pool in [self.__pool] + self.__replica_pools:
+            if connection_pool is not None and connection_pool.closed is False:
+                connection_pool.closeall()
+
+    def get_pool(self) -> pool.ConnectionPool:
+        return self.__pool
+
+    def get_replica_pools(self) -> list:
+        return self.__replica_pools
 
     @contextmanager
-    def get(self):
+    def use_primary(self):
+        '''
+        Read from primary in this thread while context.\n
+        Usage
+        -
+        with pool.use_primary():
+            pool.select(table)
+        '''
+        self.__context.primary_depth = getattr(self.__context, 'primary_depth', 0) + 1
+        try:
+            yield
+        finally:
+            self.__context.primary_depth -= 1
+
+    def __select_pool(self, is_read:bool) -> pool.ConnectionPool:
+        if not is_read:
+            if self.read_your_writes is not None and self.__replica_pools:
+                self.__context.write_time = time.monotonic()
+            return self.__pool
+        if not self.__replica_pools or getattr(self.__context, 'primary_depth', 0):
+            return self.__pool
+        if self.read_your_writes is not None:
+            write_time = getattr(self.__context, 'write_time', None)
+            if write_time is not None and time.monotonic() - write_time < self.read_your_writes:
+                return self.__pool
+        if self.balance == 'round_robin':
+            return self.__replica_pools[next(self.__round_robin) % len(self.__replica_pools)]
+        return min(self.__replica_pools, key=lambda replica_pool: replica_pool.used_count + replica_pool.waiting_count)
+
+    @contextmanager
+    def get(self, timeout:float = -1, is_read:bool = False):
         '''
         Auto .getconn(), .putconn() and cursor.close()\n
+        Parameter
+        -
+        timeout (float): seconds of waiting connection. default -1 is timeout of Pool. None is waiting forever.\n
+        is_read (bool): read only statement. routed to replica if replica_dsns. primary if replica connection is failed. default False\n
         Usage
         -
         with get() as (cursor, conn):
@@ -309,14 +1603,30 @@ class Pool(Controller):
             result = cursor.fetchone()
         
         '''
-        conn:psycopg2.extensions.connection = self.__pool.getconn()
-        conn.autocommit = True
-        cursor = conn.cursor()
+        connection_pool = self.__select_pool(is_read)
+        try:
+            conn:psycopg2.extensions.connection = connection_pool.getconn(timeout)
+        except psycopg2.OperationalError:
+            if connection_pool is self.__pool:
+                raise
+            connection_pool = self.__pool
+            conn = connection_pool.getconn(timeout)
+        is_close = False
         try:
-            yield cursor, conn
+            cursor = conn.cursor()
+            try:
+                yield cursor, conn
+            finally:
+                cursor.close()
         finally:
-            cursor.close()
-            self.__pool.putconn(conn)
+            if not conn.closed and not conn.autocommit:
+                # auto commit is set once when connection is made. restore it if changed by user.
+                try:
+                    conn.rollback()
+                    conn.autocommit = True
+                except psycopg2.Error:
+                    is_close = True
+            connection_pool.putconn(conn, close=is_close)
     
 # Trigger
 class TriggerListner(Controller):
@@ -324,6 +1634,14 @@ class TriggerListner(Controller):
         super().__init__()
         self.__is_listening = multiprocessing.Value(ctypes.c_bool, True)
         self.notify_queue = queue.Queue()
+        self.__listening_channel_names = set()
+        self.__statement_channel_names = set()
+        self.__dispatcher_by_channel = {}
+        self.__channel_listen_epoll = None
+        self.__listening_thread = None
+        self.__is_thread_listening = False
+        self.__commands = []
+        self.__commands_lock = threading.Lock()
    
     def create_function(self,
                         function_name:str, 
@@ -340,7 +1658,31 @@ class TriggerListner(Controller):
                         is_raise_unknown_operation:bool = True,
                         is_after_trigger:bool = True,
                         is_inline:bool = False,
-                        in_space:str = '    '):
+                        in_space:str = '    ',
+                        key_column_name:str = None,
+                        is_statement:bool = False,
+                        chunk_size:int = 100):
+        '''
+        Parameters
+        -
+        key_column_name (str): key-only payload. {'operation', 'table_name', 'key'} without 'new_record' and 'old_record'.\n
+        \tfetch rows by notification.KeyHydrator. default None\n
+        is_statement (bool): function of create_trigger(is_statement=True). one notification per chunk_size rows of statement.\n
+        \tlisten by listen_channel(is_statement_payload=True). default False\n
+        chunk_size (int): row count of one notification if is_statement. default 100\n
+        '''
+        if is_statement:
+            create_trigger_function_query = query.create_statement_function(function_name,
+                                                                            channel_name,
+                                                                            is_replace,
+                                                                            is_get_operation,
+                                                                            is_get_timestamp,
+                                                                            is_get_tablename,
+                                                                            chunk_size,
+                                                                            key_column_name)
+            with self.get() as (cursor, conn):
+                self._execute(cursor, conn, create_trigger_function_query, operation='create_function')
+            return
         create_trigger_function_query = query.create_function(function_name, 
                                                                     channel_name,
                                                                     is_replace,
@@ -355,9 +1697,10 @@ class TriggerListner(Controller):
                                                                     is_raise_unknown_operation,
                                                                     is_after_trigger,
                                                                     is_inline,
-                                                                    in_space)
-        with self.get() as (cursor, _):
-            cursor.execute(create_trigger_function_query)
+                                                                    in_space,
+                                                                    key_column_name)
+        with self.get() as (cursor, conn):
+            self._execute(cursor, conn, create_trigger_function_query, operation='create_function')
             
     def create_trigger(self, 
                        table:data.Table, 
@@ -367,7 +1710,8 @@ class TriggerListner(Controller):
                        is_after:bool = True,
                        is_insert:bool = True,
                        is_update:bool = True,
-                       is_delete:bool = True):
+                       is_delete:bool = True,
+                       is_statement:bool = False):
         '''
         Parameters
         -
@@ -379,7 +1723,20 @@ class TriggerListner(Controller):
         is_insert (bool):\n
         is_update (bool):\n
         is_delete (bool):\n
+        is_statement (bool): 'AFTER ... FOR EACH STATEMENT' with transition table. is_after is ignored.\n
+        \tone trigger per operation named '{trigger_name}_insert', '{trigger_name}_update', '{trigger_name}_delete'. default False\n
         '''
+        if is_statement:
+            operations = [operation for operation, is_operation in (('insert', is_insert), ('update', is_update), ('delete', is_delete)) if is_operation]
+            with self.get() as (cursor, conn):
+                for operation in operations:
+                    create_trigger_query = query.create_statement_trigger(table.table_name, 
+                                                                          f"{trigger_name}_{operation}", 
+                                                                          function_name, 
+                                                                          is_replace, 
+                                                                          operation)
+                    self._execute(cursor, conn, create_trigger_query, operation='create_trigger', table_name=table.table_name)
+            return
         create_trigger_query = query.create_trigger(table.table_name, 
                                                     trigger_name, 
                                                     function_name,
@@ -388,37 +1745,184 @@ class TriggerListner(Controller):
                                                     is_insert,
                                                     is_update,
                                                     is_delete)
-        with self.get() as (cursor, _):
-            cursor.execute(create_trigger_query)
+        with self.get() as (cursor, conn):
+            self._execute(cursor, conn, create_trigger_query, operation='create_trigger', table_name=table.table_name)
             
-    def drop_trigger(self, table:data.Table, trigger_name:str):
-        drop_trigger_query = query.drop_trigger(table.table_name, trigger_name)
-        with self.get() as (cursor, _):
-            cursor.execute(drop_trigger_query)
+    def drop_trigger(self, table:data.Table, trigger_name:str, is_statement:bool = False):
+        '''
+        Parameters
+        -
+        is_statement (bool): drop triggers of create_trigger(is_statement=True). default False\n
+        '''
+        if is_statement:
+            drop_trigger_queries = [query.drop_trigger(table.table_name, f"{trigger_name}_{operation}", is_if_exists=True) 
+                                    for operation in ('insert', 'update', 'delete')]
+        else:
+            drop_trigger_queries = [query.drop_trigger(table.table_name, trigger_name)]
+        with self.get() as (cursor, conn):
+            for drop_trigger_query in drop_trigger_queries:
+                self._execute(cursor, conn, drop_trigger_query, operation='drop_trigger', table_name=table.table_name)
     
     def drop_function(self, function_name:str):
         drop_function_query = query.drop_function(function_name)
-        with self.get() as (cursor, _):
-            cursor.execute(drop_function_query)
+        with self.get() as (cursor, conn):
+            self._execute(cursor, conn, drop_function_query, operation='drop_function')
     
     def start_listening(self):
         self.__is_listening.value = True
         self.__close_sender, self.__close_receiver = socket.socketpair()
+        # byte is wakeup for commands. shutdown is close.
+        self.__close_receiver.setblocking(False)
         
         if sys.platform == "linux":
             self.__channel_listen_epoll = select.epoll()
             self.__channel_listen_epoll.register(self.__close_receiver, select.EPOLLET | select.EPOLLIN | select.EPOLLHUP | select.EPOLLRDHUP)
+            if self.__listening_channel_names:
+                # listen_channel() before start_listening()
+                self.__channel_listen_epoll.register(self.get_connection(), select.EPOLLET | select.EPOLLIN | select.EPOLLPRI | select.EPOLLHUP | select.EPOLLRDHUP)
         elif sys.platform == "darwin":
             pass
             
         self.__listening_thread = threading.Thread(target=self.__listening, args=(self.__close_receiver, ))
+        self.__is_thread_listening = True
         self.__listening_thread.start()
     
     def stop_listening(self):
         self.__is_listening.value = False
         self.__close_sender.shutdown(socket.SHUT_RDWR)
         self.__listening_thread.join()
+        dispatcher_by_channel = self.__dispatcher_by_channel
+        self.__dispatcher_by_channel = {}
+        # one writer of fan_out() can be dispatcher of channels.
+        for dispatcher in {id(dispatcher): dispatcher for dispatcher in dispatcher_by_channel.values()}.values():
+            dispatcher.stop()
         self.close()
+
+    def __run_in_listening_thread(self, function):
+        '''
+        Connection is polled by listening thread. statement on it from other thread takes result of poll() and waits forever.\n
+        function is run in listening thread while listening, and result is returned or exception is raised here.
+        '''
+        if threading.current_thread() is self.__listening_thread:
+            return function()
+        command = [function, threading.Event(), None, None]
+        with self.__commands_lock:
+            if not self.__is_thread_listening:
+                return function()
+            self.__commands.append(command)
+            try:
+                self.__close_sender.send(b'\0')
+            except OSError:
+                # stopping. commands are run at end of listening thread.
+                pass
+        command[1].wait()
+        if command[3] is not None:
+            raise command[3]
+        return command[2]
+
+    def __run_commands(self):
+        with self.__commands_lock:
+            commands = self.__commands
+            self.__commands = []
+        for command in commands:
+            try:
+                command[2] = command[0]()
+            except BaseException as e:
+                command[3] = e
+            command[1].set()
+        # notifications received while statement are not polled again by edge-triggered epoll.
+        self.__put_notifies()
+
+    def __put_notifies(self):
+        while self.get_connection().notifies:
+            notify = self.get_connection().notifies.pop(0)
+            self.__put_notify(notify)
+
+    @staticmethod
+    def __receive_wakeup(close_receiver:socket.socket) -> bool:
+        '''
+        Return
+        -
+        bool : True if closed
+        '''
+        while True:
+            try:
+                data = close_receiver.recv(4096)
+            except BlockingIOError:
+                return False
+            if not data:
+                return True
+
+    def subscribe(self, channel_name:str, handler, workers:int = 1, ordered_by = None, is_statement_payload:bool = False):
+        '''
+        LISTEN channel and call handler on worker threads instead of notify_queue.\n
+        Available before and after start_listening().\n
+        Parameters
+        -
+        channel_name (str): \n
+        handler (function(notification.Notification)): called on worker thread. notification.data is json of payload\n
+        workers (int): worker thread count of channel. default 1\n
+        ordered_by (function(notification.Notification) -> hashable): notifications of same key are handled in received order.\n
+        \tex) lambda notification: notification.data['new_record']['id']. default None is no order\n
+        is_statement_payload (bool): same with listen_channel(). default False\n
+        '''
+        if channel_name in self.__dispatcher_by_channel:
+            raise ValueError(f"Already subscribed channel: {channel_name}")
+        dispatcher = notification.ChannelDispatcher(handler, workers, ordered_by, name=f"threadingpg_{channel_name}")
+        dispatcher.start()
+        self.__add_dispatcher(channel_name, dispatcher, is_statement_payload)
+
+    def fan_out(self, channel_name:str, writer:ringbuffer.RingBufferWriter, is_statement_payload:bool = False):
+        '''
+        LISTEN channel and write notifications to shared memory ring buffer in listening thread.\n
+        Worker processes read by ringbuffer.RingBufferConsumer(writer.name, consumer_index).\n
+        Consumers end when unsubscribe() of last channel of writer or stop_listening().\n
+        Parameters
+        -
+        channel_name (str): \n
+        writer (ringbuffer.RingBufferWriter): one writer can be used for channels. stopped with its last channel\n
+        is_statement_payload (bool): same with listen_channel(). default False\n
+        '''
+        if channel_name in self.__dispatcher_by_channel:
+            raise ValueError(f"Already subscribed channel: {channel_name}")
+        self.__add_dispatcher(channel_name, writer, is_statement_payload)
+
+    def __add_dispatcher(self, channel_name:str, dispatcher, is_statement_payload:bool):
+        '''
+        dispatcher has put(notification.Notification) and stop().
+        '''
+        # copy on write. read by listening thread without lock.
+        self.__dispatcher_by_channel = {**self.__dispatcher_by_channel, channel_name: dispatcher}
+        if channel_name not in self.__listening_channel_names:
+            self.listen_channel(channel_name, is_statement_payload)
+
+    def unsubscribe(self, channel_name:str):
+        '''
+        UNLISTEN channel and stop worker threads after put notifications are handled.
+        '''
+        dispatcher_by_channel = dict(self.__dispatcher_by_channel)
+        dispatcher = dispatcher_by_channel.pop(channel_name)
+        self.__dispatcher_by_channel = dispatcher_by_channel
+        self.unlisten_channel(channel_name)
+        # writer of fan_out() is stopped with its last channel.
+        if all(other is not dispatcher for other in dispatcher_by_channel.values()):
+            dispatcher.stop()
+
+    def __put_notify(self, notify):
+        dispatcher = self.__dispatcher_by_channel.get(notify.channel)
+        if notify.channel in self.__statement_channel_names:
+            notifications = notification.split_statement_notification(notification.Notification(notify.channel, notify.payload, notify.pid))
+        elif dispatcher is None:
+            self.notify_queue.put_nowait(notify.payload)
+            return
+        else:
+            notifications = [notification.Notification(notify.channel, notify.payload, notify.pid)]
+        
+        for row_notification in notifications:
+            if dispatcher is None:
+                self.notify_queue.put_nowait(row_notification.payload)
+            else:
+                dispatcher.put(row_notification)
         
     def __listening(self, close_receiver:socket.socket):
         if sys.platform == "linux":
@@ -427,14 +1931,14 @@ class TriggerListner(Controller):
                 if self.__is_listening.value:
                     for detect_fileno, detect_event in events:
                         if detect_fileno == close_receiver.fileno():
-                            self.__is_listening.value = False
-                            break
+                            if self.__receive_wakeup(close_receiver):
+                                self.__is_listening.value = False
+                                break
+                            self.__run_commands()
                         elif detect_fileno == self.get_connection().fileno():
                             if detect_event & (select.EPOLLIN | select.EPOLLPRI):
                                 self.get_connection().poll()
-                                while self.get_connection().notifies:
-                                    notify = self.get_connection().notifies.pop(0)
-                                    self.notify_queue.put_nowait(notify.payload)
+                                self.__put_notifies()
                            
         else:
             while self.__is_listening.value:
@@ -445,36 +1949,63 @@ class TriggerListner(Controller):
                             self.__is_listening.value = False
                             break
                         self.get_connection().poll()
-                        while self.get_connection().notifies:
-                            notify = self.get_connection().notifies.pop(0)
-                            self.notify_queue.put_nowait(notify.payload)
+                        self.__put_notifies()
                             
                     elif s == close_receiver:
-                        self.__is_listening.value = False
-                        break
+                        if self.__receive_wakeup(close_receiver):
+                            self.__is_listening.value = False
+                            break
+                        self.__run_commands()
                 for exce in exceptions:
                     pass
-                
+        
+        with self.__commands_lock:
+            self.__is_thread_listening = False
+        # commands put while stopping.
+        self.__run_commands()
         self.notify_queue.put_nowait(None)
         
-    def listen_channel(self, channel_name:str):
+    def listen_channel(self, channel_name:str, is_statement_payload:bool = False):
+        '''
+        Available before and after start_listening(). 'LISTEN' is run in listening thread while listening.\n
+        Parameters
+        -
+        channel_name (str): \n
+        is_statement_payload (bool): split notification of create_function(is_statement=True) to payload per row. default False\n
+        '''
+        self.__run_in_listening_thread(lambda: self.__listen_channel(channel_name, is_statement_payload))
+
+    def unlisten_channel(self, channel_name):
+        '''
+        'UNLISTEN' is run in listening thread while listening.
+        '''
+        self.__run_in_listening_thread(lambda: self.__unlisten_channel(channel_name))
+
+    def __listen_channel(self, channel_name:str, is_statement_payload:bool):
+        if is_statement_payload:
+            self.__statement_channel_names.add(channel_name)
         listen_channel_query = query.listen_channel(channel_name)
         # with self.get() as (cursor, conn):
         cursor = self.get_connection().cursor()
-        cursor.execute(listen_channel_query)
-        
-        if sys.platform == "linux":
-            self.__channel_listen_epoll.register(self.get_connection(), select.EPOLLET | select.EPOLLIN | select.EPOLLPRI | select.EPOLLHUP | select.EPOLLRDHUP)
-        elif sys.platform == "darwin":
-            pass
+        self._execute(cursor, self.get_connection(), listen_channel_query, operation='listen_channel')
+        # connection is registered once for all channels.
+        if not self.__listening_channel_names and self.__channel_listen_epoll is not None:
+            if sys.platform == "linux":
+                self.__channel_listen_epoll.register(self.get_connection(), select.EPOLLET | select.EPOLLIN | select.EPOLLPRI | select.EPOLLHUP | select.EPOLLRDHUP)
+            elif sys.platform == "darwin":
+                pass
+        self.__listening_channel_names.add(channel_name)
 
-    def unlisten_channel(self, channel_name):
+    def __unlisten_channel(self, channel_name:str):
         unlisten_channel_query = query.unlisten_channel(channel_name)
         # with self.get() as (cursor, conn):
         cursor = self.get_connection().cursor()
-        cursor.execute(unlisten_channel_query)
+        self._execute(cursor, self.get_connection(), unlisten_channel_query, operation='unlisten_channel')
+        self.__listening_channel_names.discard(channel_name)
+        self.__statement_channel_names.discard(channel_name)
         
-        if sys.platform == "linux":
-            self.__channel_listen_epoll.unregister(self.get_connection())
-        elif sys.platform == "darwin":
-            pass
\ No newline at end of file
+        if not self.__listening_channel_names and self.__channel_listen_epoll is not None:
+            if sys.platform == "linux":
+                self.__channel_listen_epoll.unregister(self.get_connection())
+            elif sys.platform == "darwin":
+                pass
\ No newline at end of file
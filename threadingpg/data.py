@@ -1,4 +1,9 @@
 import abc
+import datetime
+import operator
+import re
+from . import query
+from . import types
 
 class ColumnList(metaclass=abc.ABCMeta):
     def __init__(self) -> None:
@@ -13,12 +18,14 @@ class Column(metaclass=abc.ABCMeta):
                  is_nullable:bool = True,
                  is_unique:bool = False,
                  is_primary_key:bool = False,
+                 index_method:str = None,
                  ) -> None:
         '''
         Column Data by 'Column' of psycopg2 and 'information_schema.columns' of postgresql.\n
         Parameter
         -
         data_type (str): based on query. threadingpg.datatype
+        index_method (str): single column index of Table.get_indexes(). 'btree', 'hash', 'gin', 'gist' or 'brin'. default None is no index
         '''
         self.table_catalog = ""
         self.table_schema = ""
@@ -37,6 +44,7 @@ class Column(metaclass=abc.ABCMeta):
         self.scale = None
         self.type_code = None
         self.is_unique = is_unique
+        self.index_method = index_method
         self.character_maximum_length = None
         # self.character_octet_length
         self.numeric_precision = None
@@ -102,8 +110,246 @@ class Row(metaclass=abc.ABCMeta):
             if column_name in self.__dict__:
                 setattr(self, column_name, row_data[index])
 
+    @classmethod
+    def get_factory(cls, column_name_list:list):
+        '''
+        Function of row data(tuple) to this Row. made once per column_name_list.\n
+        Same result with set_data() after __init__() without arguments.\n
+        __init__() is called once, variables of it are copied(shallow) to each Row.\n
+        Parameter
+        -
+        column_name_list (list[str]):
+        Return
+        -
+        function(row_data:tuple) -> Row
+        '''
+        factory_by_column_names = cls.__dict__.get('_Row__factory_by_column_names')
+        if factory_by_column_names is None:
+            factory_by_column_names = {}
+            cls.__factory_by_column_names = factory_by_column_names
+        
+        column_names = tuple(column_name_list)
+        factory = factory_by_column_names.get(column_names)
+        if factory is None:
+            template = cls().__dict__
+            indexes = tuple(index for index, column_name in enumerate(column_names) if column_name in template)
+            variable_names = tuple(column_names[index] for index in indexes)
+            new = cls.__new__
+            if len(indexes) == 0:
+                def factory(row_data:tuple):
+                    row = new(cls)
+                    row.__dict__.update(template)
+                    return row
+            elif len(indexes) == 1:
+                index = indexes[0]
+                variable_name = variable_names[0]
+                def factory(row_data:tuple):
+                    row = new(cls)
+                    variables = row.__dict__
+                    variables.update(template)
+                    variables[variable_name] = row_data[index]
+                    return row
+            else:
+                get_values = operator.itemgetter(*indexes)
+                def factory(row_data:tuple):
+                    row = new(cls)
+                    variables = row.__dict__
+                    variables.update(template)
+                    variables.update(zip(variable_names, get_values(row_data)))
+                    return row
+            factory_by_column_names[column_names] = factory
+        return factory
+
+class TableSchema:
+    def __init__(self, table_name:str, columns:tuple) -> None:
+        '''
+        Column schema of Table. made once per Table class and table_name.\n
+        Parameters
+        -
+        table_name (str):\n
+        columns (tuple): tuple of Column. order of definition\n
+        '''
+        self.table_name = table_name
+        self.column_names:tuple = tuple(column.name for column in columns)
+        self.data_types:tuple = tuple(column.data_type for column in columns)
+        self.serial_column_names:tuple = tuple(column.name for column in columns 
+                                               if column.data_type in (types.smallserial, types.serial, types.bigserial))
+        cast_type_by_serial = {types.smallserial: types.smallint, types.serial: types.integer, types.bigserial: types.bigint}
+        self.cast_types:tuple = tuple(cast_type_by_serial.get(data_type, data_type) for data_type in self.data_types)
+        '''type of '::' cast per column. serial types are cast to integer types'''
+        self.__insert_query_by_column_names = {}
+        self.__update_query_by_column_names = {}
+
+    def get_insert_query(self, column_names:tuple) -> str:
+        '''
+        Parameter
+        -
+        column_names (tuple): inserted column names
+        Return
+        -
+        str : 'INSERT INTO ... VALUES (%s, ...);'
+        '''
+        insert_query = self.__insert_query_by_column_names.get(column_names)
+        if insert_query is None:
+            insert_query = query.insert_placeholder(self.table_name, column_names)
+            self.__insert_query_by_column_names[column_names] = insert_query
+        return insert_query
+
+    def get_update_query(self, column_names:tuple) -> str:
+        '''
+        Parameter
+        -
+        column_names (tuple): updated column names
+        Return
+        -
+        str : 'UPDATE ... SET column_name=%s, ...' without WHERE
+        '''
+        update_query = self.__update_query_by_column_names.get(column_names)
+        if update_query is None:
+            update_query = query.update_placeholder(self.table_name, column_names)
+            self.__update_query_by_column_names[column_names] = update_query
+        return update_query
+
+class Index:
+    def __init__(self, columns:list, name:str = None, method:str = 'btree', is_unique:bool = False, where = None) -> None:
+        '''
+        Index declaration. set in 'indexes' of Table.\n
+        Parameters
+        -
+        columns (list): Column or expression(str). ex) [table.name, 'lower(name)', 'data jsonb_path_ops']\n
+        name (str): default None is '{table_name}_{columns}_idx'\n
+        method (str): 'btree', 'hash', 'gin', 'gist' or 'brin'. default 'btree'\n
+        is_unique (bool): default False\n
+        where (condition.Condition or str): predicate of partial index. default None\n
+        usage:
+        -
+        class MyTable(threadingpg.data.Table):\n
+            table_name="ref"\n
+            index = threadingpg.data.Column(data_type=datatype.serial)\n
+            name = threadingpg.data.Column(data_type=datatype.varchar(), index_method='btree')\n
+            indexes = (threadingpg.data.Index([name, index]), threadingpg.data.Index(['lower(name)'], where=threadingpg.condition.Not(threadingpg.condition.IsNull(name))))\n
+        '''
+        if not columns:
+            raise ValueError("Should be '0 < len(columns)'")
+        self.columns = list(columns)
+        self.name = name
+        self.method = method
+        self.is_unique = is_unique
+        self.where = where
+
+    def get_column_queries(self) -> list:
+        return [column.name if isinstance(column, Column) else column for column in self.columns]
+
+    def get_name(self, table_name:str) -> str:
+        '''
+        Return
+        -
+        str : name or '{table_name}_{columns}_idx'. 63 bytes max like postgresql
+        '''
+        if self.name:
+            return self.name
+        column_parts = [re.sub('\\W+', '_', column_query).strip('_') for column_query in self.get_column_queries()]
+        return f"{table_name}_{'_'.join(column_parts)}_idx"[:63]
+
+class PartitionBy:
+    def __init__(self, column:Column, method:str = 'RANGE', interval:str = None, modulus:int = None) -> None:
+        '''
+        Declarative partitioning. set as 'partition_by' of Table.\n
+        Parameters
+        -
+        column (Column): partition key column of Table\n
+        method (str): 'RANGE', 'LIST' or 'HASH'. default 'RANGE'\n
+        interval (str): 'day', 'week', 'month' or 'year'. range of partitions by Controller.create_range_partitions(). default None\n
+        modulus (int): count of HASH partitions made by Controller.create_table(). default None\n
+        usage:
+        -
+        class MyTable(threadingpg.data.Table):\n
+            table_name="event"\n
+            created = threadingpg.data.Column(data_type=datatype.timestamp)\n
+            partition_by = threadingpg.data.PartitionBy(created, 'RANGE', interval='day')\n
+        '''
+        method = method.upper()
+        if method not in ('RANGE', 'LIST', 'HASH'):
+            raise ValueError("Should be 'RANGE', 'LIST' or 'HASH'")
+        if method == 'HASH' and (modulus is None or modulus < 1):
+            raise ValueError("Should be '0 < modulus' of 'HASH'")
+        if interval is not None and interval not in ('day', 'week', 'month', 'year'):
+            raise ValueError("Should be 'day', 'week', 'month' or 'year'")
+        self.column = column
+        self.method = method
+        self.interval = interval
+        self.modulus = modulus
+
+    def get_range_start(self, value:datetime.datetime) -> datetime.datetime:
+        '''
+        Start of interval including value.
+        '''
+        start = datetime.datetime(value.year, value.month, value.day)
+        if self.interval == 'week':
+            start -= datetime.timedelta(days=start.weekday())
+        elif self.interval == 'month':
+            start = start.replace(day=1)
+        elif self.interval == 'year':
+            start = start.replace(month=1, day=1)
+        return start
+
+    def shift_range_start(self, start:datetime.datetime, count:int) -> datetime.datetime:
+        '''
+        Start of 'count' intervals after(before if negative) start.
+        '''
+        if self.interval == 'day':
+            return start + datetime.timedelta(days=count)
+        if self.interval == 'week':
+            return start + datetime.timedelta(weeks=count)
+        month_index = start.year * 12 + start.month - 1 + (count if self.interval == 'month' else count * 12)
+        return start.replace(year=month_index // 12, month=month_index % 12 + 1)
+
+    def get_partition_name(self, table_name:str, start:datetime.datetime) -> str:
+        '''
+        '{table_name}_p{start}'. ex) event_p20240131, event_p202401, event_p2024
+        '''
+        return f"{table_name}_p{start.strftime(self.__get_name_format())}"
+
+    def parse_partition_name(self, table_name:str, partition_name:str) -> datetime.datetime:
+        '''
+        Return
+        -
+        datetime : start of partition. None if not named by get_partition_name()
+        '''
+        name_format = self.__get_name_format()
+        match = re.fullmatch(f"{re.escape(table_name)}_p(\\d+)", partition_name)
+        if match is None:
+            return None
+        try:
+            return datetime.datetime.strptime(match.group(1), name_format)
+        except ValueError:
+            return None
+
+    def __get_name_format(self) -> str:
+        if self.interval == 'month':
+            return '%Y%m'
+        if self.interval == 'year':
+            return '%Y'
+        return '%Y%m%d'
+
 class Table(metaclass=abc.ABCMeta):
     table_name:str = None
+    partition_by:PartitionBy = None
+    indexes:tuple = ()
+    __class_column_names:tuple = ()
+    __column_schema_by_key:dict = {}
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        class_column_names = []
+        for base in reversed(cls.__mro__):
+            for variable_name, variable in vars(base).items():
+                if isinstance(variable, Column) and variable_name not in class_column_names:
+                    class_column_names.append(variable_name)
+        cls.__class_column_names = tuple(variable_name for variable_name in class_column_names 
+                                         if isinstance(getattr(cls, variable_name), Column))
+        cls.__column_schema_by_key = {}
+
     def __init__(self, table_name:str=None) -> None:
         '''
         Abstract Class(metaclass=abc.ABCMeta)\n
@@ -125,17 +371,31 @@ class Table(metaclass=abc.ABCMeta):
         '''
         if not self.table_name and table_name:
             self.table_name = table_name
-        for variable_name in dir(self):
-            if variable_name not in self.__dict__:
-                variable = getattr(self, variable_name)
-                if isinstance(variable, Column):
-                    setattr(self, variable_name, variable)
-                    variable.table_name = self.table_name
-                    variable.name = variable_name
-                    
-            elif isinstance(self.__dict__[variable_name], Column):
-                self.__dict__[variable_name].table_name = self.table_name
-                self.__dict__[variable_name].name = variable_name
-                
-                    
-        
\ No newline at end of file
+        
+        instance_column_names = tuple(variable_name for variable_name, variable in self.__dict__.items()
+                                      if isinstance(variable, Column) and variable_name not in self.__class_column_names)
+        columns = []
+        for variable_name in self.__class_column_names + instance_column_names:
+            column = getattr(self, variable_name)
+            column.table_name = self.table_name
+            column.name = variable_name
+            columns.append(column)
+        
+        # instance columns are made in every __init__(). schema is cached by their names and data types.
+        schema_key = (self.table_name, tuple((column.name, column.data_type) for column in columns[len(self.__class_column_names):]))
+        column_schema = self.__column_schema_by_key.get(schema_key)
+        if column_schema is None:
+            column_schema = TableSchema(self.table_name, tuple(columns))
+            self.__column_schema_by_key[schema_key] = column_schema
+        self.column_schema:TableSchema = column_schema
+
+    def get_indexes(self) -> list:
+        '''
+        Return
+        -
+        [Index] : Index of Column.index_method and 'indexes'
+        '''
+        indexes = [Index([getattr(self, column_name)], method=getattr(self, column_name).index_method)
+                   for column_name in self.column_schema.column_names if getattr(self, column_name).index_method]
+        indexes.extend(self.indexes)
+        return indexes
@@ -0,0 +1,122 @@
+import logging
+import random
+import threading
+
+class QueryEvent:
+    def __init__(self, operation:str, table_name:str, query:str, params:list) -> None:
+        '''
+        Statement data of hooks.\n
+        Parameters
+        -
+        operation (str): method name of Controller. ex) 'select', 'insert_row', 'create_trigger'\n
+        table_name (str): None if statement is not for table\n
+        query (str): query with placeholder(%s). same query for same statement shape\n
+        params (list): None if not parameterized\n
+        '''
+        self.operation = operation
+        self.table_name = table_name
+        self.query = query
+        self.params = params
+        self.row_count:int = -1
+        self.wall_time:float = None
+        '''seconds from before_execute to after_execute. includes PREPARE'''
+        self.db_time:float = None
+        '''seconds of cursor.execute() of statement'''
+
+class QueryHook:
+    '''
+    Base of hooks. Override needed methods and add by Controller.add_hook().\n
+    Called in the thread of statement. should be fast and thread-safe.
+    '''
+    def before_execute(self, event:QueryEvent):
+        pass
+
+    def after_execute(self, event:QueryEvent):
+        pass
+
+    def on_error(self, event:QueryEvent, error:Exception):
+        pass
+
+class SlowQueryLog(QueryHook):
+    def __init__(self, threshold:float = 1.0, logger:logging.Logger = None, is_log_params:bool = False) -> None:
+        '''
+        Log statement slower than threshold and failed statement.\n
+        Parameters
+        -
+        threshold (float): seconds of wall_time. default 1.0\n
+        logger (logging.Logger): default logging.getLogger('threadingpg.slow_query')\n
+        is_log_params (bool): log params with query. default False\n
+        '''
+        self.threshold = threshold
+        self.logger = logger if logger is not None else logging.getLogger('threadingpg.slow_query')
+        self.is_log_params = is_log_params
+
+    def after_execute(self, event:QueryEvent):
+        if self.threshold <= event.wall_time:
+            self.logger.warning("slow query %.6fs (db %.6fs) %s %s rows=%d: %s%s",
+                                event.wall_time,
+                                event.db_time,
+                                event.operation,
+                                event.table_name,
+                                event.row_count,
+                                event.query,
+                                f" params={event.params}" if self.is_log_params else "")
+
+    def on_error(self, event:QueryEvent, error:Exception):
+        self.logger.error("failed query %s %s: %s (%s)", event.operation, event.table_name, event.query, error)
+
+class QueryStats(QueryHook):
+    def __init__(self, sample_rate:float = 1.0) -> None:
+        '''
+        Count and time of statements by (operation, table_name, query).\n
+        Only 'sample_rate' of statements are recorded and values are scaled by 1 / sample_rate.\n
+        Parameter
+        -
+        sample_rate (float): 0.0 ~ 1.0. default 1.0 is all statements\n
+        '''
+        if not 0.0 < sample_rate <= 1.0:
+            raise ValueError("Should be '0.0 < sample_rate <= 1.0'")
+        self.sample_rate = sample_rate
+        self.__lock = threading.Lock()
+        self.__stats_by_key = {}
+
+    def after_execute(self, event:QueryEvent):
+        if self.sample_rate < 1.0 and self.sample_rate <= random.random():
+            return
+        key = (event.operation, event.table_name, event.query)
+        with self.__lock:
+            stats = self.__stats_by_key.get(key)
+            if stats is None:
+                stats = {'count': 0, 'wall_time': 0.0, 'db_time': 0.0, 'row_count': 0}
+                self.__stats_by_key[key] = stats
+            stats['count'] += 1
+            stats['wall_time'] += event.wall_time
+            stats['db_time'] += event.db_time
+            stats['row_count'] += max(0, event.row_count)
+
+    def snapshot(self, top:int = None) -> list:
+        '''
+        Parameter
+        -
+        top (int): count of result. default None is all
+        Return
+        -
+        [dict] : sorted by db_time. {'operation', 'table_name', 'query', 'count', 'wall_time', 'db_time', 'row_count'}\n
+        values are estimated by sample_rate
+        '''
+        scale = 1.0 / self.sample_rate
+        with self.__lock:
+            result = [{'operation': operation,
+                       'table_name': table_name,
+                       'query': query,
+                       'count': round(stats['count'] * scale),
+                       'wall_time': stats['wall_time'] * scale,
+                       'db_time': stats['db_time'] * scale,
+                       'row_count': round(stats['row_count'] * scale)}
+                      for (operation, table_name, query), stats in self.__stats_by_key.items()]
+        result.sort(key=lambda stats: stats['db_time'], reverse=True)
+        return result[:top] if top is not None else result
+
+    def clear(self):
+        with self.__lock:
+            self.__stats_by_key.clear()
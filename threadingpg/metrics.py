@@ -0,0 +1,113 @@
+import bisect
+import threading
+
+# seconds
+default_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    def __init__(self, buckets:tuple = default_buckets) -> None:
+        '''
+        Thread-safe histogram of fixed buckets(upper bound).\n
+        Parameter
+        -
+        buckets (tuple): sorted upper bounds. default metrics.default_buckets
+        '''
+        self.buckets = tuple(buckets)
+        self.__lock = threading.Lock()
+        self.__counts = [0] * (len(self.buckets) + 1)
+        self.__sum = 0.0
+        self.__count = 0
+
+    def observe(self, value:float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.__lock:
+            self.__counts[index] += 1
+            self.__sum += value
+            self.__count += 1
+
+    def snapshot(self) -> dict:
+        '''
+        Return
+        -
+        {'buckets': {upper bound: cumulative count}, 'sum': float, 'count': int}\n
+        last upper bound is float('inf')
+        '''
+        with self.__lock:
+            counts = list(self.__counts)
+            total_sum = self.__sum
+            total_count = self.__count
+        cumulative_count = 0
+        buckets = {}
+        for upper_bound, count in zip(self.buckets + (float('inf'), ), counts):
+            cumulative_count += count
+            buckets[upper_bound] = cumulative_count
+        return {'buckets': buckets, 'sum': total_sum, 'count': total_count}
+
+class PoolMetrics:
+    counter_names = ('acquire', 'acquire_timeout', 'maxconn_reached', 'connection_created', 'connection_closed')
+    histogram_names = ('acquire_wait_seconds', 'hold_seconds')
+
+    def __init__(self, get_gauges = None, buckets:tuple = default_buckets) -> None:
+        '''
+        Counters, gauges and histograms of connection pool.\n
+        counters: acquire, acquire_timeout, maxconn_reached(waited because maxconn connections are in use), connection_created, connection_closed\n
+        histograms: acquire_wait_seconds, hold_seconds(checkout to return)\n
+        Parameters
+        -
+        get_gauges (function() -> dict): current gauges. ex) {'idle': 1, 'used': 2}. default None\n
+        buckets (tuple): upper bounds of histograms. default metrics.default_buckets
+        '''
+        self.get_gauges = get_gauges
+        self.__lock = threading.Lock()
+        self.__counters = {counter_name: 0 for counter_name in self.counter_names}
+        self.histograms = {histogram_name: Histogram(buckets) for histogram_name in self.histogram_names}
+
+    def increase(self, counter_name:str, value:int = 1):
+        with self.__lock:
+            self.__counters[counter_name] += value
+
+    def observe(self, histogram_name:str, value:float):
+        self.histograms[histogram_name].observe(value)
+
+    def snapshot(self) -> dict:
+        '''
+        Return
+        -
+        {'counters': {name: int}, 'gauges': {name: int}, 'histograms': {name: Histogram.snapshot()}}
+        '''
+        with self.__lock:
+            counters = dict(self.__counters)
+        return {'counters': counters,
+                'gauges': self.get_gauges() if self.get_gauges is not None else {},
+                'histograms': {histogram_name: histogram.snapshot() for histogram_name, histogram in self.histograms.items()}}
+
+    def render_prometheus(self, prefix:str = 'threadingpg_pool', labels:dict = None) -> str:
+        '''
+        Prometheus text format of snapshot().\n
+        Parameters
+        -
+        prefix (str): metric name prefix. default 'threadingpg_pool'\n
+        labels (dict): labels of all metrics. ex) {'pool': 'main'}. default None
+        '''
+        label_str = ','.join(f'{key}="{value}"' for key, value in (labels or {}).items())
+        def make_labels(extra:str = '') -> str:
+            joined = ','.join(label for label in (label_str, extra) if label)
+            return f"{{{joined}}}" if joined else ''
+
+        snapshot = self.snapshot()
+        lines = []
+        for counter_name, value in snapshot['counters'].items():
+            lines.append(f"# TYPE {prefix}_{counter_name}_total counter")
+            lines.append(f"{prefix}_{counter_name}_total{make_labels()} {value}")
+        for gauge_name, value in snapshot['gauges'].items():
+            lines.append(f"# TYPE {prefix}_{gauge_name} gauge")
+            lines.append(f"{prefix}_{gauge_name}{make_labels()} {value}")
+        for histogram_name, histogram in snapshot['histograms'].items():
+            lines.append(f"# TYPE {prefix}_{histogram_name} histogram")
+            for upper_bound, count in histogram['buckets'].items():
+                le = '+Inf' if upper_bound == float('inf') else repr(upper_bound)
+                le_label = 'le="' + le + '"'
+                lines.append(f"{prefix}_{histogram_name}_bucket{make_labels(le_label)} {count}")
+            lines.append(f"{prefix}_{histogram_name}_sum{make_labels()} {histogram['sum']}")
+            lines.append(f"{prefix}_{histogram_name}_count{make_labels()} {histogram['count']}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,431 @@
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+
+from . import query
+from . import data
+
+class Notification:
+    def __init__(self, channel:str, payload:str, pid:int = None, data = None) -> None:
+        '''
+        Notification of LISTEN channel. 'data' is json of payload, decoded once when first used.\n
+        Parameters
+        -
+        channel (str): channel name\n
+        payload (str): payload of pg_notify(). None if made from data\n
+        pid (int): process id of notifying backend. default None\n
+        data (object): decoded payload. payload is encoded when first used. default None\n
+        '''
+        self.channel = channel
+        self.pid = pid
+        self.__payload = payload
+        self.__data = data
+        self.__is_decoded = payload is None
+        self.coalesced_count = 1
+        '''count of notifications merged by Coalescer. 1 is not merged'''
+
+    @property
+    def payload(self) -> str:
+        if self.__payload is None:
+            self.__payload = json.dumps(self.__data, separators=(',', ':'))
+        return self.__payload
+
+    @property
+    def data(self):
+        if not self.__is_decoded:
+            self.__data = json.loads(self.__payload)
+            self.__is_decoded = True
+        return self.__data
+
+    def __repr__(self) -> str:
+        return f"Notification(channel={self.channel!r}, payload={self.payload!r}, pid={self.pid!r})"
+
+def split_statement_notification(notification:Notification) -> list:
+    '''
+    Split notification of 'FOR EACH STATEMENT' trigger(query.create_statement_function()) to same payload of row trigger.\n
+    'records' to 'new_record'('insert', 'update') or 'old_record'('delete'), 'old_records' to 'old_record'('update').\n
+    'keys' to 'key', 'old_keys' to 'old_key'('update').\n
+    Return
+    -
+    [Notification] : one per row
+    '''
+    statement_data:dict = notification.data
+    row_data = {name: value for name, value in statement_data.items() if name not in ('records', 'keys', 'old_records', 'old_keys')}
+    if 'keys' in statement_data:
+        row_name_by_name = {'keys': 'key', 'old_keys': 'old_key'}
+    elif statement_data.get('operation') == 'delete':
+        row_name_by_name = {'records': 'old_record'}
+    else:
+        row_name_by_name = {'records': 'new_record', 'old_records': 'old_record'}
+    row_names = [row_name for name, row_name in row_name_by_name.items() if name in statement_data]
+    records_list = [statement_data[name] or () for name in row_name_by_name if name in statement_data]
+    return [Notification(notification.channel, None, notification.pid, {**row_data, **dict(zip(row_names, records))}) 
+            for records in zip(*records_list)]
+
+class ChannelDispatcher:
+    def __init__(self, handler, workers:int = 1, ordered_by = None, name:str = 'threadingpg_dispatcher') -> None:
+        '''
+        Call handler on worker threads.\n
+        Notifications of same key of ordered_by are handled by same worker in received order.\n
+        Parameters
+        -
+        handler (function(Notification)): \n
+        workers (int): worker thread count. default 1\n
+        ordered_by (function(Notification) -> hashable): key of order. ex) lambda notification: notification.data['new_record']['id']\n
+        \tdefault None is no order between workers\n
+        name (str): prefix of worker thread name.\n
+        '''
+        if workers < 1:
+            raise ValueError("Should be '0 < workers'")
+        self.handler = handler
+        self.workers = workers
+        self.ordered_by = ordered_by
+        self.name = name
+        self.logger = logging.getLogger('threadingpg.notification')
+        if ordered_by is None:
+            # workers share one queue.
+            self.__queues = [queue.SimpleQueue()] * workers
+        else:
+            self.__queues = [queue.SimpleQueue() for _ in range(workers)]
+        self.__round_robin = itertools.cycle(range(workers))
+        self.__threads = []
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self.__working, args=(self.__queues[index], ), name=f"{self.name}_{index}", daemon=True)
+            thread.start()
+            self.__threads.append(thread)
+
+    def stop(self):
+        '''
+        Handle put notifications and join worker threads.
+        '''
+        for index in range(self.workers):
+            self.__queues[index].put(None)
+        for thread in self.__threads:
+            thread.join()
+        self.__threads = []
+
+    def put(self, notification:Notification):
+        if self.ordered_by is None or self.workers == 1:
+            self.__queues[0].put(notification)
+            return
+        try:
+            key = self.ordered_by(notification)
+        except Exception:
+            self.logger.exception("ordered_by failed: %r", notification)
+            key = next(self.__round_robin)
+        self.__queues[hash(key) % self.workers].put(notification)
+
+    def __working(self, notification_queue:queue.SimpleQueue):
+        while True:
+            notification = notification_queue.get()
+            if notification is None:
+                break
+            try:
+                self.handler(notification)
+            except Exception:
+                self.logger.exception("handler failed: %r", notification)
+
+def get_table_key(notification:Notification) -> tuple:
+    '''
+    (table_name, key) of key-only payload. default key of Coalescer.
+    '''
+    return (notification.data.get('table_name'), notification.data['key'])
+
+def merge_notification(pending_notification:Notification, notification:Notification) -> Notification:
+    '''
+    Merge notifications of same key by 'operation' of payload. net change from pending_notification to notification.\n
+    insert + update is insert of latest data. insert + delete is None(dropped both). update + delete is delete.\n
+    delete + insert is update. update + update is latest with first 'old_record'. others are latest notification.\n
+    Return
+    -
+    Notification : merged. None if nothing changed
+    '''
+    pending_data = pending_notification.data
+    latest_data = notification.data
+    pending_operation = pending_data.get('operation') if isinstance(pending_data, dict) else None
+    operation = latest_data.get('operation') if isinstance(latest_data, dict) else None
+    merged_data = None
+    if pending_operation == 'insert':
+        if operation == 'delete':
+            return None
+        if operation == 'update':
+            merged_data = {name: value for name, value in latest_data.items() if name != 'old_record'}
+            merged_data['operation'] = 'insert'
+    elif pending_operation == 'delete' and operation == 'insert':
+        merged_data = {**latest_data, 'operation': 'update'}
+        if 'old_record' in pending_data:
+            merged_data['old_record'] = pending_data['old_record']
+    elif pending_operation == 'update' and operation == 'update' and 'old_record' in pending_data:
+        merged_data = {**latest_data, 'old_record': pending_data['old_record']}
+
+    if merged_data is not None:
+        notification = Notification(notification.channel, None, notification.pid, merged_data)
+    notification.coalesced_count += pending_notification.coalesced_count
+    return notification
+
+class Coalescer:
+    def __init__(self, handler, key_by = get_table_key, window:float = 0.1, max_depth:int = 1000) -> None:
+        '''
+        Merge notifications per key by merge_notification() and call handler after window.\n
+        ex) insert + update is emitted as insert of latest data. insert + delete is not emitted.\n
+        Emitted in first received order of keys. notification.coalesced_count is count of merged notifications.\n
+        Parameters
+        -
+        handler (function(Notification)): called on coalescer thread. ex) KeyHydrator.put\n
+        key_by (function(Notification) -> hashable): default get_table_key is (table_name, key) of key-only payload\n
+        \tex) lambda notification: (notification.data['table_name'], notification.data['new_record']['id'])\n
+        \tnotification is emitted without merge if key_by raises. counted by unkeyed_count\n
+        window (float): seconds from first pending notification to emit. default 0.1\n
+        max_depth (int): emit before window if pending key count reaches. default 1000\n
+        '''
+        if max_depth < 1:
+            raise ValueError("Should be '0 < max_depth'")
+        self.handler = handler
+        self.key_by = key_by
+        self.window = window
+        self.max_depth = max_depth
+        self.logger = logging.getLogger('threadingpg.notification')
+        self.__condition = threading.Condition()
+        self.__pending_by_key = {}
+        self.__first_pending_time = None
+        self.__is_running = False
+        self.__thread = None
+        self.received_count = 0
+        self.emitted_count = 0
+        self.unkeyed_count = 0
+        '''count of notifications which key_by failed. emitted without merge'''
+
+    @property
+    def collapsed_count(self) -> int:
+        '''
+        count of notifications merged to other one of same key or dropped by insert + delete.
+        '''
+        return self.received_count - self.emitted_count - len(self.__pending_by_key)
+
+    def snapshot(self) -> dict:
+        with self.__condition:
+            return {'received': self.received_count,
+                    'emitted': self.emitted_count,
+                    'collapsed': self.collapsed_count,
+                    'unkeyed': self.unkeyed_count,
+                    'pending': len(self.__pending_by_key)}
+
+    def start(self):
+        self.__is_running = True
+        self.__thread = threading.Thread(target=self.__emitting, name="threadingpg_coalescer", daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        '''
+        Emit pending notifications and join thread.
+        '''
+        with self.__condition:
+            self.__is_running = False
+            self.__condition.notify()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def put(self, notification:Notification):
+        '''
+        Handler of TriggerListner.subscribe(). ex) listner.subscribe(channel_name, coalescer.put)
+        '''
+        try:
+            key = self.key_by(notification)
+            is_keyed = True
+        except Exception:
+            # not merged. emitted in received order with others.
+            self.logger.debug("key_by failed: %r", notification, exc_info=True)
+            key = object()
+            is_keyed = False
+        with self.__condition:
+            self.received_count += 1
+            if not is_keyed:
+                self.unkeyed_count += 1
+            pending_notification = self.__pending_by_key.get(key)
+            if pending_notification is not None:
+                notification = merge_notification(pending_notification, notification)
+                if notification is None:
+                    # inserted and deleted in window.
+                    del self.__pending_by_key[key]
+                    return
+            # position of key is kept. value is replaced to merged.
+            self.__pending_by_key[key] = notification
+            if self.__first_pending_time is None:
+                self.__first_pending_time = time.monotonic()
+                self.__condition.notify()
+            elif self.max_depth <= len(self.__pending_by_key):
+                self.__condition.notify()
+
+    def __emitting(self):
+        while True:
+            with self.__condition:
+                while self.__is_running:
+                    if self.__first_pending_time is None:
+                        self.__condition.wait()
+                        continue
+                    if self.max_depth <= len(self.__pending_by_key):
+                        break
+                    remaining_time = self.__first_pending_time + self.window - time.monotonic()
+                    if remaining_time <= 0:
+                        break
+                    self.__condition.wait(remaining_time)
+                pending_notifications = list(self.__pending_by_key.values())
+                self.__pending_by_key = {}
+                self.__first_pending_time = None
+                self.emitted_count += len(pending_notifications)
+                is_running = self.__is_running
+            
+            for notification in pending_notifications:
+                try:
+                    self.handler(notification)
+                except Exception:
+                    self.logger.exception("handler failed: %r", notification)
+            if not is_running:
+                break
+
+class KeyHydrator:
+    def __init__(self, 
+                 controller, 
+                 table:data.Table, 
+                 key_column_name:str, 
+                 handler, 
+                 row_class:type = None, 
+                 window:float = 0.05, 
+                 max_batch_size:int = 1000,
+                 fetch_retry_count:int = 1) -> None:
+        '''
+        Fetch rows of key-only notifications(TriggerListner.create_function(key_column_name=)) in batch.\n
+        Keys put in 'window' seconds are fetched by one 'SELECT ... WHERE key = ANY(%s)'.\n
+        Parameters
+        -
+        controller (controllers.Controller): Pool is recommended. connection is used only while fetching\n
+        table (data.Table): table of notifications\n
+        key_column_name (str): same with create_function()\n
+        handler (function(Notification, row)): called in put order on hydrator thread.\n
+        \trow is None if deleted, not found or fetch failed(failed_fetch_count)\n
+        row_class (type): subclass of data.Row. default None is dict\n
+        window (float): seconds of collecting keys from first key. default 0.05\n
+        max_batch_size (int): fetch before window if key count reaches. default 1000\n
+        fetch_retry_count (int): fetch again if failed. default 1\n
+        '''
+        if fetch_retry_count < 0:
+            raise ValueError("Should be '0 <= fetch_retry_count'")
+        self.controller = controller
+        self.table = table
+        self.key_column_name = key_column_name
+        self.handler = handler
+        self.row_class = row_class
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.fetch_retry_count = fetch_retry_count
+        self.logger = logging.getLogger('threadingpg.notification')
+        self.__queue = queue.SimpleQueue()
+        self.__thread = None
+        self.fetch_count = 0
+        self.fetched_key_count = 0
+        self.failed_fetch_count = 0
+        '''count of batches handled without rows after retries'''
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__hydrating, name=f"threadingpg_hydrator_{self.table.table_name}", daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        '''
+        Handle put notifications and join thread.
+        '''
+        self.__queue.put(None)
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def put(self, notification:Notification):
+        '''
+        Handler of TriggerListner.subscribe(). ex) listner.subscribe(channel_name, hydrator.put)
+        '''
+        self.__queue.put(notification)
+
+    def __hydrating(self):
+        is_running = True
+        while is_running:
+            notification = self.__queue.get()
+            if notification is None:
+                break
+            notifications = [notification]
+            deadline = time.monotonic() + self.window
+            while len(notifications) < self.max_batch_size:
+                remaining_time = deadline - time.monotonic()
+                if remaining_time <= 0:
+                    break
+                try:
+                    notification = self.__queue.get(timeout=remaining_time)
+                except queue.Empty:
+                    break
+                if notification is None:
+                    is_running = False
+                    break
+                notifications.append(notification)
+            self.__handle(notifications)
+
+    def fetch(self, keys:list) -> dict:
+        '''
+        Return
+        -
+        {key: row} : row is row_class or dict
+        '''
+        params = [keys]
+        select_query = query.select(self.table.table_name, f"{self.key_column_name} = ANY(%s)", params=params)
+        with self.controller.get() as (cursor, conn):
+            self.controller._execute(cursor, conn, select_query, params, 'hydrate', self.table.table_name)
+            columns = [desc.name for desc in cursor.description]
+            rows = cursor.fetchall()
+        key_index = columns.index(self.key_column_name)
+        if self.row_class is not None:
+            factory = self.row_class.get_factory(columns)
+            return {row[key_index]: factory(row) for row in rows}
+        return {row[key_index]: dict(zip(columns, row)) for row in rows}
+
+    def __get_key(self, notification:Notification):
+        '''
+        None if deleted or key is not in payload.
+        '''
+        try:
+            if notification.data.get('operation') == 'delete':
+                return None
+            key = notification.data['key']
+            hash(key)
+            return key
+        except Exception:
+            self.logger.exception("key not found: %r", notification)
+            return None
+
+    def __fetch(self, keys:list) -> dict:
+        for retry_count in range(self.fetch_retry_count + 1):
+            try:
+                row_by_key = self.fetch(keys)
+            except Exception:
+                self.logger.exception("fetch failed(%d/%d): %d keys of %s", 
+                                      retry_count + 1, self.fetch_retry_count + 1, len(keys), self.table.table_name)
+                continue
+            self.fetch_count += 1
+            self.fetched_key_count += len(keys)
+            return row_by_key
+        # notifications are handled without rows. not dropped.
+        self.failed_fetch_count += 1
+        return {}
+
+    def __handle(self, notifications:list):
+        notification_keys = [self.__get_key(notification) for notification in notifications]
+        keys = list({key: None for key in notification_keys if key is not None})
+        row_by_key = self.__fetch(keys) if keys else {}
+        for notification, key in zip(notifications, notification_keys):
+            try:
+                self.handler(notification, row_by_key.get(key))
+            except Exception:
+                self.logger.exception("handler failed: %r", notification)
@@ -0,0 +1,322 @@
+import collections
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import PoolError
+
+from . import metrics
+
+class Waiter:
+    def __init__(self) -> None:
+        '''
+        Thread waiting in ConnectionPool.getconn(). connection or permission to make connection is handed over.
+        '''
+        self.event = threading.Event()
+        self.connection:psycopg2.extensions.connection = None
+        self.is_make_connection = False
+
+class ConnectionPool:
+    def __init__(self,
+                 minconn:int,
+                 maxconn:int,
+                 dsn:str,
+                 timeout:float = 30.0,
+                 setup = None,
+                 check_interval:float = 5.0,
+                 max_lifetime:float = None,
+                 idle_timeout:float = None,
+                 reap_interval:float = None) -> None:
+        '''
+        Thread-safe connection pool. same methods with psycopg2.pool.ThreadedConnectionPool.\n
+        getconn() waits in FIFO order when maxconn connections are in use.\n
+        Parameters
+        -
+        minconn (int): connections made at start and kept.\n
+        maxconn (int): max connection count. connections are made when needed.\n
+        dsn (str): psycopg2.extensions.make_dsn()\n
+        timeout (float): default seconds of getconn() waiting. None is waiting forever. default 30.0\n
+        setup (function(connection)): called once when connection is made. ex) set autocommit. default None\n
+        check_interval (float): 'SELECT 1' on checkout if connection is idle longer than this seconds. None is not checked. default 5.0\n
+        max_lifetime (float): close connection older than this seconds when it is returned or idle. default None\n
+        idle_timeout (float): close idle connection over minconn after this seconds. default None\n
+        reap_interval (float): seconds of background thread checking idle connections. default None is not started.\n
+        '''
+        if minconn < 0 or maxconn < 1 or maxconn < minconn:
+            raise ValueError("Should be '0 <= minconn <= maxconn' and '0 < maxconn'")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.dsn = dsn
+        self.timeout = timeout
+        self.setup = setup
+        self.check_interval = check_interval
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.closed = False
+
+        self.__lock = threading.Lock()
+        # (connection, idle start time). right side is most recently returned.
+        self.__idle_connections = collections.deque()
+        self.__waiters = collections.deque()
+        self.__created_time_by_connection = {}
+        self.__connection_count = 0
+        self.__used_connection_count = 0
+        self.__checkout_time_by_connection = {}
+        self.metrics = metrics.PoolMetrics(self.get_gauges)
+
+        for _ in range(minconn):
+            with self.__lock:
+                self.__connection_count += 1
+            connection = self.__make_connection()
+            with self.__lock:
+                self.__idle_connections.append((connection, time.monotonic()))
+
+        self.__reap_stop_event = threading.Event()
+        self.__reap_thread = None
+        if reap_interval is not None:
+            self.__reap_thread = threading.Thread(target=self.__reaping, args=(reap_interval, ), daemon=True)
+            self.__reap_thread.start()
+
+    def get_gauges(self) -> dict:
+        return {'connections': self.__connection_count,
+                'idle_connections': len(self.__idle_connections),
+                'used_connections': self.__used_connection_count,
+                'waiting_threads': len(self.__waiters),
+                'minconn': self.minconn,
+                'maxconn': self.maxconn}
+
+    @property
+    def connection_count(self) -> int:
+        return self.__connection_count
+
+    @property
+    def idle_count(self) -> int:
+        return len(self.__idle_connections)
+
+    @property
+    def used_count(self) -> int:
+        return self.__used_connection_count
+
+    @property
+    def waiting_count(self) -> int:
+        return len(self.__waiters)
+
+    def __make_connection(self) -> psycopg2.extensions.connection:
+        '''
+        __connection_count should be increased before call. decreased if failed.
+        '''
+        try:
+            connection = psycopg2.connect(self.dsn)
+            if self.setup is not None:
+                self.setup(connection)
+        except BaseException:
+            with self.__lock:
+                self.__connection_count -= 1
+                self.__hand_over_permission()
+            raise
+        self.__created_time_by_connection[connection] = time.monotonic()
+        self.metrics.increase('connection_created')
+        return connection
+
+    def __close_connection(self, connection:psycopg2.extensions.connection):
+        '''
+        Should be called with __lock. __connection_count is decreased.
+        '''
+        self.__created_time_by_connection.pop(connection, None)
+        self.__connection_count -= 1
+        self.metrics.increase('connection_closed')
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+        self.__hand_over_permission()
+
+    def __hand_over_permission(self):
+        '''
+        Should be called with __lock. first waiter makes connection if there is room.
+        '''
+        if self.__waiters and self.__connection_count < self.maxconn and not self.closed:
+            waiter:Waiter = self.__waiters.popleft()
+            waiter.is_make_connection = True
+            self.__connection_count += 1
+            waiter.event.set()
+
+    def __is_expired(self, connection:psycopg2.extensions.connection, now:float) -> bool:
+        if self.max_lifetime is None:
+            return False
+        created_time = self.__created_time_by_connection.get(connection, now)
+        return self.max_lifetime < now - created_time
+
+    def __is_alive(self, connection:psycopg2.extensions.connection) -> bool:
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            if not connection.autocommit:
+                connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def getconn(self, timeout:float = -1) -> psycopg2.extensions.connection:
+        '''
+        Parameter
+        -
+        timeout (float): seconds of waiting. default -1 is pool timeout. None is waiting forever.\n
+        Raise
+        -
+        PoolError: pool is closed or timeout.
+        '''
+        if timeout is not None and timeout < 0:
+            timeout = self.timeout
+        start_time = time.monotonic()
+        deadline = None if timeout is None else start_time + timeout
+
+        while True:
+            connection = None
+            idle_time = None
+            is_make_connection = False
+            waiter = None
+            with self.__lock:
+                if self.closed:
+                    raise PoolError("connection pool is closed")
+                if self.__idle_connections and not self.__waiters:
+                    connection, idle_time = self.__idle_connections.pop()
+                elif self.__connection_count < self.maxconn:
+                    self.__connection_count += 1
+                    is_make_connection = True
+                else:
+                    waiter = Waiter()
+                    self.__waiters.append(waiter)
+                    self.metrics.increase('maxconn_reached')
+
+            if waiter is not None:
+                remaining_time = None if deadline is None else max(0.0, deadline - time.monotonic())
+                is_set = waiter.event.wait(remaining_time)
+                with self.__lock:
+                    if not is_set and not waiter.event.is_set():
+                        self.__waiters.remove(waiter)
+                        self.metrics.increase('acquire_timeout')
+                        raise PoolError(f"connection pool exhausted. waited {timeout} seconds")
+                connection = waiter.connection
+                is_make_connection = waiter.is_make_connection
+                if connection is None and not is_make_connection:
+                    # woken by closeall()
+                    continue
+
+            if is_make_connection:
+                connection = self.__make_connection()
+            elif idle_time is not None:
+                now = time.monotonic()
+                if connection.closed or self.__is_expired(connection, now) or \
+                        (self.check_interval is not None and self.check_interval < now - idle_time and not self.__is_alive(connection)):
+                    with self.__lock:
+                        self.__close_connection(connection)
+                    continue
+            elif connection.closed:
+                with self.__lock:
+                    self.__close_connection(connection)
+                continue
+
+            checkout_time = time.monotonic()
+            with self.__lock:
+                self.__used_connection_count += 1
+                self.__checkout_time_by_connection[connection] = checkout_time
+            self.metrics.increase('acquire')
+            self.metrics.observe('acquire_wait_seconds', checkout_time - start_time)
+            return connection
+
+    def putconn(self, conn:psycopg2.extensions.connection, close:bool = False):
+        '''
+        Parameter
+        -
+        conn (connection): connection of getconn()\n
+        close (bool): close connection. default False
+        '''
+        if not conn.closed and not close and not conn.autocommit and \
+                conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                close = True
+
+        now = time.monotonic()
+        with self.__lock:
+            self.__used_connection_count -= 1
+            checkout_time = self.__checkout_time_by_connection.pop(conn, None)
+        if checkout_time is not None:
+            self.metrics.observe('hold_seconds', now - checkout_time)
+        with self.__lock:
+            if close or conn.closed or self.closed or self.__is_expired(conn, now):
+                self.__close_connection(conn)
+            elif self.__waiters:
+                waiter:Waiter = self.__waiters.popleft()
+                waiter.connection = conn
+                waiter.event.set()
+            else:
+                self.__idle_connections.append((conn, now))
+                self.__evict_idle_connections(now)
+
+    def __evict_idle_connections(self, now:float):
+        '''
+        Should be called with __lock. close idle connections over minconn by idle_timeout and expired connections.
+        '''
+        if self.idle_timeout is None and self.max_lifetime is None:
+            return
+        kept_idle_connections = collections.deque()
+        while self.__idle_connections:
+            connection, idle_time = self.__idle_connections.popleft()
+            is_idle_timeout = self.idle_timeout is not None and self.idle_timeout < now - idle_time and self.minconn < self.__connection_count
+            if is_idle_timeout or self.__is_expired(connection, now):
+                self.__close_connection(connection)
+            else:
+                kept_idle_connections.append((connection, idle_time))
+        self.__idle_connections = kept_idle_connections
+
+    def __reaping(self, reap_interval:float):
+        while not self.__reap_stop_event.wait(reap_interval):
+            now = time.monotonic()
+            with self.__lock:
+                self.__evict_idle_connections(now)
+                checked_connections = []
+                if self.check_interval is not None:
+                    kept_idle_connections = collections.deque()
+                    for connection, idle_time in self.__idle_connections:
+                        if self.check_interval < now - idle_time:
+                            checked_connections.append((connection, idle_time))
+                        else:
+                            kept_idle_connections.append((connection, idle_time))
+                    self.__idle_connections = kept_idle_connections
+                    self.__used_connection_count += len(checked_connections)
+
+            for connection, idle_time in checked_connections:
+                self.putconn(connection, close=not self.__is_alive(connection))
+
+            while True:
+                with self.__lock:
+                    if self.closed or self.minconn <= self.__connection_count:
+                        break
+                    self.__connection_count += 1
+                try:
+                    connection = self.__make_connection()
+                except psycopg2.Error:
+                    break
+                with self.__lock:
+                    self.__used_connection_count += 1
+                self.putconn(connection)
+
+    def closeall(self):
+        '''
+        Close idle connections. used connections are closed when returned.
+        '''
+        with self.__lock:
+            self.closed = True
+            while self.__idle_connections:
+                connection, _ = self.__idle_connections.popleft()
+                self.__close_connection(connection)
+            while self.__waiters:
+                waiter:Waiter = self.__waiters.popleft()
+                waiter.event.set()
+        self.__reap_stop_event.set()
@@ -1,5 +1,13 @@
-def select(table_name:str, condition_query:str=None, order_by_query:str=None, limit_count:int=None) -> str:
-    query = f"SELECT * FROM {table_name}"
+import re
+
+def select(table_name:str, condition_query:str=None, order_by_query:str=None, limit_count:int=None, params:list=None, column_names:list=None) -> str:
+    '''
+    Parameters
+    -
+    params(list): default None is value in query. if list, limit_count is appended and placeholder(%s) is in query.
+    column_names(list): default None is all columns(*)
+    '''
+    query = f"SELECT {','.join(column_names) if column_names else '*'} FROM {table_name}"
     
     if condition_query is not None and condition_query != "":
         query += f" WHERE {condition_query}"
@@ -8,40 +16,182 @@ def select(table_name:str, condition_query:str=None, order_by_query:str=None, li
         query += f" ORDER BY {order_by_query}"
     
     if limit_count is not None and 0<limit_count:
-        query += f" LIMIT {limit_count}"
+        if params is None:
+            query += f" LIMIT {limit_count}"
+        else:
+            params.append(limit_count)
+            query += " LIMIT %s"
     
     query += ";"
     return query
 
-def insert(table_name:str, value_by_column_name_dict:dict) -> str:
+def insert(table_name:str, value_by_column_name_dict:dict, params:list=None) -> str:
     '''
     Parameters
     -
     table_name(str): table name
     variables_dict(dict): key is column name, value is value
+    params(list): default None is value in query. if list, value is appended and placeholder(%s) is in query.
     '''
     column_names = ''
     values = ''
     for column_name in value_by_column_name_dict:
         if value_by_column_name_dict[column_name] is not None:
             column_names += f"{column_name},"
-            values += f"{convert_value_to_query(value_by_column_name_dict[column_name])},"
+            values += f"{convert_value_to_query(value_by_column_name_dict[column_name], params=params)},"
         
     query = f"INSERT INTO {table_name} ({column_names[:-1]}) VALUES ({values[:-1]});"
     return query
 
-def update(table_name:str, variables_dict:dict, condition_query:str):
+def insert_rows(table_name:str, column_names:list, rows_values:list, returning_column_names:list=None, params:list=None, on_conflict_query:str=None) -> str:
+    '''
+    Multi-row INSERT. 'None' value is inserted as DEFAULT.
+    Parameters
+    -
+    table_name(str): table name
+    column_names(list): column names
+    rows_values(list): list of row values(tuple). same order with column_names
+    returning_column_names(list): column names of RETURNING. default None
+    params(list): default None is value in query. if list, value is appended and placeholder(%s) is in query.
+    on_conflict_query(str): on_conflict(). default None
+    '''
+    values = ''
+    for row_values in rows_values:
+        row_query = ''
+        for value in row_values:
+            if value is None:
+                row_query += "DEFAULT,"
+            else:
+                row_query += f"{convert_value_to_query(value, params=params)},"
+        values += f"({row_query[:-1]}),"
+
+    query = f"INSERT INTO {table_name} ({','.join(column_names)}) VALUES {values[:-1]}"
+    if on_conflict_query:
+        query += f" {on_conflict_query}"
+    if returning_column_names:
+        query += f" RETURNING {','.join(returning_column_names)}"
+    query += ";"
+    return query
+
+def on_conflict(conflict_column_names:list, update_column_names:list) -> str:
+    '''
+    'ON CONFLICT (...) DO UPDATE SET column=EXCLUDED.column'. 'DO NOTHING' if update_column_names is empty.
+    '''
+    query = f"ON CONFLICT ({','.join(conflict_column_names)}) "
+    if not update_column_names:
+        return query + "DO NOTHING"
+    return query + f"DO UPDATE SET {','.join(f'{column_name}=EXCLUDED.{column_name}' for column_name in update_column_names)}"
+
+def returning_ordinal(insert_query:str, key_column_names:list, cast_types:list, ordinal_keys_values:list, params:list=None) -> str:
+    '''
+    Ordinal of input row in front of RETURNING.
+    'WITH returned AS (INSERT ... RETURNING key, ...), v(ordinal, key) AS (VALUES (...)) SELECT (SELECT min(v.ordinal) FROM v WHERE v.key=returned.key), returned.* FROM returned'\n
+    Keys are compared by cast types of database, not by values of python. ordinal is NULL if returned key is not in ordinal_keys_values.
+    Parameters
+    -
+    insert_query(str): insert_rows() with returning_column_names which has key_column_names
+    key_column_names(list): column names to find ordinal
+    cast_types(list): data types of first row cast. same order with key_column_names
+    ordinal_keys_values(list): list of (ordinal, key values(tuple)). key values are same order with key_column_names
+    params(list): params of insert_query. default None is value in query. if list, value is appended and placeholder(%s) is in query.
+    '''
+    query = f"WITH returned AS ({insert_query.rstrip(';')})"
+    where_query = ' AND '.join(f"v.{column_name}=returned.{column_name}" for column_name in key_column_names)
+    if ordinal_keys_values:
+        values = ''
+        for row_index, (ordinal, key_values) in enumerate(ordinal_keys_values):
+            row_query = f"{ordinal}::integer," if row_index == 0 else f"{ordinal},"
+            for value, cast_type in zip(key_values, cast_types):
+                value_query = convert_value_to_query(value, params=params)
+                # types of VALUES columns are resolved by first row.
+                row_query += f"{value_query}::{cast_type}," if row_index == 0 else f"{value_query},"
+            values += f"({row_query[:-1]}),"
+        query += f", v(ordinal,{','.join(key_column_names)}) AS (VALUES {values[:-1]})"
+        ordinal_query = f"(SELECT min(v.ordinal) FROM v WHERE {where_query})"
+    else:
+        ordinal_query = "NULL::integer"
+    return query + f" SELECT {ordinal_query},returned.* FROM returned;"
+
+def insert_placeholder(table_name:str, column_names:tuple) -> str:
+    '''
+    INSERT with placeholder(%s) of all column_names.
+    '''
+    return f"INSERT INTO {table_name} ({','.join(column_names)}) VALUES ({','.join(['%s'] * len(column_names))});"
+
+def update_placeholder(table_name:str, column_names:tuple) -> str:
+    '''
+    UPDATE SET with placeholder(%s) of all column_names. without WHERE.
+    '''
+    return f"UPDATE {table_name} SET {','.join(f'{column_name}=%s' for column_name in column_names)}"
+
+def update(table_name:str, variables_dict:dict, condition_query:str, params:list=None):
+    '''
+    Parameters
+    -
+    params(list): default None is value in query. if list, value is appended and placeholder(%s) is in query.\n
+    values of condition_query should be appended to params after this.
+    '''
     update_query = ''
     for column_name in variables_dict.keys():
         if column_name in variables_dict:
             if variables_dict[column_name] is not None:
-                update_query += f"{column_name}={convert_value_to_query(variables_dict[column_name])},"
+                update_query += f"{column_name}={convert_value_to_query(variables_dict[column_name], params=params)},"
     return f"UPDATE {table_name} SET {update_query[:-1]} WHERE {condition_query};"
 
+def update_rows(table_name:str, 
+                key_column_names:list, 
+                column_names:list, 
+                cast_types:list, 
+                rows_values:list, 
+                coalesce_column_names:list=None, 
+                params:list=None) -> str:
+    '''
+    Set-based UPDATE. 'UPDATE ... SET ... FROM (VALUES (...), (...)) AS v(...) WHERE table.key=v.key'
+    Parameters
+    -
+    table_name(str): table name
+    key_column_names(list): column names of WHERE. included in column_names
+    column_names(list): column names of VALUES
+    cast_types(list): data types of first row cast. same order with column_names
+    rows_values(list): list of row values(tuple). same order with column_names
+    coalesce_column_names(list): 'column=COALESCE(v.column, table.column)'. None value keeps current value. default None
+    params(list): default None is value in query. if list, value is appended and placeholder(%s) is in query.
+    '''
+    if coalesce_column_names is None:
+        coalesce_column_names = []
+    set_query = ''
+    for column_name in column_names:
+        if column_name in key_column_names:
+            continue
+        if column_name in coalesce_column_names:
+            set_query += f"{column_name}=COALESCE(v.{column_name},{table_name}.{column_name}),"
+        else:
+            set_query += f"{column_name}=v.{column_name},"
+
+    values = ''
+    for row_index, row_values in enumerate(rows_values):
+        row_query = ''
+        for value, cast_type in zip(row_values, cast_types):
+            value_query = "NULL" if value is None else convert_value_to_query(value, params=params)
+            # types of VALUES columns are resolved by first row.
+            row_query += f"{value_query}::{cast_type}," if row_index == 0 else f"{value_query},"
+        values += f"({row_query[:-1]}),"
+
+    where_query = ' AND '.join(f"{table_name}.{column_name}=v.{column_name}" for column_name in key_column_names)
+    return f"UPDATE {table_name} SET {set_query[:-1]} FROM (VALUES {values[:-1]}) AS v({','.join(column_names)}) WHERE {where_query};"
+
 def delete(table_name:str, condition_query:str):
     return f"DELETE FROM {table_name} WHERE {condition_query};"
 
-def convert_value_to_query(value, is_in_list = False) -> str:
+def convert_value_to_query(value, is_in_list = False, params:list = None) -> str:
+    '''
+    Parameters
+    -
+    params(list): default None is value in query. if list, value is appended and placeholder(%s) is returned.
+    '''
+    if params is not None:
+        params.append(value)
+        return "%s"
     value_query = ''
     
     is_value_list = isinstance(value, list)
@@ -73,13 +223,69 @@ def convert_value_to_query(value, is_in_list = False) -> str:
         
     return value_query[:-1]
 
+def prepare(statement_name:str, parameterized_query:str) -> str:
+    '''
+    Parameters
+    -
+    statement_name(str): prepared statement name
+    parameterized_query(str): query with placeholder(%s) of psycopg2
+    '''
+    parameter_count = 0
+    def replace_placeholder(match):
+        nonlocal parameter_count
+        if match.group(0) == "%%":
+            return "%"
+        parameter_count += 1
+        return f"${parameter_count}"
+    return f"PREPARE {statement_name} AS {re.sub('%%|%s', replace_placeholder, parameterized_query)}"
+
+def execute_prepared(statement_name:str, parameter_count:int) -> str:
+    if parameter_count < 1:
+        return f"EXECUTE {statement_name};"
+    return f"EXECUTE {statement_name} ({','.join(['%s'] * parameter_count)});"
+
+def deallocate(statement_name:str=None) -> str:
+    '''
+    Parameters
+    -
+    statement_name(str): default None is DEALLOCATE ALL
+    '''
+    return f"DEALLOCATE {statement_name if statement_name else 'ALL'};"
+
+def copy_from(table_name:str, column_names:list) -> str:
+    return f"COPY {table_name} ({','.join(column_names)}) FROM STDIN;"
+
+def convert_value_to_copy(value, is_in_list = False) -> str:
+    '''
+    Text format value of COPY. same rule with convert_value_to_query.\n
+    None is '\\N'(NULL), bool is true/false, list is array.
+    '''
+    if value is None:
+        return 'NULL' if is_in_list else '\\N'
+
+    if isinstance(value, list):
+        value_copy = "{" + ",".join(convert_value_to_copy(v, True) for v in value) + "}"
+    elif isinstance(value, bool):
+        value_copy = 'true' if value else 'false'
+    elif isinstance(value, str):
+        value_copy = value
+        if is_in_list:
+            value_copy = '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    else:
+        value_copy = str(value)
+
+    if is_in_list:
+        return value_copy
+    return value_copy.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
 
-def create_table(table_name:str, data_type_by_column_name_dict:dict, not_null_dict:dict, unique_dict:dict, references:dict) -> str:
+def create_table(table_name:str, data_type_by_column_name_dict:dict, not_null_dict:dict, unique_dict:dict, references:dict, partition_by_query:str=None) -> str:
     '''
     Parameters
     -
     table_name(str): table name
     variables_dict(dict): key is column name, value is datatype
+    partition_by_query(str): partition_by(). default None
     '''
     res = ''
     for column_name in data_type_by_column_name_dict:
@@ -100,12 +306,90 @@ def create_table(table_name:str, data_type_by_column_name_dict:dict, not_null_di
                     res = f"{res[:-2]}) "
             
         res = f"{res[:-1]},"
-    query = f"CREATE TABLE {table_name} ({res[:-1]});"
+    query = f"CREATE TABLE {table_name} ({res[:-1]})"
+    if partition_by_query:
+        query += f" {partition_by_query}"
+    query += ";"
     return query
 
 def drop_table(table_name:str) -> str:
     return f"DROP TABLE {table_name};"
+
+def partition_by(method:str, column_name:str) -> str:
+    '''
+    Parameters
+    -
+    method(str): 'RANGE', 'LIST' or 'HASH'
+    '''
+    return f"PARTITION BY {method} ({column_name})"
+
+def range_bound(from_value, to_value) -> str:
+    return f"FROM ({convert_value_to_query(from_value)}) TO ({convert_value_to_query(to_value)})"
+
+def list_bound(values:list) -> str:
+    return f"IN ({','.join(convert_value_to_query(value) for value in values)})"
+
+def hash_bound(modulus:int, remainder:int) -> str:
+    return f"WITH (MODULUS {modulus}, REMAINDER {remainder})"
+
+def create_partition(table_name:str, partition_name:str, bound_query:str=None) -> str:
+    '''
+    Parameters
+    -
+    bound_query(str): range_bound(), list_bound() or hash_bound(). default None is DEFAULT partition
+    '''
+    return f"CREATE TABLE IF NOT EXISTS {partition_name} PARTITION OF {table_name} {f'FOR VALUES {bound_query}' if bound_query else 'DEFAULT'};"
+
+def detach_partition(table_name:str, partition_name:str, is_concurrently:bool=False, is_finalize:bool=False) -> str:
+    '''
+    Parameters
+    -
+    is_concurrently(bool): SHARE UPDATE EXCLUSIVE lock of table instead of ACCESS EXCLUSIVE. PostgreSQL >= 14, not in transaction block
+    is_finalize(bool): complete interrupted 'DETACH PARTITION CONCURRENTLY'
+    '''
+    option = ' FINALIZE' if is_finalize else ' CONCURRENTLY' if is_concurrently else ''
+    return f"ALTER TABLE {table_name} DETACH PARTITION {partition_name}{option};"
+
+def get_partition_names(table_name:str, table_schema:str, is_detach_pending:bool=False) -> str:
+    '''
+    Parameters
+    -
+    is_detach_pending(bool): only partitions of interrupted 'DETACH PARTITION CONCURRENTLY'. PostgreSQL >= 14
+    '''
+    query = f"SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent JOIN pg_namespace n ON n.oid = p.relnamespace WHERE n.nspname = '{table_schema}' AND p.relname = '{table_name}'"
+    if is_detach_pending:
+        query += " AND i.inhdetachpending"
+    return query + " ORDER BY c.relname;"
     
+def create_index(table_name:str, 
+                 index_name:str, 
+                 column_queries:list, 
+                 method:str='btree', 
+                 is_unique:bool=False, 
+                 is_concurrently:bool=False, 
+                 where_query:str=None) -> str:
+    '''
+    Parameters
+    -
+    column_queries(list): column names or expressions
+    is_concurrently(bool): build without blocking writes. not available in transaction block
+    where_query(str): predicate of partial index. default None
+    '''
+    query = f"CREATE {'UNIQUE ' if is_unique else ''}INDEX {'CONCURRENTLY ' if is_concurrently else ''}IF NOT EXISTS {index_name} ON {table_name} USING {method} ({','.join(column_queries)})"
+    if where_query:
+        query += f" WHERE {where_query}"
+    query += ";"
+    return query
+
+def drop_index(index_name:str, is_concurrently:bool=False) -> str:
+    return f"DROP INDEX {'CONCURRENTLY ' if is_concurrently else ''}IF EXISTS {index_name};"
+
+def get_indexes(table_name:str, table_schema:str) -> str:
+    '''
+    index name and 'indisvalid'. index of failed 'CREATE INDEX CONCURRENTLY' is not valid.
+    '''
+    return f"SELECT i.indexname, x.indisvalid FROM pg_indexes i JOIN pg_index x ON x.indexrelid = (quote_ident(i.schemaname) || '.' || quote_ident(i.indexname))::regclass WHERE i.schemaname = '{table_schema}' AND i.tablename = '{table_name}';"
+
 def is_exist_table(table_name:str, table_schema:str) -> str:
     return f"SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_schema = '{table_schema}' AND table_name = '{table_name}');"
 
@@ -135,12 +419,17 @@ def create_function(function_name:str,
                     is_raise_unknown_operation:bool,
                     is_after_trigger:bool,
                     is_inline:bool,
-                    in_space:str = '    ') -> str:
-    
+                    in_space:str = '    ',
+                    key_column_name:str = None) -> str:
+    '''
+    Parameters
+    -
+    key_column_name (str): payload has 'key' value of column instead of 'new_record' and 'old_record'. default None\n
+    '''
     if not (function_name and channel_name):
             raise ValueError("function_name channel_name")
         
-    if not (is_get_operation or is_get_timestamp or is_get_tablename or is_get_new or is_get_old):
+    if not (is_get_operation or is_get_timestamp or is_get_tablename or is_get_new or is_get_old or key_column_name):
         raise ValueError("get nothing")
     
     if not (is_update or is_insert or is_delete):
@@ -190,10 +479,12 @@ def create_function(function_name:str,
         payload_variables.append(f"{in_space}{in_space}'operation', LOWER(TG_OP)")
     if is_get_tablename:
         payload_variables.append(f"{in_space}{in_space}'table_name', TG_TABLE_NAME")
-    if is_get_new:
+    if key_column_name:
+        payload_variables.append(f"{in_space}{in_space}'key', rec.{key_column_name}")
+    elif is_get_new:
         if is_update or is_insert:
             payload_variables.append(f"{in_space}{in_space}'new_record', row_to_json(NEW)")
-    if is_get_old:
+    if is_get_old and not key_column_name:
         if is_update or is_delete:
             payload_variables.append(f"{in_space}{in_space}'old_record', row_to_json(OLD)")
     
@@ -214,6 +505,81 @@ def create_function(function_name:str,
     return join_str.join(query_list)
 
 
+def create_statement_function(function_name:str,
+                              channel_name:str,
+                              is_replace:bool,
+                              is_get_operation:bool,
+                              is_get_timestamp:bool,
+                              is_get_tablename:bool,
+                              chunk_size:int,
+                              key_column_name:str = None) -> str:
+    '''
+    Function of 'FOR EACH STATEMENT' trigger with transition tables 'new_table' and 'old_table'.\n
+    One notification per chunk_size rows. payload has 'records'(row_to_json) or 'keys' of key_column_name.\n
+    'update' payload has 'old_records' or 'old_keys' too. rows of old_table and new_table are paired by order.\n
+    Parameters
+    -
+    chunk_size (int): row count of one notification. payload should be smaller than 8000 bytes. 'update' payload is about twice bigger\n
+    key_column_name (str): 'keys' instead of 'records'. default None\n
+    '''
+    if not (function_name and channel_name):
+        raise ValueError("function_name channel_name")
+    if chunk_size < 1:
+        raise ValueError("Should be '0 < chunk_size'")
+    
+    payload_variables = []
+    if is_get_timestamp:
+        payload_variables.append("'timestamp', CURRENT_TIMESTAMP")
+    if is_get_operation:
+        payload_variables.append("'operation', LOWER(TG_OP)")
+    if is_get_tablename:
+        payload_variables.append("'table_name', TG_TABLE_NAME")
+    records_name = 'keys' if key_column_name else 'records'
+    payload_variables.append(f"'{records_name}', json_agg(chunk.record ORDER BY chunk.position)")
+    
+    def make_chunk_query(transition_table_name:str) -> str:
+        record = f"{transition_table_name}.{key_column_name}" if key_column_name else f"row_to_json({transition_table_name})"
+        return f"SELECT row_number() OVER () - 1 AS position, {record} AS record FROM {transition_table_name}"
+    
+    def make_notify_loop(chunk_query:str, variables:list) -> list:
+        return [f"            FOR payload IN",
+                f"                SELECT json_build_object({', '.join(variables)})::text",
+                f"                FROM ({chunk_query}) AS chunk",
+                f"                GROUP BY chunk.position / {chunk_size} ORDER BY chunk.position / {chunk_size}",
+                f"            LOOP",
+                f"                PERFORM pg_notify('{channel_name}', payload);",
+                f"            END LOOP;"]
+    
+    update_chunk_query = (f"SELECT position, new_chunk.record, old_chunk.record AS old_record "
+                          f"FROM ({make_chunk_query('new_table')}) AS new_chunk "
+                          f"JOIN ({make_chunk_query('old_table')}) AS old_chunk USING (position)")
+    update_payload_variables = payload_variables + [f"'old_{records_name}', json_agg(chunk.old_record ORDER BY chunk.position)"]
+    
+    command = "CREATE "
+    if is_replace:
+        command += "OR REPLACE"
+    query_list = [command,
+                  f"FUNCTION {function_name}()",
+                  "RETURNS trigger",
+                  "AS $$",
+                  "DECLARE",
+                  "    payload text;",
+                  "BEGIN",
+                  "    CASE TG_OP",
+                  "        WHEN 'INSERT' THEN"]
+    query_list.extend(make_notify_loop(make_chunk_query('new_table'), payload_variables))
+    query_list.append("        WHEN 'UPDATE' THEN")
+    query_list.extend(make_notify_loop(update_chunk_query, update_payload_variables))
+    query_list.append("        WHEN 'DELETE' THEN")
+    query_list.extend(make_notify_loop(make_chunk_query('old_table'), payload_variables))
+    query_list.extend(["        ELSE",
+                       """            RAISE EXCEPTION 'Unknown TG_OP: "%". Should not occur!', TG_OP;""",
+                       "    END CASE;",
+                       "    RETURN NULL;",
+                       "END;",
+                       "$$ LANGUAGE plpgsql;"])
+    return "\n".join(query_list)
+
 def drop_function(function_name:str) -> str:
     return f'DROP FUNCTION {function_name}();'
 
@@ -271,7 +637,34 @@ def create_trigger(table_name:str,
     query += f"ON {table_name} FOR EACH ROW EXECUTE PROCEDURE {function_name}();"
     return query
     
-def drop_trigger(table_name:str, trigger_name:str) -> str:
+def create_statement_trigger(table_name:str,
+                             trigger_name:str, 
+                             function_name:str,
+                             is_replace:bool,
+                             operation:str) -> str:
+    '''
+    'AFTER ... FOR EACH STATEMENT' trigger with transition table. one event per trigger.\n
+    Parameters
+    -
+    operation (str): 'insert', 'update' or 'delete'\n
+    '''
+    if operation == 'delete':
+        referencing = "REFERENCING OLD TABLE AS old_table"
+    elif operation == 'update':
+        referencing = "REFERENCING OLD TABLE AS old_table NEW TABLE AS new_table"
+    elif operation == 'insert':
+        referencing = "REFERENCING NEW TABLE AS new_table"
+    else:
+        raise ValueError(f"Unknown operation: {operation}")
+    query = f"CREATE "
+    if is_replace:
+        query += f"OR REPLACE "
+    query += f"TRIGGER {trigger_name} AFTER {operation.upper()} ON {table_name} {referencing} FOR EACH STATEMENT EXECUTE PROCEDURE {function_name}();"
+    return query
+    
+def drop_trigger(table_name:str, trigger_name:str, is_if_exists:bool = False) -> str:
+    if is_if_exists:
+        return f"DROP TRIGGER IF EXISTS {trigger_name} on {table_name};"
     return f"DROP TRIGGER {trigger_name} on {table_name};"
 
 def select_trigger() -> str:
@@ -0,0 +1,269 @@
+import collections
+import logging
+import os
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+
+# 8 bytes words of header. one aligned word is written and read at once.
+# struct.pack_into() is not used for shared positions. it clears bytes before packing.
+capacity_index = 0
+max_consumers_index = 1
+write_position_index = 2
+reserved_position_index = 3
+is_closed_index = 4
+oldest_position_index = 5
+header_word_count = 6
+# consumer slot: cursor, overrun_count
+consumer_word_count = 2
+# record: length of channel and payload, length of channel
+record_struct = struct.Struct('<IHxx')
+wrap_length = 0xFFFFFFFF
+
+def align(size:int) -> int:
+    return (size + 7) & ~7
+
+def get_data_offset(max_consumers:int) -> int:
+    return (header_word_count + consumer_word_count * max_consumers) * 8
+
+# resource tracker of a process unlinks tracked shared memory at exit of the process before python 3.13.
+is_tracked_by_attach = sys.version_info < (3, 13) and os.name == 'posix'
+
+def attach_shared_memory(name:str) -> shared_memory.SharedMemory:
+    '''
+    Shared memory created by other process. not unlinked at exit of this process.
+    '''
+    if (3, 13) <= sys.version_info:
+        return shared_memory.SharedMemory(name=name, track=False)
+    attached_shared_memory = shared_memory.SharedMemory(name=name)
+    if is_tracked_by_attach:
+        resource_tracker.unregister(attached_shared_memory._name, 'shared_memory')
+    return attached_shared_memory
+
+class RingBufferWriter:
+    def __init__(self, capacity:int = 1 << 20, max_consumers:int = 8, name:str = None) -> None:
+        '''
+        Single writer of shared memory ring buffer. consumers of other processes attach by name.\n
+        Writer is not blocked by consumers. slow consumer detects overrun and skips to oldest record in buffer.\n
+        Parameters
+        -
+        capacity (int): bytes of records. multiple of 8. default 1MiB\n
+        max_consumers (int): count of consumer cursors. default 8\n
+        name (str): shared memory name. default None is random name\n
+        '''
+        if capacity < 16 or capacity % 8:
+            raise ValueError("Should be '16 <= capacity' and multiple of 8")
+        if max_consumers < 1:
+            raise ValueError("Should be '0 < max_consumers'")
+        self.capacity = capacity
+        self.max_consumers = max_consumers
+        self.data_offset = get_data_offset(max_consumers)
+        self.shared_memory = shared_memory.SharedMemory(name=name, create=True, size=self.data_offset + capacity)
+        self.name = self.shared_memory.name
+        self.__buffer = self.shared_memory.buf
+        self.__words = self.__buffer[:self.data_offset].cast('Q')
+        for index in range(len(self.__words)):
+            self.__words[index] = 0
+        self.__words[capacity_index] = capacity
+        self.__words[max_consumers_index] = max_consumers
+        self.__write_position = 0
+        self.__record_positions = collections.deque()
+        self.dropped_count = 0
+        '''count of notifications bigger than capacity in put()'''
+        self.logger = logging.getLogger('threadingpg.ringbuffer')
+
+    def write(self, payload:bytes, channel:bytes = b''):
+        '''
+        Parameters
+        -
+        payload (bytes): bytes-like object\n
+        channel (bytes): encoded channel name. default b''\n
+        Raise
+        -
+        ValueError: record is bigger than capacity.
+        '''
+        length = len(channel) + len(payload)
+        size = align(record_struct.size + length)
+        if self.capacity < size:
+            raise ValueError(f"Record {size} bytes is bigger than capacity {self.capacity}")
+
+        position = self.__write_position
+        offset = position % self.capacity
+        remaining_size = self.capacity - offset
+        if remaining_size < size:
+            # skip to start of buffer.
+            reserved_position = position + remaining_size + size
+            self.__words[reserved_position_index] = reserved_position
+            if record_struct.size <= remaining_size:
+                record_struct.pack_into(self.__buffer, self.data_offset + offset, wrap_length, 0)
+            position += remaining_size
+            offset = 0
+        else:
+            reserved_position = position + size
+            self.__words[reserved_position_index] = reserved_position
+        while self.__record_positions and self.__record_positions[0] + self.capacity < reserved_position:
+            self.__record_positions.popleft()
+
+        start = self.data_offset + offset
+        record_struct.pack_into(self.__buffer, start, length, len(channel))
+        start += record_struct.size
+        self.__buffer[start:start + len(channel)] = channel
+        start += len(channel)
+        self.__buffer[start:start + len(payload)] = payload
+        self.__write_position = position + size
+        # published after record is written.
+        self.__words[write_position_index] = self.__write_position
+        self.__record_positions.append(position)
+        self.__words[oldest_position_index] = self.__record_positions[0]
+
+    def put(self, notification):
+        '''
+        Write notification.Notification. same interface with ChannelDispatcher for TriggerListner.fan_out().\n
+        Called in listening thread. notification bigger than capacity is dropped and counted by dropped_count.
+        '''
+        try:
+            self.write(notification.payload.encode(), notification.channel.encode())
+        except ValueError:
+            self.dropped_count += 1
+            self.logger.exception("dropped notification of channel %s", notification.channel)
+
+    def get_lags(self) -> list:
+        '''
+        Return
+        -
+        [int] : unread bytes per consumer. more than capacity is overrun.
+        '''
+        return [self.__write_position - self.__words[header_word_count + consumer_word_count * consumer_index]
+                for consumer_index in range(self.max_consumers)]
+
+    def stop(self):
+        '''
+        Consumers get None after reading all records.
+        '''
+        self.__words[is_closed_index] = 1
+
+    def close(self):
+        self.__words.release()
+        self.__buffer = None
+        self.shared_memory.close()
+
+    def unlink(self):
+        if is_tracked_by_attach:
+            # consumer of same resource tracker unregistered the name at attach. unlink() unregisters it again.
+            resource_tracker.register(self.shared_memory._name, 'shared_memory')
+        self.shared_memory.unlink()
+
+class RingBufferConsumer:
+    def __init__(self, name:str, consumer_index:int) -> None:
+        '''
+        Consumer of RingBufferWriter in any process. one consumer_index per consumer.\n
+        Records written after attached are read. shared memory is not unlinked at exit of consumer process. RingBufferWriter.unlink() does.\n
+        Parameters
+        -
+        name (str): RingBufferWriter.name\n
+        consumer_index (int): 0 <= consumer_index < max_consumers\n
+        '''
+        self.shared_memory = attach_shared_memory(name)
+        self.__buffer = self.shared_memory.buf
+        header_words = self.__buffer[:header_word_count * 8].cast('Q')
+        self.capacity = header_words[capacity_index]
+        self.max_consumers = header_words[max_consumers_index]
+        header_words.release()
+        if not 0 <= consumer_index < self.max_consumers:
+            raise ValueError(f"Should be '0 <= consumer_index < {self.max_consumers}'")
+        self.consumer_index = consumer_index
+        self.data_offset = get_data_offset(self.max_consumers)
+        self.__words = self.__buffer[:self.data_offset].cast('Q')
+        self.__cursor_index = header_word_count + consumer_word_count * consumer_index
+        self.__cursor = self.__words[write_position_index]
+        self.__record_position = None
+        self.overrun_count = 0
+        self.__words[self.__cursor_index] = self.__cursor
+        self.__words[self.__cursor_index + 1] = 0
+
+    def is_valid(self) -> bool:
+        '''
+        Payload of last get() is not overwritten yet. check after using memoryview.
+        '''
+        return self.__record_position is not None and \
+            self.__words[reserved_position_index] <= self.__record_position + self.capacity
+
+    def __overrun(self):
+        self.overrun_count += 1
+        self.__cursor = max(self.__cursor, self.__words[oldest_position_index])
+        self.__words[self.__cursor_index] = self.__cursor
+        self.__words[self.__cursor_index + 1] = self.overrun_count
+
+    def get(self, timeout:float = None, max_sleep:float = 0.01) -> tuple:
+        '''
+        Wait next record. payload is memoryview of shared memory(zero copy), valid until is_valid() is False.\n
+        Parameters
+        -
+        timeout (float): seconds. default None is waiting forever\n
+        max_sleep (float): max seconds of polling interval. default 0.01\n
+        Return
+        -
+        (str, memoryview) : channel, payload. None if writer is stopped and all records are read.\n
+        Raise
+        -
+        TimeoutError:
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        sleep_time = 0.0001
+        while True:
+            write_position = self.__words[write_position_index]
+            if self.__cursor == write_position:
+                if self.__words[is_closed_index]:
+                    return None
+                if deadline is not None and deadline <= time.monotonic():
+                    raise TimeoutError()
+                time.sleep(sleep_time)
+                sleep_time = min(sleep_time * 2, max_sleep)
+                continue
+            sleep_time = 0.0001
+
+            if self.__cursor + self.capacity < write_position:
+                self.__overrun()
+                continue
+
+            position = self.__cursor
+            offset = position % self.capacity
+            remaining_size = self.capacity - offset
+            if remaining_size < record_struct.size:
+                self.__cursor += remaining_size
+                continue
+            start = self.data_offset + offset
+            length, channel_length = record_struct.unpack_from(self.__buffer, start)
+            self.__record_position = position
+            if length == wrap_length:
+                if not self.is_valid():
+                    self.__overrun()
+                    continue
+                self.__cursor += remaining_size
+                continue
+
+            size = align(record_struct.size + length)
+            start += record_struct.size
+            channel_view = self.__buffer[start:start + channel_length]
+            payload_view = self.__buffer[start + channel_length:start + length]
+            if not self.is_valid() or remaining_size < size:
+                # overwritten while reading.
+                channel_view.release()
+                payload_view.release()
+                self.__overrun()
+                continue
+            channel = str(channel_view, 'utf-8')
+            channel_view.release()
+            self.__cursor = position + size
+            self.__words[self.__cursor_index] = self.__cursor
+            return channel, payload_view
+
+    def close(self):
+        '''
+        memoryviews of get() should be released before.
+        '''
+        self.__words.release()
+        self.__buffer = None
+        self.shared_memory.close()
@@ -107,4 +107,27 @@ tsvector = 'tsvector'
 uuid = 'uuid'
 '''universally unique identifier'''
 xml = 'xml'
-'''XML data'''
\ No newline at end of file
+'''XML data'''
+
+def get_numpy_dtype(data_type:str) -> str:
+    '''
+    numpy dtype name of data_type. 'object' if there is no native dtype.
+    '''
+    data_type = data_type.lower()
+    if data_type in ('smallint', 'int2', 'smallserial', 'serial2'):
+        return 'int16'
+    if data_type in ('integer', 'int', 'int4', 'serial', 'serial4'):
+        return 'int32'
+    if data_type in ('bigint', 'int8', 'bigserial', 'serial8'):
+        return 'int64'
+    if data_type in ('real', 'float4'):
+        return 'float32'
+    if data_type in ('double precision', 'float8'):
+        return 'float64'
+    if data_type in ('boolean', 'bool'):
+        return 'bool'
+    if data_type == 'date':
+        return 'datetime64[D]'
+    if data_type.startswith('timestamp') and 'with time zone' not in data_type and not data_type.startswith('timestamptz'):
+        return 'datetime64[us]'
+    return 'object'
\ No newline at end of file